@@ -0,0 +1,70 @@
+"""
+Бенчмарк результата конвертации: прежний словарь с ISO-строкой времени
+(datetime.now().isoformat() при создании, fromisoformat + strftime при
+выводе) против ConversionResult со временем снимка и ленивой строкой.
+Время - создание и вывод времени одного результата, память - на результат,
+пока пакет результатов ("100 usd to all") ещё не отправлен.
+
+Запуск: python benchmarks/bench_conversion_result.py
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversion_result import ConversionResult  # noqa: E402
+from money import Money  # noqa: E402
+
+RESULTS = 10000
+REPEAT = 5
+SNAPSHOT_TIME = datetime.now()
+RATE = Money(9123, 4)
+
+
+def as_dict(i: int) -> dict:
+    result = {
+        'amount': 100,
+        'from_currency': 'USD',
+        'to_currency': 'EUR',
+        'result': 91.23 + i,
+        'rate': 0.9123,
+        'timestamp': datetime.now().isoformat()
+    }
+    datetime.fromisoformat(result['timestamp']).strftime('%H:%M %d.%m.%Y')
+    return result
+
+
+def as_result(i: int) -> ConversionResult:
+    result = ConversionResult(100, 'USD', 'EUR', Money(9123 + i, 2), RATE, SNAPSHOT_TIME, 1)
+    result.timestamp_text
+    return result
+
+
+def measure(make):
+    make(0)  # прогрев
+    seconds = min(timeit.repeat(lambda: [make(i) for i in range(RESULTS)], number=1, repeat=REPEAT))
+
+    tracemalloc.start()
+    kept = [make(i) for i in range(RESULTS)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    return seconds / RESULTS * 1e9, current / RESULTS
+
+
+def main():
+    dict_ns, dict_bytes = measure(as_dict)
+    result_ns, result_bytes = measure(as_result)
+
+    print(f"{'':18}{'нс/результат':>14}{'байт/результат':>17}")
+    print(f"{'dict + ISO':18}{dict_ns:>14.0f}{dict_bytes:>17.0f}")
+    print(f"{'ConversionResult':18}{result_ns:>14.0f}{result_bytes:>17.0f}")
+    print(f"Ускорение: x{dict_ns / result_ns:.1f}, память: x{dict_bytes / result_bytes:.1f} меньше")
+
+
+if __name__ == '__main__':
+    main()
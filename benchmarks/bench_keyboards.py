@@ -0,0 +1,68 @@
+"""
+Бенчмарк кэша клавиатур: время и память на одно обновление
+с кэшем и без него (через __wrapped__ исходных функций).
+
+Запуск: python benchmarks/bench_keyboards.py
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyboards import KeyboardBuilder  # noqa: E402
+
+UPDATES = 10000
+
+
+def typical_update(builder):
+    """Клавиатуры, которые строит типичная цепочка нажатий"""
+    return (
+        builder['main_menu'](),
+        builder['rates_menu'](),
+        builder['currency_selection_with_search']('fiat', 'from'),
+        builder['amount_quick_select']('USD', 'EUR'),
+        builder['conversion_actions']('USD', 'EUR'),
+    )
+
+
+def builders(cached: bool):
+    names = ('main_menu', 'rates_menu', 'currency_selection_with_search',
+             'amount_quick_select', 'conversion_actions')
+    result = {}
+    for name in names:
+        func = getattr(KeyboardBuilder, name)
+        result[name] = func if cached else func.__wrapped__
+    return result
+
+
+def measure(cached: bool):
+    builder = builders(cached)
+    typical_update(builder)  # прогрев
+
+    seconds = timeit.timeit(lambda: typical_update(builder), number=UPDATES)
+
+    # Память: держим результаты всех обновлений, как если бы они ещё отправлялись
+    tracemalloc.start()
+    kept = [typical_update(builder) for _ in range(UPDATES)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    return seconds / UPDATES * 1e6, current / UPDATES
+
+
+def main():
+    KeyboardBuilder.warm_up()
+    plain_us, plain_bytes = measure(cached=False)
+    cached_us, cached_bytes = measure(cached=True)
+
+    print(f"{'':12}{'мкс/обновление':>16}{'байт/обновление':>18}")
+    print(f"{'без кэша':12}{plain_us:>16.2f}{plain_bytes:>18.0f}")
+    print(f"{'с кэшем':12}{cached_us:>16.2f}{cached_bytes:>18.0f}")
+    print(f"Ускорение: x{plain_us / cached_us:.1f}, экономия памяти: {plain_bytes - cached_bytes:.0f} байт/обновление")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Бенчмарк арифметики с фиксированной точкой (Money) против float + round
+и decimal.Decimal на горячем пути конвертации: сумма * курс с округлением
+суммы и курса. Заодно проверяется, что Money совпадает с Decimal
+(ROUND_HALF_UP) на всех случайных примерах.
+
+Запуск: python benchmarks/bench_money.py
+"""
+import os
+import random
+import sys
+import timeit
+from decimal import Decimal, ROUND_HALF_UP
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from money import Money  # noqa: E402
+
+SAMPLES = 10000
+REPEAT = 5
+
+
+def make_samples():
+    """(сумма, курс, знаков результата, знаков курса) - как в запросах пользователей"""
+    rng = random.Random(42)
+    samples = []
+    for _ in range(SAMPLES):
+        amount = round(rng.uniform(1, 100000), rng.choice((0, 0, 2)))
+        rate = rng.lognormvariate(0, 5)
+        places = rng.choice((2, 2, 8))
+        samples.append((amount, rate, places, 6 if places == 2 else 8))
+    return samples
+
+
+def with_float(samples):
+    return [(round(amount * rate, places), round(rate, rate_places))
+            for amount, rate, places, rate_places in samples]
+
+
+def with_money(samples):
+    return [(float(Money.exact(amount).convert(rate, places)), float(Money.from_float(rate, rate_places)))
+            for amount, rate, places, rate_places in samples]
+
+
+def with_decimal(samples):
+    quanta = {places: Decimal(1).scaleb(-places) for places in (2, 6, 8)}
+    return [
+        (float((Decimal(repr(amount)) * Decimal(rate)).quantize(quanta[places], rounding=ROUND_HALF_UP)),
+         float(Decimal(rate).quantize(quanta[rate_places], rounding=ROUND_HALF_UP)))
+        for amount, rate, places, rate_places in samples
+    ]
+
+
+def measure(func, samples) -> float:
+    func(samples)  # прогрев
+    best = min(timeit.repeat(lambda: func(samples), number=1, repeat=REPEAT))
+    return best / len(samples) * 1e9
+
+
+def main():
+    samples = make_samples()
+
+    money = with_money(samples)
+    exact = with_decimal(samples)
+    floats = with_float(samples)
+    mismatches = sum(1 for a, b in zip(money, exact) if a != b)
+    float_mismatches = sum(1 for a, b in zip(floats, exact) if a != b)
+
+    float_ns = measure(with_float, samples)
+    money_ns = measure(with_money, samples)
+    decimal_ns = measure(with_decimal, samples)
+
+    print(f"{'':10}{'нс/конвертация':>16}{'к float':>10}{'расхождений с Decimal':>24}")
+    print(f"{'float':10}{float_ns:>16.0f}{1:>10.1f}{float_mismatches:>24}")
+    print(f"{'Money':10}{money_ns:>16.0f}{money_ns / float_ns:>10.1f}{mismatches:>24}")
+    print(f"{'Decimal':10}{decimal_ns:>16.0f}{decimal_ns / float_ns:>10.1f}{0:>24}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,144 @@
-from telegram import Update
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.error import RetryAfter
 from telegram.ext import (
-    CommandHandler, CallbackQueryHandler, MessageHandler, 
+    CommandHandler, CallbackQueryHandler, MessageHandler, InlineQueryHandler,
     ContextTypes, filters, ConversationHandler
 )
 from converter import CurrencyConverter
+from conversion_result import ConversionResult, format_timestamp
+from rate_providers import FIAT, CRYPTO
+from rate_history import RateHistory
+from render_cache import RenderCache
+from user_store import UserStore
+from send_scheduler import SendScheduler
+from ttl_cache import TTLCache
+from broadcast import Broadcaster, BroadcastStore
+from price_alerts import PriceAlertEngine, AlertStore, Alert, ABOVE, BELOW, CHANGE
 from keyboards import KeyboardBuilder
-from config import MESSAGES, CURRENCY_EMOJIS
+from callback_router import CB, cb, router
+from config import (
+    MESSAGES, CURRENCY_EMOJIS, HISTORY_DIR, HISTORY_RING_CAPACITY,
+    HISTORY_CHART_HOURS, HISTORY_CHART_POINTS, USER_DB_PATH,
+    USER_FLUSH_INTERVAL_SECONDS, USER_CACHE_SIZE, MAX_BATCH_CONVERSIONS,
+    INLINE_MAX_RESULTS, INLINE_CACHE_SIZE, INLINE_CACHE_TTL_SECONDS, INLINE_CACHE_TIME_SECONDS,
+    ALERTS_DB_PATH, ALERTS_MAX_PER_USER, ALERTS_SEND_CONCURRENCY, ALERTS_QUICK_PERCENT,
+    BROADCAST_DB_PATH, BROADCAST_CHUNK_SIZE, BROADCAST_CONCURRENCY, BROADCAST_RATE_LIMIT, ADMIN_USER_IDS
+)
+import asyncio
+import functools
 import re
-from datetime import datetime
-from typing import Dict, Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 import logging
 
 # Состояния разговора
 WAITING_AMOUNT, WAITING_SEARCH = range(2)
 
+# Команда конвертации в тексте: сумма, валюта, разделитель, валюта
+CONVERSION_PATTERN = re.compile(
+    r'(\d+(?:[.,]\d+)?)\s*([a-zа-яё][a-zа-яё0-9-]*)(?:\s*(?:->|→)\s*|\s+(?:to|в)\s+)([a-zа-яё][a-zа-яё0-9-]*)'
+)
+
+# Inline запрос по мере набора: "100", "100 us", "100 usd e", "100 usd to eur"
+INLINE_QUERY_PATTERN = re.compile(
+    r'^\s*(\d+(?:[.,]\d*)?)\s*([a-zа-яё][a-zа-яё0-9-]*)?(?:\s*(?:->|→)\s*|\s+(?:to|в)\s+|\s+)?([a-zа-яё][a-zа-яё0-9-]*)?\s*$'
+)
+INLINE_SEPARATORS = {'to', 'в'}
+
+# Команда уведомления: "/alert btc > 70000 usd", "/alert btc ниже 50000", "/alert btc 5%"
+ALERT_PATTERN = re.compile(
+    r'^\s*([a-zа-яё][a-zа-яё0-9-]*)\s*(>|<|выше|ниже|above|below)?\s*(\d+(?:[.,]\d+)?)\s*(%)?\s*([a-zа-яё][a-zа-яё0-9-]*)?\s*$'
+)
+ALERT_DIRECTIONS = {'>': ABOVE, 'выше': ABOVE, 'above': ABOVE, '<': BELOW, 'ниже': BELOW, 'below': BELOW}
+
+# Цель "во все валюты": "100 usd to all", "100 usd в все"
+ALL_TARGETS = {'all', 'все', 'всё'}
+
 # Глобальный экземпляр конвертера
 converter = CurrencyConverter()
 
-# Хранилище данных пользователей
-user_data: Dict[str, Dict] = {}
+# История курсов (пополняется при каждом обновлении)
+rate_history = RateHistory(HISTORY_DIR, HISTORY_RING_CAPACITY)
 
-def get_user_data(user_id: str) -> Dict:
-    """Получение данных пользователя"""
-    if user_id not in user_data:
-        user_data[user_id] = {
-            'conversion_state': {},
-            'favorites': [],
-            'settings': {
-                'default_fiat': 'USD',
-                'default_crypto': 'BTC',
-                'notifications': True
-            }
+async def record_rate_history(updated: CurrencyConverter):
+    """Запись нового снимка курсов в историю"""
+    matrix = updated.rate_matrix
+    await rate_history.record(matrix.updated_at, dict(zip(matrix.codes, matrix.usd_values.tolist())))
+
+converter.add_refresh_listener(record_rate_history)
+
+# Отрисованные экраны курсов (один раз на версию снимка)
+render_cache = RenderCache(lambda: converter.snapshot_version)
+
+async def warm_render_cache(updated: CurrencyConverter):
+    """Заранее отрисовываем экраны для нового снимка"""
+    render_cache.warm()
+
+converter.add_refresh_listener(warm_render_cache)
+
+# Ценовые уведомления (проверяются после каждого обновления курсов)
+alert_engine = PriceAlertEngine(AlertStore(ALERTS_DB_PATH), ALERTS_MAX_PER_USER, ALERTS_SEND_CONCURRENCY)
+
+def rate_change_24h(base: str, quote: str) -> Optional[float]:
+    """Изменение курса пары за 24 ч в процентах: по истории, иначе по данным CoinGecko"""
+    current = converter.rate_matrix.rate(base, quote)
+    if current is None:
+        return None
+    
+    day_ago = datetime.now() - timedelta(hours=24)
+    base_past = rate_history.rate_at(base, day_ago)
+    quote_past = rate_history.rate_at(quote, day_ago)
+    if base_past and quote_past:
+        return (current / (base_past / quote_past) - 1) * 100
+    
+    if quote == 'USD' and base in converter.crypto_cache:
+        return converter.crypto_cache[base].get('usd_24h_change')
+    return None
+
+async def check_price_alerts(updated: CurrencyConverter):
+    """Поиск сработавших уведомлений по новому снимку"""
+    await alert_engine.evaluate(updated.rate_matrix.rate, rate_change_24h)
+
+converter.add_refresh_listener(check_price_alerts)
+
+# Готовые ответы на inline запросы (ключ - версия снимка и запрос)
+inline_cache = TTLCache(INLINE_CACHE_SIZE, INLINE_CACHE_TTL_SECONDS)
+
+def new_user_profile() -> Dict:
+    """Профиль нового пользователя"""
+    return {
+        'conversion_state': {},
+        'favorites': [],
+        'settings': {
+            'default_fiat': 'USD',
+            'default_crypto': 'BTC',
+            'notifications': True
         }
-    return user_data[user_id]
+    }
+
+# Хранилище данных пользователей (SQLite + кэш в памяти)
+user_store = UserStore(
+    USER_DB_PATH,
+    new_user_profile,
+    flush_interval=USER_FLUSH_INTERVAL_SECONDS,
+    cache_size=USER_CACHE_SIZE
+)
+
+# Все исходящие сообщения идут через планировщик с лимитами Bot API
+send_scheduler = SendScheduler()
+
+# Рассылки подписанным пользователям (дайджест, объявления)
+broadcaster = Broadcaster(
+    BroadcastStore(BROADCAST_DB_PATH),
+    user_store.recipients,
+    chunk_size=BROADCAST_CHUNK_SIZE,
+    concurrency=BROADCAST_CONCURRENCY,
+    rate_limit=BROADCAST_RATE_LIMIT
+)
+
+async def get_user_data(user_id: str) -> Dict:
+    """Получение данных пользователя"""
+    return await user_store.get(user_id)
 
 def register_handlers(app):
     """Регистрация всех обработчиков"""
@@ -41,30 +147,47 @@ def register_handlers(app):
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("rates", rates_command))
     app.add_handler(CommandHandler("convert", convert_command))
+    app.add_handler(CommandHandler("alert", alert_command))
+    app.add_handler(CommandHandler("broadcast", broadcast_command))
     
-    # Callback обработчики
-    app.add_handler(CallbackQueryHandler(handle_callback))
-    
-    # Conversation handler для ввода суммы
+    # Conversation handler для ввода суммы и поиска валют
+    # (регистрируется раньше общего обработчика callback'ов, чтобы поймать свои кнопки)
     conv_handler = ConversationHandler(
-        entry_points=[],
+        entry_points=[
+            CallbackQueryHandler(start_search, pattern=router.pattern(CB.SEARCH)),
+            CallbackQueryHandler(start_manual_amount, pattern=router.pattern(CB.MANUAL_AMOUNT))
+        ],
         states={
             WAITING_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_amount_input)],
             WAITING_SEARCH: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_search_input)]
         },
-        fallbacks=[CommandHandler("cancel", cancel_conversation)]
+        fallbacks=[
+            CommandHandler("cancel", cancel_conversation),
+            CallbackQueryHandler(leave_conversation)
+        ]
     )
     app.add_handler(conv_handler)
     
+    # Callback обработчики
+    app.add_handler(CallbackQueryHandler(handle_callback))
+    
+    # Сработавшие уведомления отправляются от имени этого бота
+    alert_engine.deliver = functools.partial(deliver_alert, app.bot)
+    broadcaster.send = functools.partial(send_broadcast_message, app.bot)
+    
+    # Inline режим (@bot 100 usd eur)
+    app.add_handler(InlineQueryHandler(handle_inline_query))
+    
     # Обработчик текстовых сообщений
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /start"""
     user_id = str(update.effective_user.id)
-    get_user_data(user_id)  # Инициализируем данные пользователя
+    await get_user_data(user_id)  # Инициализируем данные пользователя
     
-    await update.message.reply_text(
+    await send_scheduler.reply(
+        update.message,
         MESSAGES['welcome'],
         reply_markup=KeyboardBuilder.main_menu()
     )
@@ -78,6 +201,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /start - Главное меню
 /convert - Быстрая конвертация
 /rates - Актуальные курсы
+/alert - Ценовые уведомления
 /help - Эта справка
 
 **Как использовать:**
@@ -86,6 +210,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 3. 💰 Введите сумму
 4. ✅ Получите результат
 
+Или просто напишите `100 usd to eur` - можно несколько строк сразу,
+а `100 usd to all` покажет сумму во всех валютах.
+
 **Поддерживаемые валюты:**
 • 12+ фиатных валют (USD, EUR, RUB и др.)
 • 12+ криптовалют (BTC, ETH, BNB и др.)
@@ -96,7 +223,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • 🌐 Веб-приложение
 • ⚙️ Настройки
 """
-    await update.message.reply_text(
+    await send_scheduler.reply(
+        update.message,
         help_text,
         reply_markup=KeyboardBuilder.back_button(),
         parse_mode='Markdown'
@@ -104,163 +232,225 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def convert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /convert"""
-    await update.message.reply_text(
+    await send_scheduler.reply(
+        update.message,
         MESSAGES['select_from_currency'],
         reply_markup=KeyboardBuilder.currency_type_selection()
     )
 
 async def rates_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /rates"""
-    await update.message.reply_text(
+    await send_scheduler.reply(
+        update.message,
         "📊 **Курсы валют**\n\nВыберите тип валют:",
         reply_markup=KeyboardBuilder.rates_menu(),
         parse_mode='Markdown'
     )
 
+async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /alert: список уведомлений или новое ("/alert btc > 70000 usd", "/alert btc 5%")"""
+    user_id = str(update.effective_user.id)
+    
+    if not context.args:
+        alerts = alert_engine.user_alerts(user_id)
+        if alerts:
+            text = "🔔 Ваши уведомления:\n\n" + "\n".join(f"• {describe_alert(alert)}" for alert in alerts)
+        else:
+            text = "🔔 Уведомлений пока нет."
+        text += "\n\nНовое: /alert BTC > 70000 USD, /alert ETH < 2500, /alert BTC 5% (изменение за 24 ч)"
+        await send_scheduler.reply(update.message, text)
+        return
+    
+    match = ALERT_PATTERN.match(' '.join(context.args).lower())
+    base = converter.index.resolve(match.group(1)) if match else None
+    quote = converter.index.resolve(match.group(5) or 'usd') if match else None
+    if base is None or quote is None:
+        await send_scheduler.reply(update.message, MESSAGES['error_currency_not_supported'])
+        return
+    
+    _, direction, amount, percent, _ = match.groups()
+    threshold = float(amount.replace(',', '.'))
+    if percent:
+        kind = CHANGE
+    elif direction:
+        kind = ALERT_DIRECTIONS[direction]
+    else:
+        await send_scheduler.reply(update.message, "❌ Укажите условие: > или < (например, /alert BTC > 70000 USD)")
+        return
+    
+    if threshold <= 0:
+        await send_scheduler.reply(update.message, MESSAGES['error_invalid_amount'])
+        return
+    
+    alert = await alert_engine.add(user_id, base, quote, kind, threshold)
+    if alert is None:
+        await send_scheduler.reply(update.message, f"❌ Не больше {ALERTS_MAX_PER_USER} уведомлений")
+        return
+    
+    await send_scheduler.reply(
+        update.message,
+        f"✅ Уведомление создано: {describe_alert(alert)}",
+        reply_markup=alerts_keyboard(user_id, base)
+    )
+
+async def send_broadcast_message(bot, user_id: str, text: str):
+    """Отправка одного сообщения рассылки через общий планировщик"""
+    await send_scheduler.send(bot, int(user_id), text)
+
+async def daily_digest_job(context: ContextTypes.DEFAULT_TYPE):
+    """Ежедневный дайджест: одна рассылка в день (повторный запуск её продолжит, а не начнёт заново)"""
+    if converter.cache_timestamp is None:
+        logging.warning("Дайджест пропущен: курсы ещё не загружены")
+        return
+    
+    # Получатели читаются из БД - сохраняем свежие изменения настроек
+    await user_store.flush()
+    if not await broadcaster.start(f"digest-{datetime.now():%Y-%m-%d}", render_cache.get('digest')):
+        logging.info("Дайджест за сегодня уже отправлялся")
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /broadcast (для администраторов): объявление всем подписчикам или статус рассылок"""
+    if str(update.effective_user.id) not in ADMIN_USER_IDS:
+        return
+    
+    text = update.message.text.partition(' ')[2].strip()
+    if not text:
+        lines = []
+        for job in await broadcaster.history():
+            stats = job.as_dict()
+            lines.append(
+                f"• {job.broadcast_id}: {stats['status']}, отправлено {stats['sent']}, "
+                f"ошибок {stats['failed']}, заблокировали {stats['blocked']}, {stats['per_second']}/с"
+            )
+        await send_scheduler.reply(update.message, "📣 Рассылки:\n\n" + ("\n".join(lines) or "пока не было"))
+        return
+    
+    await user_store.flush()
+    broadcast_id = f"announce-{int(datetime.now().timestamp())}"
+    await broadcaster.start(broadcast_id, text)
+    await send_scheduler.reply(update.message, f"📣 Рассылка {broadcast_id} запущена")
+
+async def refresh_rates_job(context: ContextTypes.DEFAULT_TYPE):
+    """Фоновая задача JobQueue: поддерживает кэш курсов прогретым"""
+    try:
+        await converter.refresh_in_background()
+    except Exception as e:
+        logging.error(f"Ошибка фонового обновления курсов: {e}")
+
+def stale_notice() -> str:
+    """Предупреждение об устаревших курсах (пустая строка, если курсы свежие)"""
+    stale = converter.stale_kinds()
+    if not stale:
+        return ""
+    # Для незагруженного класса времени нет - в тексте будет прочерк
+    timestamp = format_timestamp(converter.rates_timestamp(*stale))
+    return "\n\n" + MESSAGES['stale_rates'].format(timestamp=timestamp)
+
+async def show_loading(query, *kinds: str):
+    """Промежуточное сообщение загрузки - только если впереди реальный запрос к API"""
+    if converter.awaiting_first_load(*kinds):
+        await send_scheduler.edit(query, MESSAGES['loading'])
+
 async def safe_edit_message(query, text, reply_markup=None, parse_mode=None):
     """Безопасное редактирование сообщения с проверкой на дублирование"""
     try:
-        await query.edit_message_text(
+        await send_scheduler.edit(
+            query,
             text=text,
             reply_markup=reply_markup,
             parse_mode=parse_mode
         )
+    except RetryAfter:
+        # Флуд-контроль не снялся за все повторы - новое сообщение только усугубит его
+        logging.warning("Правка сообщения отброшена из-за флуд-контроля")
     except Exception as e:
         if "Message is not modified" in str(e):
             # Сообщение идентично - игнорируем ошибку
             pass
         else:
             # Другая ошибка - пробуем отправить новое сообщение
-            await query.message.reply_text(
+            await send_scheduler.reply(
+                query.message,
                 text=text,
                 reply_markup=reply_markup,
                 parse_mode=parse_mode
             )
 
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка callback запросов"""
+    """Обработка callback запросов через таблицу маршрутов"""
     query = update.callback_query
-    await query.answer()
+    # Ответ на callback уходит параллельно с обработкой, не задерживая её
+    answer = asyncio.create_task(query.answer())
     
-    data = query.data
     user_id = str(update.effective_user.id)
-    user_info = get_user_data(user_id)
     
     try:
-        # Главное меню
-        if data == 'back_main':
+        user_info = await get_user_data(user_id)
+        if not await router.dispatch(query.data, query, context, user_info):
+            # Кнопка старого формата или неизвестная команда
             await safe_edit_message(
                 query,
-                MESSAGES['welcome'],
+                MESSAGES['outdated_button'],
                 reply_markup=KeyboardBuilder.main_menu()
             )
-        
-        # Конвертация
-        elif data == 'convert':
-            await safe_edit_message(
-                query,
-                MESSAGES['select_from_currency'],
-                reply_markup=KeyboardBuilder.currency_type_selection()
-            )
-        
-        elif data.startswith('type_'):
-            await handle_currency_type_selection(query, data, user_info)
-        
-        elif data.startswith('currency_'):
-            await handle_currency_selection(query, data, user_info)
-        
-        elif data.startswith('quick_amount_'):
-            await handle_quick_amount(query, data, user_info)
-        
-        elif data.startswith('swap_'):
-            await handle_currency_swap(query, data, user_info)
-        
-        # Курсы валют
-        elif data == 'rates':
-            await query.edit_message_text(
-                "📊 **Курсы валют**\n\nВыберите тип валют:",
-                reply_markup=KeyboardBuilder.rates_menu(),
-                parse_mode='Markdown'
-            )
-        
-        elif data.startswith('rates_'):
-            await handle_rates_request(query, data)
-        
-        # Популярные валюты
-        elif data == 'trending':
-            await query.edit_message_text(
-                MESSAGES['trending_title'],
-                reply_markup=KeyboardBuilder.trending_menu()
-            )
-        
-        elif data.startswith('trending_'):
-            await handle_trending_request(query, data)
-        
-        # О боте
-        elif data == 'about':
-            await query.edit_message_text(
-                MESSAGES['about_text'],
-                reply_markup=KeyboardBuilder.back_button(),
-                parse_mode='Markdown'
-            )
-        
-        # Настройки
-        elif data == 'settings':
-            await query.edit_message_text(
-                "⚙️ **Настройки**\n\nВыберите опцию:",
-                reply_markup=KeyboardBuilder.settings_menu(),
-                parse_mode='Markdown'
-            )
-        
-        elif data.startswith('settings_'):
-            await handle_settings_request(query, data, user_info)
-        
-        # Обновление курсов
-        elif data.endswith('_refresh'):
-            await handle_refresh_rates(query)
-        
-        else:
-            await query.edit_message_text("❌ Неизвестная команда")
     
     except Exception as e:
         logging.error(f"Ошибка в handle_callback: {e}")
         try:
-            await query.edit_message_text("❌ Произошла ошибка. Попробуйте позже.")
+            await send_scheduler.edit(query, "❌ Произошла ошибка. Попробуйте позже.")
         except Exception:
             # Если не удается изменить сообщение, отправляем новое
-            await query.message.reply_text("❌ Произошла ошибка. Попробуйте позже.")
+            await send_scheduler.reply(query.message, "❌ Произошла ошибка. Попробуйте позже.")
+    
+    finally:
+        try:
+            await answer
+        except Exception as e:
+            logging.warning(f"Не удалось ответить на callback: {e}")
+
+@router.route(CB.MAIN)
+async def show_main_menu(query, context, user_info: Dict):
+    """Главное меню"""
+    await safe_edit_message(
+        query,
+        MESSAGES['welcome'],
+        reply_markup=KeyboardBuilder.main_menu()
+    )
 
-async def handle_currency_type_selection(query, data: str, user_info: Dict):
+@router.route(CB.CONVERT)
+async def show_convert_menu(query, context, user_info: Dict):
+    """Начало конвертации: выбор типа исходной валюты"""
+    user_info['conversion_state'] = {}
+    await safe_edit_message(
+        query,
+        MESSAGES['select_from_currency'],
+        reply_markup=KeyboardBuilder.currency_type_selection('from')
+    )
+
+@router.route(CB.CURRENCY_TYPE, str, str)
+async def handle_currency_type_selection(query, context, user_info: Dict, currency_type: str, action: str):
     """Обработка выбора типа валюты"""
-    parts = data.split('_')
-    currency_type = parts[1]  # fiat или crypto
-    action = parts[2] if len(parts) > 2 else 'from'
-    
     if currency_type == 'fiat':
-        keyboard = KeyboardBuilder.fiat_currencies(action)
         text = "💰 Выберите фиатную валюту:"
     else:
-        keyboard = KeyboardBuilder.crypto_currencies(action)
+        currency_type = 'crypto'
         text = "₿ Выберите криптовалюту:"
     
+    keyboard = KeyboardBuilder.currency_selection_with_search(currency_type, action)
     await safe_edit_message(query, text, reply_markup=keyboard)
 
-async def handle_currency_selection(query, data: str, user_info: Dict):
+@router.route(CB.CURRENCY, str, str)
+async def handle_currency_selection(query, context, user_info: Dict, action: str, currency: str):
     """Обработка выбора валюты"""
-    parts = data.split('_')
-    action = parts[1]  # from или to
-    currency = parts[2]
-    
     conversion_state = user_info['conversion_state']
     
     if action == 'from':
         conversion_state['from_currency'] = currency
-        await query.edit_message_text(
+        await safe_edit_message(
+            query,
             MESSAGES['select_to_currency'],
-            reply_markup=KeyboardBuilder.currency_type_selection()
+            reply_markup=KeyboardBuilder.currency_type_selection('to')
         )
-        # Изменяем action на 'to' для следующего выбора
-        user_info['conversion_state']['next_action'] = 'to'
     
     elif action == 'to':
         conversion_state['to_currency'] = currency
@@ -268,95 +458,121 @@ async def handle_currency_selection(query, data: str, user_info: Dict):
         
         if from_curr:
             # Показываем опции ввода суммы
-            await query.edit_message_text(
-                f"💱 {from_curr} → {currency}\n\n{MESSAGES['enter_amount']}",
-                reply_markup=KeyboardBuilder.amount_quick_select(from_curr, currency)
-            )
+            await show_amount_selection(query, from_curr, currency)
         else:
-            await query.edit_message_text("❌ Ошибка: не выбрана исходная валюта")
+            await safe_edit_message(
+                query,
+                "❌ Ошибка: не выбрана исходная валюта",
+                reply_markup=KeyboardBuilder.currency_type_selection('from')
+            )
 
-async def handle_quick_amount(query, data: str, user_info: Dict):
+@router.route(CB.CONVERT_FROM, str)
+async def handle_convert_from(query, context, user_info: Dict, currency: str):
+    """Конвертация из выбранной валюты: сразу выбор целевой"""
+    user_info['conversion_state'] = {'from_currency': currency}
+    await safe_edit_message(
+        query,
+        MESSAGES['select_to_currency'],
+        reply_markup=KeyboardBuilder.currency_type_selection('to')
+    )
+
+@router.route(CB.BACK_CURRENCY_SELECTION, str)
+async def handle_back_currency_selection(query, context, user_info: Dict, from_currency: str):
+    """Назад с экрана суммы: повторный выбор целевой валюты"""
+    await handle_convert_from(query, context, user_info, from_currency)
+
+async def show_amount_selection(query, from_currency: str, to_currency: str):
+    """Экран выбора суммы для пары"""
+    await safe_edit_message(
+        query,
+        f"💱 {from_currency} → {to_currency}\n\n{MESSAGES['enter_amount']}",
+        reply_markup=KeyboardBuilder.amount_quick_select(from_currency, to_currency)
+    )
+
+@router.route(CB.QUICK_AMOUNT, float, str, str)
+async def handle_quick_amount(query, context, user_info: Dict, amount: float, from_currency: str, to_currency: str):
     """Обработка быстрого выбора суммы"""
-    parts = data.split('_')
-    amount = float(parts[2])
-    from_currency = parts[3]
-    to_currency = parts[4]
-    
     await perform_conversion(query, amount, from_currency, to_currency)
 
+@router.route(CB.NEW_AMOUNT, str, str)
+async def handle_new_amount(query, context, user_info: Dict, from_currency: str, to_currency: str):
+    """Другая сумма для той же пары"""
+    await show_amount_selection(query, from_currency, to_currency)
+
+@router.route(CB.SWAP, str, str)
+async def handle_currency_swap(query, context, user_info: Dict, from_currency: str, to_currency: str):
+    """Обработка смены валют местами"""
+    await show_amount_selection(query, to_currency, from_currency)
+
+def format_conversion_result(result: ConversionResult) -> str:
+    """Текст результата конвертации"""
+    return MESSAGES['conversion_result'].format(
+        amount=result.amount,
+        from_curr=result.from_currency,
+        result=str(result.result),
+        to_curr=result.to_currency,
+        rate=str(result.rate),
+        timestamp=result.timestamp_text
+    ) + stale_notice()
+
 async def perform_conversion(query, amount: float, from_currency: str, to_currency: str):
     """Выполнение конвертации"""
     try:
-        # Показываем загрузку
-        await query.edit_message_text(MESSAGES['loading'])
+        # Курсы в памяти - результат готов сразу, загрузку показываем только при холодном старте
+        await show_loading(query, *converter.kinds_for(from_currency, to_currency))
         
         # Выполняем конвертацию
         result = await converter.convert(amount, from_currency, to_currency)
         
         if result:
-            # Форматируем результат
-            timestamp = datetime.fromisoformat(result['timestamp']).strftime('%H:%M %d.%m.%Y')
-            
-            message = MESSAGES['conversion_result'].format(
-                amount=result['amount'],
-                from_curr=result['from_currency'],
-                result=result['result'],
-                to_curr=result['to_currency'],
-                rate=result['rate'],
-                timestamp=timestamp
-            )
-            
-            await query.edit_message_text(
-                message,
+            await send_scheduler.edit(
+                query,
+                format_conversion_result(result),
                 reply_markup=KeyboardBuilder.conversion_actions(from_currency, to_currency)
             )
         else:
-            await query.edit_message_text(
+            await send_scheduler.edit(
+                query,
                 MESSAGES['error_conversion_failed'],
                 reply_markup=KeyboardBuilder.back_button()
             )
     
     except Exception as e:
         logging.error(f"Ошибка конвертации: {e}")
-        await query.edit_message_text(
+        await send_scheduler.edit(
+            query,
             MESSAGES['error_conversion_failed'],
             reply_markup=KeyboardBuilder.back_button()
         )
 
-async def handle_currency_swap(query, data: str, user_info: Dict):
-    """Обработка смены валют местами"""
-    parts = data.split('_', 2)
-    currencies = parts[1:]
-    from_currency, to_currency = currencies[0], currencies[1]
-    
-    # Меняем валюты местами и показываем выбор суммы
-    await query.edit_message_text(
-        f"💱 {to_currency} → {from_currency}\n\n{MESSAGES['enter_amount']}",
-        reply_markup=KeyboardBuilder.amount_quick_select(to_currency, from_currency)
+@router.route(CB.RATES)
+async def show_rates_menu(query, context, user_info: Dict):
+    """Меню курсов валют"""
+    await safe_edit_message(
+        query,
+        "📊 **Курсы валют**\n\nВыберите тип валют:",
+        reply_markup=KeyboardBuilder.rates_menu(),
+        parse_mode='Markdown'
     )
 
-async def handle_rates_request(query, data: str):
+@router.route(CB.RATES_SCREEN, str)
+async def handle_rates_request(query, context, user_info: Dict, currency_type: str):
     """Обработка запроса курсов валют"""
-    currency_type = data.split('_')[1]
-    
-    if currency_type == 'refresh':
-        await handle_refresh_rates(query)
-        return
-    
     try:
-        await query.edit_message_text(MESSAGES['loading'])
+        kinds = [currency_type] if currency_type in (FIAT, CRYPTO) else []
+        await show_loading(query, *kinds)
         
-        # Обновляем курсы
-        await converter.update_rates()
+        # Курсы обновляются в фоне - берём текущий снимок
+        await converter.ensure_rates(*kinds)
         
-        if currency_type == 'fiat':
-            rates_text = await format_fiat_rates()
-        elif currency_type == 'crypto':
-            rates_text = await format_crypto_rates()
+        screen = f"rates_{currency_type}"
+        if screen in render_cache:
+            rates_text = render_cache.get(screen) + stale_notice()
         else:
             rates_text = "❌ Неизвестный тип валют"
         
-        await query.edit_message_text(
+        await send_scheduler.edit(
+            query,
             rates_text,
             reply_markup=KeyboardBuilder.rates_menu(),
             parse_mode='Markdown'
@@ -364,12 +580,17 @@ async def handle_rates_request(query, data: str):
     
     except Exception as e:
         logging.error(f"Ошибка получения курсов: {e}")
-        await query.edit_message_text(
+        await send_scheduler.edit(
+            query,
             "❌ Ошибка получения курсов",
             reply_markup=KeyboardBuilder.rates_menu()
         )
 
-async def format_fiat_rates() -> str:
+def snapshot_time(*kinds: str) -> str:
+    """Время курсов для подписи 'Обновлено': более старое из указанных классов (по умолчанию всех)"""
+    return format_timestamp(converter.rates_timestamp(*kinds))
+
+def format_fiat_rates() -> str:
     """Форматирование курсов фиатных валют"""
     text = "💰 **Курсы фиатных валют** (к USD)\n\n"
     
@@ -382,10 +603,10 @@ async def format_fiat_rates() -> str:
             emoji = CURRENCY_EMOJIS.get(currency, '💰')
             text += f"{emoji} **{currency}**: {rate:.4f}\n"
     
-    text += f"\n🕒 Обновлено: {datetime.now().strftime('%H:%M %d.%m.%Y')}"
+    text += f"\n🕒 Обновлено: {snapshot_time(FIAT)}"
     return text
 
-async def format_crypto_rates() -> str:
+def format_crypto_rates() -> str:
     """Форматирование курсов криптовалют"""
     text = "₿ **Курсы криптовалют** (в USD)\n\n"
     
@@ -406,32 +627,35 @@ async def format_crypto_rates() -> str:
             
             text += f"{emoji} **{symbol}**: ${price:,.2f} {change_emoji} {change_text}\n"
     
-    text += f"\n🕒 Обновлено: {datetime.now().strftime('%H:%M %d.%m.%Y')}"
+    text += f"\n🕒 Обновлено: {snapshot_time(CRYPTO)}"
     return text
 
-async def handle_trending_request(query, data: str):
+@router.route(CB.TRENDING)
+async def show_trending_menu(query, context, user_info: Dict):
+    """Меню популярных валют"""
+    await safe_edit_message(
+        query,
+        MESSAGES['trending_title'],
+        reply_markup=KeyboardBuilder.trending_menu()
+    )
+
+@router.route(CB.TRENDING_SCREEN, str)
+async def handle_trending_request(query, context, user_info: Dict, trending_type: str):
     """Обработка запроса популярных валют"""
-    trending_type = data.split('_')[1]
-    
-    if trending_type == 'refresh':
-        await handle_refresh_rates(query)
-        return
-    
     try:
-        await query.edit_message_text(MESSAGES['loading'])
+        await show_loading(query, CRYPTO)
         
-        trending_info = await converter.get_trending_info()
+        # Курсы обновляются в фоне - берём текущий снимок
+        await converter.ensure_rates(CRYPTO)
         
-        if trending_type == 'gainers':
-            text = format_trending_list(trending_info['top_gainers'], "📈 **Растущие валюты**")
-        elif trending_type == 'losers':
-            text = format_trending_list(trending_info['top_losers'], "📉 **Падающие валюты**")
-        elif trending_type == 'popular':
-            text = format_popular_currencies(trending_info['popular'])
+        screen = f"trending_{trending_type}"
+        if screen in render_cache:
+            text = render_cache.get(screen) + stale_notice()
         else:
             text = "❌ Неизвестный тип трендов"
         
-        await query.edit_message_text(
+        await send_scheduler.edit(
+            query,
             text,
             reply_markup=KeyboardBuilder.trending_menu(),
             parse_mode='Markdown'
@@ -439,7 +663,8 @@ async def handle_trending_request(query, data: str):
     
     except Exception as e:
         logging.error(f"Ошибка получения трендов: {e}")
-        await query.edit_message_text(
+        await send_scheduler.edit(
+            query,
             "❌ Ошибка получения данных",
             reply_markup=KeyboardBuilder.trending_menu()
         )
@@ -456,7 +681,7 @@ def format_trending_list(currencies: list, title: str) -> str:
         text += f"${currency['price']:,.2f} "
         text += f"{change_emoji} {currency['change']:+.2f}%\n"
     
-    text += f"\n🕒 Обновлено: {datetime.now().strftime('%H:%M %d.%m.%Y')}"
+    text += f"\n🕒 Обновлено: {snapshot_time(CRYPTO)}"
     return text
 
 def format_popular_currencies(popular_ids: list) -> str:
@@ -475,112 +700,530 @@ def format_popular_currencies(popular_ids: list) -> str:
             
             text += f"{emoji} **{symbol}**: ${price:,.2f} {change_emoji} {change:+.2f}%\n"
     
-    text += f"\n🕒 Обновлено: {datetime.now().strftime('%H:%M %d.%m.%Y')}"
+    text += f"\n🕒 Обновлено: {snapshot_time(CRYPTO)}"
     return text
 
-async def handle_settings_request(query, data: str, user_info: Dict):
-    """Обработка настроек"""
-    setting_type = data.split('_')[1]
+render_cache.register('rates_fiat', format_fiat_rates)
+render_cache.register('rates_crypto', format_crypto_rates)
+render_cache.register('trending_gainers', lambda: format_trending_list(
+    converter.trending_snapshot()['top_gainers'], "📈 **Растущие валюты**"))
+render_cache.register('trending_losers', lambda: format_trending_list(
+    converter.trending_snapshot()['top_losers'], "📉 **Падающие валюты**"))
+render_cache.register('trending_popular', lambda: format_popular_currencies(
+    converter.trending_snapshot()['popular']))
+
+def format_daily_digest() -> str:
+    """Ежедневный дайджест курсов (обычный текст - уходит всем подписчикам)"""
+    text = f"☀️ Курсы на {datetime.now():%d.%m.%Y}\n\n💰 Фиат (к USD):\n"
+    for currency in ['EUR', 'GBP', 'RUB', 'JPY', 'CNY']:
+        if currency in converter.fiat_cache:
+            text += f"{CURRENCY_EMOJIS.get(currency, '💰')} {currency}: {converter.fiat_cache[currency]:.4f}\n"
     
-    await query.edit_message_text(
+    text += "\n₿ Крипто (в USD):\n"
+    for crypto_id in ['bitcoin', 'ethereum', 'binancecoin', 'solana', 'ripple']:
+        data = converter.crypto_cache.get(crypto_id)
+        if data:
+            info = converter.supported_crypto[crypto_id]
+            text += f"{info['icon']} {info['symbol']}: ${data.get('usd', 0):,.2f} ({data.get('usd_24h_change', 0):+.2f}%)\n"
+    
+    text += (f"\n🕒 Обновлено: фиат {snapshot_time(FIAT)}, крипто {snapshot_time(CRYPTO)}"
+             "\nОтключить рассылку: ⚙️ Настройки")
+    return text
+
+# Дайджест отрисовывается один раз на снимок, а не для каждого получателя
+render_cache.register('digest', format_daily_digest)
+
+SPARKLINE_BLOCKS = "▁▂▃▄▅▆▇█"
+
+def format_sparkline(values: list) -> str:
+    """Текстовый мини-график из блочных символов"""
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARKLINE_BLOCKS[3] * len(values)
+    scale = (len(SPARKLINE_BLOCKS) - 1) / (high - low)
+    return ''.join(SPARKLINE_BLOCKS[round((value - low) * scale)] for value in values)
+
+@router.route(CB.CHART, str)
+async def handle_chart_request(query, context, user_info: Dict, currency: str):
+    """График курса валюты за последние часы по истории"""
+    code = converter._normalize_currency_code(currency)
+    info = converter.get_currency_info(currency)
+    
+    now = datetime.now()
+    points = rate_history.range(code, now - timedelta(hours=HISTORY_CHART_HOURS), now, HISTORY_CHART_POINTS)
+    currency_type = info['type'] if info else 'fiat'
+    
+    if len(points) < 2:
+        await send_scheduler.edit(
+            query,
+            "📊 Недостаточно данных для графика. Попробуйте позже.",
+            reply_markup=KeyboardBuilder.create_currency_info_keyboard(currency, currency_type)
+        )
+        return
+    
+    values = [value for _, value in points]
+    change = (values[-1] / values[0] - 1) * 100
+    text = f"📊 **{currency.upper()}** за {HISTORY_CHART_HOURS} ч (в USD)\n\n"
+    text += f"`{format_sparkline(values)}`\n\n"
+    text += f"Мин: ${min(values):,.4f}\n"
+    text += f"Макс: ${max(values):,.4f}\n"
+    text += f"Сейчас: ${values[-1]:,.4f} ({change:+.2f}%)"
+    
+    await send_scheduler.edit(
+        query,
+        text,
+        reply_markup=KeyboardBuilder.create_currency_info_keyboard(currency, currency_type),
+        parse_mode='Markdown'
+    )
+
+@router.route(CB.FAVORITE, str)
+async def handle_favorite_toggle(query, context, user_info: Dict, currency: str):
+    """Добавление валюты в избранное или удаление из него"""
+    favorites = user_info['favorites']
+    if currency in favorites:
+        favorites.remove(currency)
+        text = f"☆ {currency} удалена из избранного"
+    else:
+        favorites.append(currency)
+        text = f"⭐ {currency} добавлена в избранное"
+    
+    info = converter.get_currency_info(currency)
+    await safe_edit_message(
+        query,
+        text,
+        reply_markup=KeyboardBuilder.create_currency_info_keyboard(currency, info['type'] if info else 'fiat')
+    )
+
+def format_price(value: float) -> str:
+    """Цена с точностью по величине"""
+    return f"{value:,.2f}" if abs(value) >= 1 else f"{value:.8g}"
+
+def describe_alert(alert: Alert) -> str:
+    """Условие уведомления словами"""
+    base = converter._display_code(alert.base)
+    quote = converter._display_code(alert.quote)
+    if alert.kind == ABOVE:
+        return f"{base} выше {format_price(alert.threshold)} {quote}"
+    if alert.kind == BELOW:
+        return f"{base} ниже {format_price(alert.threshold)} {quote}"
+    return f"{base} ±{alert.threshold:g}% за 24 ч"
+
+async def deliver_alert(bot, alert: Alert, value: float):
+    """Отправка сработавшего уведомления (если пользователь их не отключил)"""
+    user_info = await get_user_data(alert.user_id)
+    if not user_info['settings'].get('notifications', True):
+        return
+    
+    quote = converter._display_code(alert.quote)
+    if alert.kind == CHANGE:
+        current = f"{value:+.2f}% за 24 ч"
+    else:
+        current = f"{format_price(value)} {quote}"
+    text = f"🔔 Сработало уведомление: {describe_alert(alert)}\n\nСейчас: {current}"
+    await send_scheduler.send(
+        bot,
+        int(alert.user_id),
+        text,
+        reply_markup=KeyboardBuilder.back_button()
+    )
+
+def format_alerts_screen(user_id: str, currency: str) -> str:
+    """Экран уведомлений по валюте"""
+    code = converter._display_code(currency)
+    price = converter.rate_matrix.rate(currency, 'USD')
+    alerts = alert_engine.user_alerts(user_id, currency)
+    
+    text = f"🔔 Уведомления: {code}\n\n"
+    if price is not None:
+        text += f"Сейчас: {format_price(price)} USD\n\n"
+    if alerts:
+        text += "\n".join(f"• {describe_alert(alert)}" for alert in alerts) + "\n\n"
+    else:
+        text += "Уведомлений пока нет.\n\n"
+    text += f"Свой порог: /alert {code} > 70000 USD или /alert {code} 5%"
+    return text
+
+def alerts_keyboard(user_id: str, currency: str):
+    alerts = alert_engine.user_alerts(user_id, currency)
+    info = converter.get_currency_info(currency)
+    return KeyboardBuilder.alert_menu(
+        currency,
+        info['type'] if info else 'fiat',
+        [(alert.alert_id, describe_alert(alert)) for alert in alerts],
+        ALERTS_QUICK_PERCENT
+    )
+
+@router.route(CB.ALERT, str)
+async def show_alerts(query, context, user_info: Dict, currency: str):
+    """Уведомления пользователя по валюте и быстрое создание"""
+    currency = converter._normalize_currency_code(currency)
+    user_id = str(query.from_user.id)
+    await safe_edit_message(
+        query,
+        format_alerts_screen(user_id, currency),
+        reply_markup=alerts_keyboard(user_id, currency)
+    )
+
+@router.route(CB.ALERT_ADD, str, str, float)
+async def handle_alert_add(query, context, user_info: Dict, currency: str, kind: str, percent: float):
+    """Быстрое уведомление: ±percent% от текущей цены в USD или за 24 ч"""
+    currency = converter._normalize_currency_code(currency)
+    user_id = str(query.from_user.id)
+    
+    if kind == CHANGE:
+        threshold = percent
+    else:
+        price = converter.rate_matrix.rate(currency, 'USD')
+        if price is None:
+            await send_scheduler.edit(query, MESSAGES['error_currency_not_supported'], reply_markup=KeyboardBuilder.back_button())
+            return
+        threshold = price * (1 + percent / 100) if kind == ABOVE else price * (1 - percent / 100)
+    
+    alert = await alert_engine.add(user_id, currency, 'USD', kind, threshold)
+    text = format_alerts_screen(user_id, currency)
+    if alert is None:
+        text = f"❌ Не больше {ALERTS_MAX_PER_USER} уведомлений\n\n" + text
+    
+    await safe_edit_message(query, text, reply_markup=alerts_keyboard(user_id, currency))
+
+@router.route(CB.ALERT_DELETE, str, int)
+async def handle_alert_delete(query, context, user_info: Dict, currency: str, alert_id: int):
+    """Удаление уведомления"""
+    user_id = str(query.from_user.id)
+    await alert_engine.remove(user_id, alert_id)
+    await safe_edit_message(
+        query,
+        format_alerts_screen(user_id, currency),
+        reply_markup=alerts_keyboard(user_id, currency)
+    )
+
+@router.route(CB.ABOUT)
+async def show_about(query, context, user_info: Dict):
+    """О боте"""
+    await safe_edit_message(
+        query,
+        MESSAGES['about_text'],
+        reply_markup=KeyboardBuilder.back_button(),
+        parse_mode='Markdown'
+    )
+
+@router.route(CB.SETTINGS)
+async def show_settings(query, context, user_info: Dict):
+    """Меню настроек"""
+    await safe_edit_message(
+        query,
+        "⚙️ **Настройки**\n\nВыберите опцию:",
+        reply_markup=KeyboardBuilder.settings_menu(),
+        parse_mode='Markdown'
+    )
+
+@router.route(CB.SETTINGS_OPTION, str)
+async def handle_settings_request(query, context, user_info: Dict, setting_type: str):
+    """Обработка настроек"""
+    await send_scheduler.edit(
+        query,
         "⚙️ Эта настройка пока недоступна",
         reply_markup=KeyboardBuilder.settings_menu()
     )
 
-async def handle_refresh_rates(query):
+@router.route(CB.NOOP)
+async def handle_noop(query, context, user_info: Dict):
+    """Кнопка без действия"""
+
+@router.route(CB.REFRESH, str)
+async def handle_refresh_rates(query, context, user_info: Dict, section: str):
     """Обновление курсов валют"""
+    back = cb(CB.TRENDING) if section == 'trending' else cb(CB.RATES)
     try:
-        await query.edit_message_text(MESSAGES['loading'])
+        await send_scheduler.edit(query, MESSAGES['loading'])
         
-        # Принудительно обновляем курсы
-        converter.cache_timestamp = None
-        success = await converter.update_rates()
+        # Принудительно обновляем курсы (или ждём уже идущую загрузку)
+        success = await converter.update_rates(force=True)
         
         if success:
-            await query.edit_message_text(
+            await send_scheduler.edit(
+                query,
                 MESSAGES['rates_updated'],
-                reply_markup=KeyboardBuilder.back_button('rates')
+                reply_markup=KeyboardBuilder.back_button(back)
             )
         else:
-            await query.edit_message_text(
+            await send_scheduler.edit(
+                query,
                 "❌ Ошибка обновления курсов",
-                reply_markup=KeyboardBuilder.back_button('rates')
+                reply_markup=KeyboardBuilder.back_button(back)
             )
     
     except Exception as e:
         logging.error(f"Ошибка обновления курсов: {e}")
-        await query.edit_message_text(
+        await send_scheduler.edit(
+            query,
             "❌ Ошибка обновления курсов",
-            reply_markup=KeyboardBuilder.back_button('rates')
+            reply_markup=KeyboardBuilder.back_button(back)
         )
 
+# Кнопки точек входа ConversationHandler: разбираются маршрутизатором, обрабатываются диалогом
+router.declare(CB.MANUAL_AMOUNT, str, str)
+router.declare(CB.SEARCH, str, str)
+
+async def start_manual_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ручной ввод суммы (кнопка ✏️ Ввести вручную)"""
+    query = update.callback_query
+    await query.answer()
+    
+    _, (from_currency, to_currency) = router.parse(query.data)
+    context.user_data['manual_amount'] = (from_currency, to_currency)
+    
+    await safe_edit_message(
+        query,
+        f"💱 {from_currency} → {to_currency}\n\n{MESSAGES['enter_amount']}",
+        reply_markup=KeyboardBuilder.back_button(cb(CB.NEW_AMOUNT, from_currency, to_currency))
+    )
+    return WAITING_AMOUNT
+
 async def handle_amount_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка ввода суммы"""
     try:
         amount = float(update.message.text.replace(',', '.'))
         
         if amount <= 0:
-            await update.message.reply_text(MESSAGES['error_invalid_amount'])
+            await send_scheduler.reply(update.message, MESSAGES['error_invalid_amount'])
             return WAITING_AMOUNT
-        
-        return ConversationHandler.END
     
     except ValueError:
-        await update.message.reply_text(MESSAGES['error_invalid_amount'])
+        await send_scheduler.reply(update.message, MESSAGES['error_invalid_amount'])
         return WAITING_AMOUNT
+    
+    pair = context.user_data.pop('manual_amount', None)
+    if pair is None:
+        return ConversationHandler.END
+    
+    from_currency, to_currency = pair
+    result = await converter.convert(amount, from_currency, to_currency)
+    
+    if result:
+        await send_scheduler.reply(
+            update.message,
+            format_conversion_result(result),
+            reply_markup=KeyboardBuilder.conversion_actions(from_currency, to_currency)
+        )
+    else:
+        await send_scheduler.reply(
+            update.message,
+            MESSAGES['error_conversion_failed'],
+            reply_markup=KeyboardBuilder.back_button()
+        )
+    return ConversationHandler.END
+
+async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начало поиска валюты (кнопка 🔍 Поиск валюты)"""
+    query = update.callback_query
+    await query.answer()
+    
+    _, (currency_type, action) = router.parse(query.data)
+    context.user_data['search'] = {'type': currency_type, 'action': action}
+    
+    await safe_edit_message(
+        query,
+        "🔍 Введите код, название или тикер валюты (например: евро, бакс, btc):",
+        reply_markup=KeyboardBuilder.back_button(cb(CB.CONVERT))
+    )
+    return WAITING_SEARCH
 
 async def handle_search_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка поиска валют"""
-    await update.message.reply_text("🔍 Поиск валют пока недоступен")
+    search = context.user_data.get('search', {})
+    action = search.get('action', 'from')
+    
+    found = converter.search_currencies(update.message.text, kind=search.get('type'))
+    if not found:
+        # Пробуем среди всех типов валют
+        found = converter.search_currencies(update.message.text)
+    
+    if not found:
+        await send_scheduler.reply(
+            update.message,
+            "🔍 Ничего не найдено. Попробуйте другой запрос или /cancel"
+        )
+        return WAITING_SEARCH
+    
+    currencies = []
+    for currency_id in found:
+        code = converter._display_code(currency_id)
+        currencies.append((code, f"{CURRENCY_EMOJIS.get(code, '💱')} {code}"))
+    
+    await send_scheduler.reply(
+        update.message,
+        "🔍 Результаты поиска:",
+        reply_markup=KeyboardBuilder.search_results(currencies, action)
+    )
+    context.user_data.pop('search', None)
     return ConversationHandler.END
 
 async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отмена разговора"""
-    await update.message.reply_text(
+    await send_scheduler.reply(
+        update.message,
         "❌ Операция отменена",
         reply_markup=KeyboardBuilder.main_menu()
     )
     return ConversationHandler.END
 
+async def leave_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Нажатие другой кнопки во время ввода: выходим из разговора и обрабатываем кнопку"""
+    context.user_data.pop('manual_amount', None)
+    context.user_data.pop('search', None)
+    await handle_callback(update, context)
+    return ConversationHandler.END
+
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка произвольных текстовых сообщений"""
     text = update.message.text.lower()
     
-    # Попытка парсинга команды конвертации (например: "100 usd to eur")
-    conversion_pattern = r'(\d+(?:\.\d+)?)\s*([a-z]{3})\s*(?:to|в|->|→)\s*([a-z]{3})'
-    match = re.search(conversion_pattern, text)
-    
-    if match:
+    # Команды конвертации (например: "100 usd to eur", "100 баксов в евро"),
+    # по одной на строку, либо "100 usd to all"
+    requests = []
+    for match in CONVERSION_PATTERN.finditer(text):
         amount, from_curr, to_curr = match.groups()
-        amount = float(amount)
-        
-        try:
-            result = await converter.convert(amount, from_curr.upper(), to_curr.upper())
+        requests.append((float(amount.replace(',', '.')), from_curr, to_curr))
+    
+    if not requests:
+        # Показываем главное меню
+        await send_scheduler.reply(
+            update.message,
+            MESSAGES['welcome'],
+            reply_markup=KeyboardBuilder.main_menu()
+        )
+        return
+    
+    try:
+        if len(requests) == 1 and requests[0][2] not in ALL_TARGETS:
+            amount, from_curr, to_curr = requests[0]
+            result = await converter.convert(amount, from_curr, to_curr)
             
             if result:
-                timestamp = datetime.fromisoformat(result['timestamp']).strftime('%H:%M %d.%m.%Y')
-                
-                message = MESSAGES['conversion_result'].format(
-                    amount=result['amount'],
-                    from_curr=result['from_currency'],
-                    result=result['result'],
-                    to_curr=result['to_currency'],
-                    rate=result['rate'],
-                    timestamp=timestamp
-                )
-                
-                await update.message.reply_text(
-                    message,
-                    reply_markup=KeyboardBuilder.conversion_actions(from_curr.upper(), to_curr.upper())
+                await send_scheduler.reply(
+                    update.message,
+                    format_conversion_result(result),
+                    reply_markup=KeyboardBuilder.conversion_actions(result.from_currency, result.to_currency)
                 )
             else:
-                await update.message.reply_text(MESSAGES['error_conversion_failed'])
-        except Exception as e:
-            logging.error(f"Ошибка текстовой конвертации: {e}")
-            await update.message.reply_text(MESSAGES['error_conversion_failed'])
+                await send_scheduler.reply(update.message, MESSAGES['error_conversion_failed'])
+            return
+        
+        await send_scheduler.reply(update.message, await format_conversion_batch(requests))
+    except Exception as e:
+        logging.error(f"Ошибка текстовой конвертации: {e}")
+        await send_scheduler.reply(update.message, MESSAGES['error_conversion_failed'])
+
+async def format_conversion_batch(requests: List[Tuple[float, str, str]]) -> str:
+    """
+    Ответ на несколько конвертаций сразу: все пары (и развёрнутые "to all")
+    считаются одним пакетом по одному снимку курсов. Сверх
+    MAX_BATCH_CONVERSIONS конвертации не считаются - в ответе сказано, сколько
+    пропущено
+    """
+    items = []
+    blocks = []  # (заголовок "to all" или None, срез результатов в items)
+    for amount, from_curr, to_curr in requests:
+        if to_curr in ALL_TARGETS:
+            targets = converter.conversion_targets(from_curr)
+            blocks.append((f"{amount:g} {from_curr.upper()}", len(items), len(items) + len(targets)))
+            items.extend((amount, from_curr, target) for target in targets)
+        else:
+            blocks.append((None, len(items), len(items) + 1))
+            items.append((amount, from_curr, to_curr))
+    
+    results = await converter.convert_many(items[:MAX_BATCH_CONVERSIONS])
+    skipped = len(items) - len(results)
+    
+    lines = []
+    for title, start, end in blocks:
+        if start >= len(results) and end > start:
+            continue  # целиком за пределами лимита
+        block = results[start:end]
+        if title is None:
+            result = block[0] if block else None
+            if result is None:
+                amount, from_curr, to_curr = items[start]
+                lines.append(f"❌ {amount:g} {from_curr.upper()} → {to_curr.upper()}: валюта не поддерживается")
+            else:
+                lines.append(f"{result.amount:g} {result.from_currency} = {result.result} {result.to_currency}")
+            continue
+        
+        if not block:
+            lines.append(f"❌ {title}: валюта не поддерживается")
+            continue
+        lines.append(f"\n💱 {title} во все валюты:")
+        for result in block:
+            if result is not None:
+                emoji = CURRENCY_EMOJIS.get(result.to_currency, '💰')
+                lines.append(f"{emoji} {result.to_currency}: {result.result}")
+    
+        if end > len(results):
+            lines.append(f"… ещё {end - len(results)} валют не показано")
+    
+    if skipped:
+        lines.append(f"\n⚠️ Пропущено конвертаций: {skipped} (не более {MAX_BATCH_CONVERSIONS} за сообщение)")
+    text = "✅ Результаты конвертации:\n\n" + "\n".join(lines).strip("\n")
+    # Время пакета - самое старое из времён курсов, по которым он посчитан
+    timestamps = [result.timestamp for result in results if result is not None]
+    timestamp = None if not timestamps or None in timestamps else min(timestamps)
+    return text + f"\n\n🕒 Обновлено: {format_timestamp(timestamp)}" + stale_notice()
+
+async def handle_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Inline режим: конвертация прямо из строки ввода.
+    Запрос приходит на каждое нажатие клавиши, поэтому отвечаем только
+    из снимка в памяти и кэша - без обращений к API курсов.
+    """
+    inline_query = update.inline_query
+    query = ' '.join(inline_query.query.lower().split())
+    
+    if converter.cache_timestamp is None:
+        # Курсы ещё не загружены - не ждём загрузку на горячем пути
+        await inline_query.answer([], cache_time=1)
+        return
+    
+    key = (converter.snapshot_version, query)
+    results = inline_cache.get(key)
+    if results is None:
+        results = await build_inline_results(query)
+        inline_cache.set(key, results)
+    
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME_SECONDS)
+
+async def build_inline_results(query: str) -> List[InlineQueryResultArticle]:
+    """Разбор неполного запроса и варианты конвертации по текущему снимку"""
+    match = INLINE_QUERY_PATTERN.match(query)
+    if not match or not match.group(2):
+        return []
+    
+    amount_text, from_text, to_text = match.groups()
+    amount = float(amount_text.replace(',', '.').rstrip('.'))
+    
+    # Исходная валюта может быть недописана: берём лучшее совпадение поиска
+    from_curr = converter.index.resolve(from_text) or next(iter(converter.search_currencies(from_text, limit=1)), None)
+    if from_curr is None:
+        return []
+    
+    if to_text is None or to_text in INLINE_SEPARATORS or to_text in ALL_TARGETS:
+        targets = converter.conversion_targets(from_curr)
     else:
-        # Показываем главное меню
-        await update.message.reply_text(
-            MESSAGES['welcome'],
-            reply_markup=KeyboardBuilder.main_menu()
-        )
+        to_curr = converter.index.resolve(to_text)
+        targets = [to_curr] if to_curr else converter.search_currencies(to_text, limit=INLINE_MAX_RESULTS)
+    targets = [target for target in targets if target != from_curr][:INLINE_MAX_RESULTS]
+    
+    # Только снимок в памяти: недостающий курс - нет варианта, а не загрузка на каждое нажатие
+    conversions = converter.convert_snapshot([(amount, from_curr, target) for target in targets])
+    
+    results = []
+    for result in conversions:
+        if result is None:
+            continue
+        results.append(InlineQueryResultArticle(
+            id=f"{result.from_currency}-{result.to_currency}-{amount_text}",
+            title=f"{result.amount:g} {result.from_currency} = {result.result} {result.to_currency}",
+            description=f"Курс: 1 {result.from_currency} = {result.rate} {result.to_currency}",
+            input_message_content=InputTextMessageContent(format_conversion_result(result))
+        ))
+    return results
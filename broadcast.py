@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from asyncio_throttle import Throttler
+from telegram.error import Forbidden
+
+RUNNING, DONE = 'running', 'done'
+
+
+class BroadcastJob:
+    """Состояние рассылки: текст, позиция (последний обработанный id) и счётчики"""
+    __slots__ = ('broadcast_id', 'text', 'cursor', 'status', 'sent', 'failed',
+                 'blocked', 'started_at', 'updated_at')
+
+    def __init__(self, broadcast_id: str, text: str, cursor: str = '', status: str = RUNNING,
+                 sent: int = 0, failed: int = 0, blocked: int = 0,
+                 started_at: Optional[float] = None, updated_at: Optional[float] = None):
+        self.broadcast_id = broadcast_id
+        self.text = text
+        self.cursor = cursor
+        self.status = status
+        self.sent = sent
+        self.failed = failed
+        self.blocked = blocked
+        self.started_at = started_at or time.time()
+        self.updated_at = updated_at or self.started_at
+
+    def as_dict(self) -> Dict:
+        elapsed = max(self.updated_at - self.started_at, 1e-9)
+        processed = self.sent + self.failed + self.blocked
+        return {
+            'status': self.status,
+            'sent': self.sent,
+            'failed': self.failed,
+            'blocked': self.blocked,
+            'per_second': round(processed / elapsed, 1),
+            'elapsed_seconds': round(elapsed, 1)
+        }
+
+
+class BroadcastStore:
+    """Рассылки и их контрольные точки в SQLite (WAL)"""
+
+    COLUMNS = ('broadcast_id', 'text', 'cursor', 'status', 'sent', 'failed',
+               'blocked', 'started_at', 'updated_at')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = asyncio.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS broadcasts ("
+            " broadcast_id TEXT PRIMARY KEY,"
+            " text TEXT NOT NULL,"
+            " cursor TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " sent INTEGER NOT NULL,"
+            " failed INTEGER NOT NULL,"
+            " blocked INTEGER NOT NULL,"
+            " started_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL"
+            ")"
+        )
+        conn.commit()
+        return conn
+
+    async def _run(self, func, *args):
+        async with self._db_lock:
+            if self._conn is None:
+                self._conn = await asyncio.to_thread(self._open)
+            return await asyncio.to_thread(func, self._conn, *args)
+
+    @classmethod
+    def _row(cls, job: BroadcastJob) -> tuple:
+        return tuple(getattr(job, column) for column in cls.COLUMNS)
+
+    @classmethod
+    def _insert(cls, conn: sqlite3.Connection, job: BroadcastJob) -> bool:
+        with conn:
+            cursor = conn.execute(
+                f"INSERT OR IGNORE INTO broadcasts ({', '.join(cls.COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(cls.COLUMNS))})",
+                cls._row(job)
+            )
+        return cursor.rowcount == 1
+
+    @classmethod
+    def _checkpoint(cls, conn: sqlite3.Connection, job: BroadcastJob):
+        with conn:
+            conn.execute(
+                "UPDATE broadcasts SET cursor = ?, status = ?, sent = ?, failed = ?, blocked = ?, updated_at = ? "
+                "WHERE broadcast_id = ?",
+                (job.cursor, job.status, job.sent, job.failed, job.blocked, job.updated_at, job.broadcast_id)
+            )
+
+    @classmethod
+    def _load(cls, conn: sqlite3.Connection, status: Optional[str], limit: int) -> List[BroadcastJob]:
+        query = f"SELECT {', '.join(cls.COLUMNS)} FROM broadcasts"
+        params: tuple = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY started_at DESC LIMIT ?"
+        return [BroadcastJob(*row) for row in conn.execute(query, params + (limit,)).fetchall()]
+
+    async def insert(self, job: BroadcastJob) -> bool:
+        """Новая рассылка; False, если рассылка с таким id уже есть"""
+        return await self._run(self._insert, job)
+
+    async def checkpoint(self, job: BroadcastJob):
+        await self._run(self._checkpoint, job)
+
+    async def load(self, status: Optional[str] = None, limit: int = 100) -> List[BroadcastJob]:
+        return await self._run(self._load, status, limit)
+
+    async def close(self):
+        async with self._db_lock:
+            if self._conn is not None:
+                await asyncio.to_thread(self._conn.close)
+                self._conn = None
+
+
+class Broadcaster:
+    """
+    Рассылка всем подписанным пользователям.
+    Получатели читаются из хранилища порциями, отправка идёт с ограниченной
+    параллельностью и собственным лимитом скорости (ниже общего, чтобы
+    оставить запас для ответов в чатах). После каждой порции позиция
+    сохраняется, поэтому после перезапуска рассылка продолжается с места
+    остановки: повторно может уйти не больше одной порции.
+    """
+
+    def __init__(self, store: BroadcastStore,
+                 recipients: Callable[[str, int], Awaitable[List[str]]],
+                 chunk_size: int, concurrency: int, rate_limit: int,
+                 send: Optional[Callable[[str, str], Awaitable]] = None):
+        self.store = store
+        self.recipients = recipients
+        self.chunk_size = chunk_size
+        self.send = send
+        self._send_slots = asyncio.Semaphore(concurrency)
+        self._throttler = Throttler(rate_limit, 1.0)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._jobs: Dict[str, BroadcastJob] = {}
+
+    async def start(self, broadcast_id: str, text: str) -> bool:
+        """Запуск рассылки; False, если рассылка с таким id уже была"""
+        job = BroadcastJob(broadcast_id, text)
+        if not await self.store.insert(job):
+            return False
+        self._launch(job)
+        return True
+
+    async def resume_pending(self):
+        """Продолжение рассылок, прерванных остановкой бота"""
+        for job in await self.store.load(RUNNING):
+            if job.broadcast_id not in self._tasks:
+                logging.info(f"Продолжаем рассылку {job.broadcast_id} после {job.cursor or 'начала'}")
+                self._launch(job)
+
+    def _launch(self, job: BroadcastJob):
+        self._jobs[job.broadcast_id] = job
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.broadcast_id, None))
+
+    async def _run(self, job: BroadcastJob):
+        try:
+            while True:
+                chunk = await self.recipients(job.cursor, self.chunk_size)
+                if not chunk:
+                    break
+                await asyncio.gather(*(self._send_one(job, user_id) for user_id in chunk))
+                job.cursor = chunk[-1]
+                job.updated_at = time.time()
+                await self.store.checkpoint(job)
+
+            job.status = DONE
+            job.updated_at = time.time()
+            await self.store.checkpoint(job)
+            logging.info(f"Рассылка {job.broadcast_id} завершена: {job.as_dict()}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Рассылка остаётся незавершённой и продолжится при следующем запуске
+            logging.error(f"Рассылка {job.broadcast_id} прервана: {e}")
+
+    async def _send_one(self, job: BroadcastJob, user_id: str):
+        async with self._send_slots:
+            await self._throttler.acquire()
+            try:
+                await self.send(user_id, job.text)
+                job.sent += 1
+            except Forbidden:
+                # Пользователь заблокировал бота
+                job.blocked += 1
+            except Exception as e:
+                job.failed += 1
+                logging.warning(f"Рассылка {job.broadcast_id}: не доставлено {user_id}: {e}")
+
+    def metrics(self) -> Dict:
+        """Статистика рассылок текущего запуска"""
+        return {broadcast_id: job.as_dict() for broadcast_id, job in self._jobs.items()}
+
+    async def history(self, limit: int = 5) -> List[BroadcastJob]:
+        """Последние рассылки (включая прошлые запуски)"""
+        return await self.store.load(limit=limit)
+
+    async def close(self):
+        """Остановка рассылок: продолжатся с последней контрольной точки"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.store.close()
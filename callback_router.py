@@ -0,0 +1,176 @@
+import re
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Версия формата callback_data. Кнопки старых версий распознаются как устаревшие.
+CALLBACK_VERSION = '1'
+CALLBACK_SEPARATOR = ':'
+CALLBACK_MAX_BYTES = 64  # ограничение Telegram
+
+
+class CB:
+    """Короткие ключи маршрутов callback_data"""
+    MAIN = 'm'
+    CONVERT = 'cv'
+    CURRENCY_TYPE = 't'
+    CURRENCY = 'c'
+    CONVERT_FROM = 'cf'
+    SEARCH = 'sr'
+    QUICK_AMOUNT = 'q'
+    NEW_AMOUNT = 'na'
+    MANUAL_AMOUNT = 'ma'
+    SWAP = 'sw'
+    BACK_CURRENCY_SELECTION = 'bs'
+    RATES = 'r'
+    RATES_SCREEN = 'rs'
+    REFRESH = 'rr'
+    TRENDING = 'tr'
+    TRENDING_SCREEN = 'ts'
+    ABOUT = 'a'
+    SETTINGS = 's'
+    SETTINGS_OPTION = 'so'
+    CHART = 'ch'
+    FAVORITE = 'fv'
+    ALERT = 'al'
+    ALERT_ADD = 'aa'
+    ALERT_DELETE = 'ad'
+    NOOP = 'n'
+
+
+class RouteStats:
+    """Счётчики вызовов и задержки обработчика маршрута"""
+    __slots__ = ('count', 'errors', 'total_seconds', 'max_seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds: float, failed: bool):
+        self.count += 1
+        self.errors += failed
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def as_dict(self) -> Dict:
+        mean = self.total_seconds / self.count if self.count else 0.0
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': round(mean * 1000, 3),
+            'max_ms': round(self.max_seconds * 1000, 3)
+        }
+
+
+class Route:
+    __slots__ = ('key', 'handler', 'arg_types', 'stats')
+
+    def __init__(self, key: str, handler: Optional[Callable], arg_types: Tuple[type, ...]):
+        self.key = key
+        self.handler = handler
+        self.arg_types = arg_types
+        self.stats = RouteStats()
+
+
+class CallbackRouter:
+    """
+    Табличный маршрутизатор callback_data вида '<версия><ключ>:<арг>:<арг>'.
+    Поиск обработчика - одно обращение к словарю, аргументы приходят уже
+    разобранными и приведёнными к типам маршрута.
+    """
+
+    def __init__(self, version: str = CALLBACK_VERSION):
+        self.version = version
+        self._routes: Dict[str, Route] = {}
+
+    def route(self, key: str, *arg_types: type):
+        """Декоратор регистрации обработчика для ключа"""
+        def decorator(handler: Callable) -> Callable:
+            if key in self._routes:
+                raise ValueError(f"Маршрут '{key}' уже зарегистрирован")
+            self._routes[key] = Route(key, handler, arg_types)
+            return handler
+        return decorator
+
+    def declare(self, key: str, *arg_types: type):
+        """
+        Формат ключа, который обрабатывается не маршрутизатором (например,
+        точка входа ConversationHandler): parse его разбирает, dispatch - нет
+        """
+        if key in self._routes:
+            raise ValueError(f"Маршрут '{key}' уже зарегистрирован")
+        self._routes[key] = Route(key, None, arg_types)
+
+    def verify(self, datas: Iterable[str]):
+        """Проверка, что все callback_data разбираются (ValueError со списком нераспознанных)"""
+        unknown = sorted({data for data in datas if self.parse(data) is None})
+        if unknown:
+            raise ValueError(f"callback_data без маршрута: {', '.join(unknown)}")
+
+    def encode(self, key: str, *args) -> str:
+        """Сборка callback_data для кнопки"""
+        parts = [f"{self.version}{key}"]
+        for arg in args:
+            value = str(arg)
+            if CALLBACK_SEPARATOR in value:
+                raise ValueError(f"Недопустимый аргумент callback: {value}")
+            parts.append(value)
+        data = CALLBACK_SEPARATOR.join(parts)
+        if len(data.encode('utf-8')) > CALLBACK_MAX_BYTES:
+            raise ValueError(f"callback_data длиннее {CALLBACK_MAX_BYTES} байт: {data}")
+        return data
+
+    def pattern(self, key: str) -> str:
+        """Регулярное выражение для CallbackQueryHandler(pattern=...)"""
+        return f"^{re.escape(self.version + key)}({re.escape(CALLBACK_SEPARATOR)}|$)"
+
+    def parse(self, data: Optional[str]) -> Optional[Tuple[Route, tuple]]:
+        """Маршрут и типизированные аргументы, либо None для чужих/устаревших данных"""
+        if not data or not data.startswith(self.version):
+            return None
+
+        head, *raw_args = data[len(self.version):].split(CALLBACK_SEPARATOR)
+        route = self._routes.get(head)
+        if route is None or len(raw_args) != len(route.arg_types):
+            return None
+
+        try:
+            args = tuple(arg_type(raw) for arg_type, raw in zip(route.arg_types, raw_args))
+        except ValueError:
+            return None
+        return route, args
+
+    async def dispatch(self, data: Optional[str], *handler_args) -> bool:
+        """
+        Вызов обработчика: handler(*handler_args, *аргументы_маршрута).
+        False, если callback_data не распознана.
+        """
+        parsed = self.parse(data)
+        if parsed is None:
+            return False
+
+        route, args = parsed
+        if route.handler is None:
+            return False
+        started = time.perf_counter()
+        failed = True
+        try:
+            await route.handler(*handler_args, *args)
+            failed = False
+        finally:
+            route.stats.observe(time.perf_counter() - started, failed)
+        return True
+
+    def stats(self) -> Dict[str, Dict]:
+        """Статистика по маршрутам (для мониторинга)"""
+        return {
+            f"{route.key}:{route.handler.__name__}": route.stats.as_dict()
+            for route in self._routes.values() if route.handler is not None
+        }
+
+
+# Общий маршрутизатор бота и сокращение для кнопок
+router = CallbackRouter()
+cb = router.encode
@@ -0,0 +1,99 @@
+import logging
+import random
+import time
+from typing import Dict, Optional
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для внешнего источника.
+    closed - запросы идут; после failure_threshold ошибок подряд - open:
+    запросы не выполняются до истечения паузы. Пауза растёт экспоненциально
+    с каждым повторным открытием (со случайным разбросом, чтобы экземпляры
+    бота не стучались в источник одновременно). После паузы - half_open:
+    пропускается один пробный запрос, успех закрывает цепь, ошибка снова
+    открывает её с удвоенной паузой.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, backoff_base: float,
+                 backoff_max: float, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+
+        self.state = CLOSED
+        self.failures = 0        # ошибок подряд
+        self.opened_times = 0    # открытий подряд (показатель экспоненты)
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.transitions: Dict[str, int] = {OPEN: 0, HALF_OPEN: 0, CLOSED: 0}
+        self.rejected = 0
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logging.warning(f"Источник {self.name}: {self.state} -> {state}")
+        self.state = state
+        self.transitions[state] += 1
+
+    def backoff(self) -> float:
+        """Пауза перед пробным запросом: экспонента с «равным» разбросом (от половины до полной)"""
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** max(self.opened_times - 1, 0))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def allow(self) -> bool:
+        """Можно ли сейчас выполнить запрос (в half_open - только один пробный)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.clock() >= self.open_until:
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def available(self) -> bool:
+        """Проверка без захвата пробного запроса"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return self.clock() >= self.open_until
+        return not self.probe_in_flight
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_times = 0
+        self.probe_in_flight = False
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_times += 1
+            self.open_until = self.clock() + self.backoff()
+            self._transition(OPEN)
+
+    def release(self):
+        """Запрос отменён без результата - пробный запрос можно повторить"""
+        self.probe_in_flight = False
+
+    def retry_in(self) -> Optional[float]:
+        if self.state != OPEN:
+            return None
+        return max(0.0, self.open_until - self.clock())
+
+    def metrics(self) -> Dict:
+        retry_in = self.retry_in()
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'retry_in_seconds': round(retry_in, 1) if retry_in is not None else None,
+            'rejected': self.rejected,
+            'transitions': dict(self.transitions)
+        }
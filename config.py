@@ -3,7 +3,29 @@ from typing import Dict, List
 
 # Telegram Bot Configuration
 API_KEY = os.getenv("TELEGRAM_API_KEY")
-WEB_APP_URL = os.getenv("WEB_APP_URL", "https://your-domain.com/webapp")
+WEB_APP_URL = os.getenv("WEB_APP_URL", "https://your-domain.com/webapp.html")  # Mini App, которую отдаёт сам бот
+# Адрес HTTP сервера бота (https://bot.example.com), если Mini App размещена на другом
+# домене; передаётся странице параметром ?api=. Пусто - API на том же домене, что и страница
+WEBAPP_API_URL = os.getenv("WEBAPP_API_URL", "")
+
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес сервера, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+WEBHOOK_MAX_CONNECTIONS = 40
+
+# Встроенный HTTP сервер (webhook, health/readiness)
+HTTP_SERVER_ENABLED = os.getenv("HTTP_SERVER_ENABLED", "false").lower() == "true"
+HTTP_HOST = os.getenv("HTTP_HOST", "0.0.0.0")
+HTTP_PORT = int(os.getenv("PORT", "8080"))
+UPDATE_QUEUE_SIZE = 1000             # Обновлений в очереди до включения обратного давления
+UPDATE_WORKERS = 32                  # Параллельных обработчиков очереди
+UPDATE_ENQUEUE_TIMEOUT_SECONDS = 5   # Сколько ждать места в очереди до ответа 503
+WEBAPP_FILE = os.getenv("WEBAPP_FILE", "webapp.html")  # Отдаётся по /webapp.html вместе с /api/rates
+STREAM_HEARTBEAT_SECONDS = 15   # Пинг открытых потоков /api/rates/stream
+STREAM_HISTORY_VERSIONS = 32    # Версий снимка, с которых клиент получает дельту, а не полный снимок
+STREAM_CLIENT_QUEUE_SIZE = 8    # Кадров в очереди клиента до его отключения
 
 # Currency Settings
 DEFAULT_FIAT_CURRENCY = "USD"
@@ -12,11 +34,83 @@ DEFAULT_CRYPTO_CURRENCY = "bitcoin"
 # Formatting Settings
 DECIMAL_PLACES_FIAT = 2
 DECIMAL_PLACES_CRYPTO = 8
+DECIMAL_PLACES_FIAT_RATE = 6          # Курс фиат -> фиат
+CURRENCY_DECIMAL_PLACES = {'JPY': 0}  # Валюты с точностью не по умолчанию (ISO 4217)
 
 # Cache Settings
-CACHE_DURATION_MINUTES = 15
+# Время жизни курсов по классам активов: фиат источники обновляют раз в сутки,
+# крипто меняется постоянно - поэтому классы обновляются независимо
+RATE_CACHE_TTL_SECONDS = {
+    'fiat': int(os.getenv("FIAT_CACHE_TTL_SECONDS", 6 * 3600)),
+    'crypto': int(os.getenv("CRYPTO_CACHE_TTL_SECONDS", 10 * 60))
+}
 API_TIMEOUT_SECONDS = 10
 
+# Источники курсов (тип, базовый URL) в порядке предпочтения
+FIAT_PROVIDERS = [
+    ('exchangerate-api', os.getenv("EXCHANGERATE_API_URL", "https://api.exchangerate-api.com/v4")),
+    ('open-er-api', os.getenv("OPEN_ER_API_URL", "https://open.er-api.com"))
+]
+CRYPTO_PROVIDERS = [
+    ('coingecko', os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")),
+    ('coincap', os.getenv("COINCAP_API_URL", "https://api.coincap.io/v2"))
+]
+PROVIDER_HEDGE_PERCENTILE = 0.9      # Хедж, если основной источник отвечает дольше своего p90
+PROVIDER_HEDGE_DEFAULT_SECONDS = 2.0 # Порог хеджа, пока задержка источника не набрана
+PROVIDER_HEDGE_MIN_SECONDS = 0.2     # Не хеджировать раньше (защита от лишних дублей)
+PROVIDER_HEDGE_MIN_SAMPLES = 5
+PROVIDER_EXPLORE_RATE = 0.05         # Доля запросов, где первым пробуется второй источник
+PROVIDER_FAILURE_THRESHOLD = 3       # Ошибок подряд до отключения источника (circuit breaker)
+PROVIDER_BACKOFF_BASE_SECONDS = 10   # Первая пауза отключённого источника, дальше удваивается
+PROVIDER_BACKOFF_MAX_SECONDS = 600
+
+# Background Refresh Settings
+RATES_REFRESH_INTERVAL_SECONDS = 30   # Как часто фоновая задача проверяет кэш
+# За сколько до истечения кэша обновлять курсы
+RATES_REFRESH_AHEAD_SECONDS = {'fiat': 15 * 60, 'crypto': 60}
+# После этого курсы показываются как устаревшие
+RATES_MAX_STALENESS_SECONDS = {'fiat': 36 * 3600, 'crypto': 60 * 60}
+
+# Снимок курсов на диске (для быстрого старта после перезапуска)
+RATES_SNAPSHOT_PATH = os.getenv("RATES_SNAPSHOT_PATH", "data/rates.snapshot")
+
+# Хранилище пользователей
+USER_DB_PATH = os.getenv("USER_DB_PATH", "data/users.db")
+USER_FLUSH_INTERVAL_SECONDS = 5
+USER_CACHE_SIZE = 10000
+
+# Ценовые уведомления
+ALERTS_DB_PATH = os.getenv("ALERTS_DB_PATH", "data/alerts.db")
+ALERTS_MAX_PER_USER = 10
+ALERTS_SEND_CONCURRENCY = 20   # Одновременных отправок сработавших уведомлений
+ALERTS_QUICK_PERCENT = 5       # Порог быстрых кнопок: ±5% от текущей цены / за 24 ч
+
+# Рассылки (ежедневный дайджест и объявления)
+BROADCAST_DB_PATH = os.getenv("BROADCAST_DB_PATH", "data/broadcasts.db")
+BROADCAST_CHUNK_SIZE = 500       # Получателей за одно чтение из БД (и между контрольными точками)
+BROADCAST_CONCURRENCY = 20       # Одновременных отправок
+BROADCAST_RATE_LIMIT = 20        # Сообщений в секунду (запас до общего лимита - для ответов в чатах)
+DIGEST_TIME_UTC = os.getenv("DIGEST_TIME_UTC", "06:00")
+ADMIN_USER_IDS = {user_id.strip() for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+# История курсов
+HISTORY_DIR = os.getenv("HISTORY_DIR", "data/history")
+HISTORY_RING_CAPACITY = 2000  # Последние точки каждой валюты в памяти
+HISTORY_CHART_HOURS = 24
+HISTORY_CHART_POINTS = 24
+
+# HTTP Client Settings
+HTTP_POOL_LIMIT = 100
+HTTP_POOL_LIMIT_PER_HOST = 10
+HTTP_DNS_CACHE_SECONDS = 300
+HTTP_KEEPALIVE_SECONDS = 60
+
+# Outgoing Messages (лимиты Bot API)
+SEND_GLOBAL_RATE_LIMIT = 30    # Сообщений в секунду на весь бот
+SEND_CHAT_RATE_LIMIT = 3       # Сообщений в один чат за SEND_CHAT_RATE_PERIOD
+SEND_CHAT_RATE_PERIOD = 3.0
+SEND_MAX_RETRIES = 3           # Повторов после 429 Too Many Requests
+
 # Messages Configuration
 MESSAGES = {
     'welcome': "💱 Добро пожаловать в валютный конвертер!\n\nВыберите действие:",
@@ -29,6 +123,8 @@ MESSAGES = {
     'error_currency_not_supported': "❌ Валюта не поддерживается.",
     'rates_updated': "✅ Курсы валют обновлены",
     'loading': "⏳ Загрузка...",
+    'outdated_button': "⌛ Эта кнопка устарела. Выберите действие:",
+    'stale_rates': "⚠️ Курсы могут быть устаревшими (последнее обновление: {timestamp})",
     'trending_title': "📈 Популярные валюты",
     'about_text': """
 💱 **Валютный конвертер**
@@ -45,7 +141,7 @@ MESSAGES = {
 • 12+ криптовалют
 • Регулярное обновление курсов
 
-🔄 **Обновление:** каждые 15 минут
+🔄 **Обновление:** криптовалюты - каждые 10 минут, фиат - несколько раз в сутки
 📊 **Источники:** ExchangeRate-API, CoinGecko
 
 Разработано с ❤️ для удобного обмена валют
@@ -83,6 +179,30 @@ CURRENCY_EMOJIS = {
     'AVAX': '🏔️'
 }
 
+# Currency aliases (псевдоним -> канонический id)
+CURRENCY_ALIASES = {
+    # Fiat currencies
+    'доллар': 'USD', 'доллары': 'USD', 'долларов': 'USD', 'доллара': 'USD',
+    'бакс': 'USD', 'баксы': 'USD', 'баксов': 'USD', 'dollar': 'USD', 'dollars': 'USD', 'buck': 'USD', 'bucks': 'USD',
+    'евро': 'EUR', 'euro': 'EUR', 'euros': 'EUR',
+    'рубль': 'RUB', 'рубли': 'RUB', 'рублей': 'RUB', 'рубля': 'RUB', 'руб': 'RUB', 'ruble': 'RUB', 'rouble': 'RUB',
+    'фунт': 'GBP', 'фунты': 'GBP', 'фунтов': 'GBP', 'pound': 'GBP', 'pounds': 'GBP',
+    'йена': 'JPY', 'иена': 'JPY', 'йен': 'JPY', 'yen': 'JPY',
+    'юань': 'CNY', 'юани': 'CNY', 'юаней': 'CNY', 'yuan': 'CNY',
+    'франк': 'CHF', 'франки': 'CHF', 'франков': 'CHF', 'franc': 'CHF',
+    'тенге': 'KZT', 'tenge': 'KZT',
+    'гривна': 'UAH', 'гривны': 'UAH', 'гривен': 'UAH', 'hryvnia': 'UAH',
+    
+    # Crypto currencies
+    'биткоин': 'bitcoin', 'биткоины': 'bitcoin', 'биткоинов': 'bitcoin', 'биток': 'bitcoin', 'битки': 'bitcoin',
+    'эфир': 'ethereum', 'эфириум': 'ethereum', 'ether': 'ethereum',
+    'бнб': 'binancecoin', 'кардано': 'cardano', 'солана': 'solana',
+    'рипл': 'ripple', 'ripple': 'ripple', 'полкадот': 'polkadot',
+    'доги': 'dogecoin', 'додж': 'dogecoin', 'догикоин': 'dogecoin',
+    'полигон': 'polygon', 'matic': 'polygon', 'лайткоин': 'litecoin',
+    'чейнлинк': 'chainlink', 'лавина': 'avalanche-2', 'avalanche': 'avalanche-2'
+}
+
 # Button texts
 BUTTONS = {
     'convert': "💱 Конвертировать",
@@ -98,6 +218,18 @@ BUTTONS = {
     'settings': "⚙️ Настройки"
 }
 
+# Batch conversion (несколько строк или "100 usd to all" в одном сообщении)
+MAX_BATCH_CONVERSIONS = 100
+
+# Inline mode (@bot 100 usd eur)
+INLINE_MAX_RESULTS = 20
+INLINE_CACHE_SIZE = 2048
+INLINE_CACHE_TTL_SECONDS = 30     # Локальный кэш ответов на одинаковые запросы
+INLINE_CACHE_TIME_SECONDS = 60    # cache_time для серверов Telegram
+
+# Keyboard cache (клавиатуры с параметрами, LRU)
+KEYBOARD_CACHE_SIZE = 1024
+
 # Web App Configuration
 WEBAPP_CONFIG = {
     'title': "Валютный конвертер",
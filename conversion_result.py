@@ -0,0 +1,60 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional, Union
+
+from money import Money
+
+TIMESTAMP_FORMAT = '%H:%M %d.%m.%Y'
+
+Number = Union[int, float]
+
+
+@lru_cache(maxsize=8)
+def format_timestamp(timestamp: Optional[datetime]) -> str:
+    """Время снимка для пользователя; одно форматирование на снимок"""
+    if timestamp is None:
+        return "—"
+    return timestamp.strftime(TIMESTAMP_FORMAT)
+
+
+class ConversionResult:
+    """
+    Результат конвертации. Время - загрузка курсов, по которым посчитан
+    результат (более старая из классов обеих валют); строка для
+    пользователя форматируется при первом обращении и запоминается.
+    """
+    __slots__ = ('amount', 'from_currency', 'to_currency', 'result', 'rate',
+                 'timestamp', 'version', '_timestamp_text')
+
+    def __init__(self, amount: Number, from_currency: str, to_currency: str,
+                 result: Money, rate: Money, timestamp: Optional[datetime], version: int):
+        self.amount = amount
+        self.from_currency = from_currency
+        self.to_currency = to_currency
+        self.result = result
+        self.rate = rate
+        self.timestamp = timestamp
+        self.version = version
+        self._timestamp_text: Optional[str] = None
+
+    @property
+    def timestamp_text(self) -> str:
+        if self._timestamp_text is None:
+            self._timestamp_text = format_timestamp(self.timestamp)
+        return self._timestamp_text
+
+    def as_dict(self) -> Dict:
+        """Представление для JSON (API Mini App): суммы - точной десятичной строкой, как в чате"""
+        return {
+            'amount': self.amount,
+            'from_currency': self.from_currency,
+            'to_currency': self.to_currency,
+            'result': str(self.result),
+            'rate': str(self.rate),
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'version': self.version
+        }
+
+    def __repr__(self) -> str:
+        return (f"ConversionResult({self.amount} {self.from_currency} = "
+                f"{self.result} {self.to_currency}, rate={self.rate})")
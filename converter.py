@@ -1,35 +1,68 @@
-import requests
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Union
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 import json
+import numpy as np
+
+from http_client import HttpClient
+from money import Money, currency_places
+from conversion_result import ConversionResult
+from rate_providers import FIAT, CRYPTO, RateProvider, RateSource, build_providers
+from rate_matrix import RateMatrix
+from currency_index import CurrencyIndex
+from rate_snapshot import save_snapshot, load_snapshot
+from config import (
+    RATE_CACHE_TTL_SECONDS, RATES_REFRESH_AHEAD_SECONDS, RATES_MAX_STALENESS_SECONDS, RATES_SNAPSHOT_PATH,
+    CURRENCY_ALIASES, DECIMAL_PLACES_FIAT_RATE, API_TIMEOUT_SECONDS, FIAT_PROVIDERS, CRYPTO_PROVIDERS,
+    PROVIDER_HEDGE_PERCENTILE, PROVIDER_HEDGE_DEFAULT_SECONDS, PROVIDER_HEDGE_MIN_SECONDS,
+    PROVIDER_HEDGE_MIN_SAMPLES, PROVIDER_EXPLORE_RATE, PROVIDER_FAILURE_THRESHOLD,
+    PROVIDER_BACKOFF_BASE_SECONDS, PROVIDER_BACKOFF_MAX_SECONDS
+)
 
 class CurrencyConverter:
-    def __init__(self):
-        # API для фиатных валют
-        self.fiat_api_url = "https://api.exchangerate-api.com/v4/latest/USD"
-        self.crypto_api_url = "https://api.coingecko.com/api/v3/simple/price"
+    def __init__(self, snapshot_path: Optional[str] = RATES_SNAPSHOT_PATH,
+                 fiat_providers: Optional[Sequence[RateProvider]] = None,
+                 crypto_providers: Optional[Sequence[RateProvider]] = None):
+        # Источники курсов: несколько на класс активов, с хеджированием медленных
+        self.fiat_source = self._rate_source(FIAT, fiat_providers or build_providers(FIAT_PROVIDERS))
+        self.crypto_source = self._rate_source(CRYPTO, crypto_providers or build_providers(CRYPTO_PROVIDERS))
+        
+        # Общий HTTP клиент с пулом соединений
+        self.http = HttpClient()
         
         # Кэш для курсов валют
         self.fiat_cache = {}
         self.crypto_cache = {}
-        self.cache_timestamp = None
-        self.cache_duration = timedelta(minutes=15)  # Обновляем каждые 15 минут
+        self.cache_timestamp = None  # время последнего снимка (любого класса)
+        
+        # Фиат и крипто живут в кэше независимо: свои TTL и время загрузки
+        self.timestamps: Dict[str, Optional[datetime]] = {FIAT: None, CRYPTO: None}
+        self.cache_ttl = {kind: timedelta(seconds=seconds) for kind, seconds in RATE_CACHE_TTL_SECONDS.items()}
+        self.refresh_ahead = {kind: timedelta(seconds=seconds) for kind, seconds in RATES_REFRESH_AHEAD_SECONDS.items()}
+        self.max_staleness = {kind: timedelta(seconds=seconds) for kind, seconds in RATES_MAX_STALENESS_SECONDS.items()}
+        self.snapshot_path = snapshot_path
+        
+        # Текущие загрузки по провайдерам (single-flight)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._attempted = set()  # классы, для которых первая загрузка уже завершилась (успешно или нет)
+        
+        # Подписчики на успешное обновление курсов
+        self._refresh_listeners = []
         
         # Поддерживаемые валюты
         self.supported_fiat = {
-            'USD': {'name': 'Доллар США', 'symbol': '$', 'flag': '🇺🇸'},
-            'EUR': {'name': 'Евро', 'symbol': '€', 'flag': '🇪🇺'},
-            'RUB': {'name': 'Российский рубль', 'symbol': '₽', 'flag': '🇷🇺'},
-            'GBP': {'name': 'Британский фунт', 'symbol': '£', 'flag': '🇬🇧'},
-            'JPY': {'name': 'Японская йена', 'symbol': '¥', 'flag': '🇯🇵'},
-            'CNY': {'name': 'Китайский юань', 'symbol': '¥', 'flag': '🇨🇳'},
-            'CAD': {'name': 'Канадский доллар', 'symbol': 'C$', 'flag': '🇨🇦'},
-            'AUD': {'name': 'Австралийский доллар', 'symbol': 'A$', 'flag': '🇦🇺'},
-            'CHF': {'name': 'Швейцарский франк', 'symbol': 'CHF', 'flag': '🇨🇭'},
-            'KZT': {'name': 'Казахстанский тенге', 'symbol': '₸', 'flag': '🇰🇿'},
-            'UAH': {'name': 'Украинская гривна', 'symbol': '₴', 'flag': '🇺🇦'},
-            'BYN': {'name': 'Белорусский рубль', 'symbol': 'Br', 'flag': '🇧🇾'}
+            'USD': {'name': 'Доллар США', 'name_en': 'US Dollar', 'symbol': '$', 'flag': '🇺🇸'},
+            'EUR': {'name': 'Евро', 'name_en': 'Euro', 'symbol': '€', 'flag': '🇪🇺'},
+            'RUB': {'name': 'Российский рубль', 'name_en': 'Russian Ruble', 'symbol': '₽', 'flag': '🇷🇺'},
+            'GBP': {'name': 'Британский фунт', 'name_en': 'British Pound', 'symbol': '£', 'flag': '🇬🇧'},
+            'JPY': {'name': 'Японская йена', 'name_en': 'Japanese Yen', 'symbol': '¥', 'flag': '🇯🇵'},
+            'CNY': {'name': 'Китайский юань', 'name_en': 'Chinese Yuan', 'symbol': '¥', 'flag': '🇨🇳'},
+            'CAD': {'name': 'Канадский доллар', 'name_en': 'Canadian Dollar', 'symbol': 'C$', 'flag': '🇨🇦'},
+            'AUD': {'name': 'Австралийский доллар', 'name_en': 'Australian Dollar', 'symbol': 'A$', 'flag': '🇦🇺'},
+            'CHF': {'name': 'Швейцарский франк', 'name_en': 'Swiss Franc', 'symbol': 'CHF', 'flag': '🇨🇭'},
+            'KZT': {'name': 'Казахстанский тенге', 'name_en': 'Kazakhstani Tenge', 'symbol': '₸', 'flag': '🇰🇿'},
+            'UAH': {'name': 'Украинская гривна', 'name_en': 'Ukrainian Hryvnia', 'symbol': '₴', 'flag': '🇺🇦'},
+            'BYN': {'name': 'Белорусский рубль', 'name_en': 'Belarusian Ruble', 'symbol': 'Br', 'flag': '🇧🇾'}
         }
         
         self.supported_crypto = {
@@ -46,14 +79,34 @@ class CurrencyConverter:
             'chainlink': {'name': 'Chainlink', 'symbol': 'LINK', 'icon': '🔗'},
             'avalanche-2': {'name': 'Avalanche', 'symbol': 'AVAX', 'icon': '🏔️'}
         }
+        
+        # Индекс разрешения кодов, названий и псевдонимов валют
+        self.index = CurrencyIndex(self.supported_fiat, self.supported_crypto, CURRENCY_ALIASES)
+        
+        # Матрица кросс-курсов, пересобирается при каждом обновлении
+        self.snapshot_version = 0
+        self.rate_matrix = RateMatrix.empty(self._matrix_codes())
+
+    @staticmethod
+    def _rate_source(asset_class: str, providers: Sequence[RateProvider]) -> RateSource:
+        return RateSource(
+            asset_class, providers,
+            hedge_percentile=PROVIDER_HEDGE_PERCENTILE,
+            hedge_default_delay=PROVIDER_HEDGE_DEFAULT_SECONDS,
+            hedge_min_delay=PROVIDER_HEDGE_MIN_SECONDS,
+            hedge_min_samples=PROVIDER_HEDGE_MIN_SAMPLES,
+            failure_penalty=API_TIMEOUT_SECONDS,
+            failure_threshold=PROVIDER_FAILURE_THRESHOLD,
+            backoff_base=PROVIDER_BACKOFF_BASE_SECONDS,
+            backoff_max=PROVIDER_BACKOFF_MAX_SECONDS,
+            explore_rate=PROVIDER_EXPLORE_RATE
+        )
 
     async def _fetch_fiat_rates(self) -> Dict:
         """Получение курсов фиатных валют"""
         try:
-            response = requests.get(self.fiat_api_url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            return data.get('rates', {})
+            _, rates = await self.fiat_source.fetch(self.http)
+            return rates
         except Exception as e:
             print(f"Ошибка получения курсов фиат: {e}")
             return {}
@@ -61,211 +114,371 @@ class CurrencyConverter:
     async def _fetch_crypto_rates(self) -> Dict:
         """Получение курсов криптовалют"""
         try:
-            crypto_ids = ','.join(self.supported_crypto.keys())
-            params = {
-                'ids': crypto_ids,
-                'vs_currencies': 'usd,eur,rub',
-                'include_24hr_change': 'true'
-            }
-            response = requests.get(self.crypto_api_url, params=params, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            _, rates = await self.crypto_source.fetch(self.http, list(self.supported_crypto))
         except Exception as e:
             print(f"Ошибка получения курсов крипто: {e}")
             return {}
 
-    async def update_rates(self) -> bool:
-        """Обновление всех курсов валют"""
+        # Не все источники дают цены в EUR и RUB - досчитываем через курсы фиат
+        for data in rates.values():
+            for currency in ('eur', 'rub'):
+                if currency not in data and currency.upper() in self.fiat_cache:
+                    data[currency] = data.get('usd', 0) * self.fiat_cache[currency.upper()]
+        return rates
+
+    def provider_metrics(self) -> Dict:
+        """Задержки, ошибки и хеджирование источников курсов"""
+        return {FIAT: self.fiat_source.metrics(), CRYPTO: self.crypto_source.metrics()}
+
+    async def _single_flight(self, key: str, fetch) -> Dict:
+        """
+        Запуск загрузки с объединением одновременных запросов.
+        Если загрузка по ключу уже идёт, вызывающий ждёт её результат.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного ожидающего не должна отменять общую загрузку
+        return await asyncio.shield(task)
+
+    async def _refresh_fiat(self) -> Dict:
+        """Загрузка и сохранение курсов фиат"""
+        fiat_rates = await self._fetch_fiat_rates()
+        if fiat_rates:
+            self.fiat_cache = fiat_rates
+            self.timestamps[FIAT] = datetime.now()
+        return fiat_rates
+
+    async def _refresh_crypto(self) -> Dict:
+        """Загрузка и сохранение курсов крипто"""
+        crypto_rates = await self._fetch_crypto_rates()
+        if crypto_rates:
+            self.crypto_cache = crypto_rates
+            self.timestamps[CRYPTO] = datetime.now()
+        return crypto_rates
+
+    def _is_due(self, kind: str, now: datetime, ahead: Optional[Dict[str, timedelta]]) -> bool:
+        """Истёк ли (или истечёт в пределах ahead) кэш класса активов"""
+        timestamp = self.timestamps[kind]
+        if timestamp is None:
+            return True
+        margin = ahead.get(kind, timedelta(0)) if ahead else timedelta(0)
+        return now - timestamp >= self.cache_ttl[kind] - margin
+
+    async def update_rates(self, force: bool = False,
+                           ahead: Optional[Dict[str, timedelta]] = None,
+                           kinds: Optional[Sequence[str]] = None) -> bool:
+        """
+        Обновление курсов валют: загружаются только классы с истёкшим кэшем
+        force=True игнорирует кэш, но присоединяется к уже идущей загрузке
+        ahead - {класс: запас}, обновлять заранее, если до истечения осталось меньше
+        kinds - обновлять только эти классы (по умолчанию все)
+        """
         try:
             current_time = datetime.now()
-            
-            # Проверяем, нужно ли обновлять кэш
-            if (self.cache_timestamp and 
-                current_time - self.cache_timestamp < self.cache_duration):
+            refreshers = {FIAT: self._refresh_fiat, CRYPTO: self._refresh_crypto}
+            due = [
+                kind for kind in (kinds or refreshers)
+                if force or self._is_due(kind, current_time, ahead)
+            ]
+            if not due:
                 return True
             
-            # Получаем курсы параллельно
-            fiat_task = asyncio.create_task(self._fetch_fiat_rates())
-            crypto_task = asyncio.create_task(self._fetch_crypto_rates())
+            # Получаем курсы параллельно, не более одной загрузки на провайдера
+            results = await asyncio.gather(
+                *(self._single_flight(kind, refreshers[kind]) for kind in due)
+            )
+            self._attempted.update(due)
             
-            fiat_rates, crypto_rates = await asyncio.gather(fiat_task, crypto_task)
+            # Без свежих данных метку времени не сдвигаем - курсы стареют
+            if not any(results):
+                return False
             
-            if fiat_rates:
-                self.fiat_cache = fiat_rates
-            if crypto_rates:
-                self.crypto_cache = crypto_rates
-                
-            self.cache_timestamp = current_time
+            await self._publish()
             return True
             
         except Exception as e:
             print(f"Ошибка обновления курсов: {e}")
             return False
 
+    async def _publish(self):
+        """
+        Новый снимок: пересборка матрицы, сохранение и оповещение подписчиков.
+        Вызывающие, присоединившиеся к той же загрузке, застают матрицу уже
+        собранной по этим данным и ничего не повторяют.
+        """
+        if self.rate_matrix.timestamps == self.timestamps:
+            return
+        self.cache_timestamp = max(timestamp for timestamp in self.timestamps.values() if timestamp)
+        self._rebuild_matrix()
+        await self._persist_snapshot()
+        await self._notify_refresh()
+
+    def _matrix_codes(self) -> list:
+        """Порядок валют в матрице: сначала фиат, затем крипто"""
+        return list(self.supported_fiat) + list(self.supported_crypto)
+
+    def _rebuild_matrix(self):
+        """Пересборка матрицы кросс-курсов по текущим кэшам"""
+        self.snapshot_version += 1
+        self.rate_matrix = RateMatrix.from_caches(
+            self.fiat_cache,
+            self.crypto_cache,
+            self.supported_fiat,
+            self.supported_crypto,
+            timestamps=dict(self.timestamps),
+            version=self.snapshot_version
+        )
+
+    def add_refresh_listener(self, callback):
+        """Подписка на обновление курсов: async callback(converter)"""
+        self._refresh_listeners.append(callback)
+
+    async def _notify_refresh(self):
+        """Оповещение подписчиков о новом снимке курсов"""
+        for callback in self._refresh_listeners:
+            try:
+                await callback(self)
+            except Exception as e:
+                print(f"Ошибка обработчика обновления курсов: {e}")
+
+    async def _persist_snapshot(self):
+        """Сохранение текущего снимка курсов на диск"""
+        if not self.snapshot_path:
+            return
+        try:
+            await asyncio.to_thread(
+                save_snapshot, self.snapshot_path,
+                self.fiat_cache, self.crypto_cache, dict(self.timestamps)
+            )
+        except Exception as e:
+            print(f"Ошибка сохранения снимка курсов: {e}")
+
+    async def load_snapshot(self) -> bool:
+        """
+        Загрузка сохранённого снимка при старте.
+        Время загрузки каждого класса сохраняется, так что TTL продолжают
+        отсчитываться от него.
+        """
+        if not self.snapshot_path:
+            return False
+        try:
+            snapshot = await asyncio.to_thread(load_snapshot, self.snapshot_path)
+        except Exception as e:
+            print(f"Ошибка загрузки снимка курсов: {e}")
+            return False
+
+        if snapshot is None:
+            return False
+
+        self.fiat_cache, self.crypto_cache, timestamps = snapshot
+        self.timestamps.update(timestamps)
+        loaded = [timestamp for timestamp in self.timestamps.values() if timestamp]
+        if not loaded:
+            return False
+        self.cache_timestamp = max(loaded)
+        self._rebuild_matrix()
+        return True
+
+    async def refresh_in_background(self) -> bool:
+        """Фоновое обновление: обновляет кэш заранее, до его истечения"""
+        return await self.update_rates(ahead=self.refresh_ahead)
+
+    def awaiting_first_load(self, *kinds: str) -> List[str]:
+        """
+        Классы (из указанных, по умолчанию всех), которые ещё ни разу не
+        загружались: запрос пользователя ждёт только их первую загрузку
+        """
+        return [
+            kind for kind in (kinds or self.timestamps)
+            if self.timestamps[kind] is None and kind not in self._attempted
+        ]
+
+    async def ensure_rates(self, *kinds: str) -> bool:
+        """
+        Курсы нужных запросу классов (по умолчанию всех) для ответа пользователю.
+        Ждать приходится только первую загрузку класса (холодный старт без
+        снимка); если она не удалась, повторяет фоновая задача, а запрос
+        сразу получает "курса нет" - задержка провайдера на ответ не влияет.
+        """
+        pending = self.awaiting_first_load(*kinds)
+        if pending:
+            await self.update_rates(kinds=pending)
+        return all(self.timestamps[kind] is not None for kind in (kinds or self.timestamps))
+
+    def kinds_for(self, *currencies: str) -> List[str]:
+        """Классы активов, к которым относятся валюты (нераспознанные пропускаются)"""
+        kinds = set()
+        for currency in currencies:
+            code = self.index.resolve(currency)
+            if code is not None:
+                kinds.add(CRYPTO if code in self.supported_crypto else FIAT)
+        return sorted(kinds)
+
+    def stale_kinds(self) -> List[str]:
+        """Классы, курсы которых старше допустимого предела или ещё не загружены"""
+        now = datetime.now()
+        return [
+            kind for kind, timestamp in self.timestamps.items()
+            if timestamp is None or now - timestamp > self.max_staleness[kind]
+        ]
+
+    def rates_timestamp(self, *kinds: str) -> Optional[datetime]:
+        """
+        Время курсов указанных классов (по умолчанию всех) - более старое
+        из них; None, если какой-то класс ещё не загружен
+        """
+        timestamps = [self.timestamps[kind] for kind in (kinds or self.timestamps)]
+        if None in timestamps:
+            return None
+        return min(timestamps)
+
+    async def close(self):
+        """Освобождение сетевых ресурсов"""
+        await self.http.close()
+
     def _normalize_currency_code(self, currency: str) -> str:
-        """Нормализация кода валюты"""
-        if currency.upper() in self.supported_fiat:
-            return currency.upper()
-        
-        # Поиск по символу криптовалюты
-        for crypto_id, info in self.supported_crypto.items():
-            if info['symbol'].upper() == currency.upper():
-                return crypto_id
-        
-        return currency.lower()
+        """Нормализация кода валюты (ISO код фиата или id CoinGecko)"""
+        return self.index.resolve(currency) or currency.lower()
 
     def _is_fiat(self, currency: str) -> bool:
         """Проверка, является ли валюта фиатной"""
-        return currency.upper() in self.supported_fiat
+        return self.index.kind(self._normalize_currency_code(currency)) == 'fiat'
 
     def _is_crypto(self, currency: str) -> bool:
         """Проверка, является ли валюта криптовалютой"""
-        normalized = self._normalize_currency_code(currency)
-        return normalized in self.supported_crypto
+        return self.index.kind(self._normalize_currency_code(currency)) == 'crypto'
+
+    def search_currencies(self, query: str, limit: int = 9, kind: Optional[str] = None) -> list:
+        """Поиск валют по коду, названию или псевдониму"""
+        return self.index.search(query, limit=limit, kind=kind)
 
-    async def convert(self, amount: float, from_currency: str, to_currency: str) -> Optional[Dict]:
+    async def convert(self, amount: float, from_currency: str, to_currency: str) -> Optional[ConversionResult]:
         """
-        Конвертация валют
-        Возвращает словарь с результатом конвертации
+        Конвертация валют по текущему снимку курсов
+        None - валюта не поддерживается или курса нет
         """
         try:
-            # Обновляем курсы если нужно
-            await self.update_rates()
-            
-            from_curr = self._normalize_currency_code(from_currency)
-            to_curr = self._normalize_currency_code(to_currency)
-            
-            # Определяем типы валют
-            from_is_fiat = self._is_fiat(from_curr)
-            to_is_fiat = self._is_fiat(to_curr)
-            from_is_crypto = self._is_crypto(from_curr)
-            to_is_crypto = self._is_crypto(to_curr)
-            
-            if not (from_is_fiat or from_is_crypto) or not (to_is_fiat or to_is_crypto):
+            from_curr = self.index.resolve(from_currency)
+            to_curr = self.index.resolve(to_currency)
+            if from_curr is None or to_curr is None:
                 return None
             
-            # Конвертация фиат -> фиат
-            if from_is_fiat and to_is_fiat:
-                return await self._convert_fiat_to_fiat(amount, from_curr, to_curr)
-            
-            # Конвертация крипто -> крипто
-            elif from_is_crypto and to_is_crypto:
-                return await self._convert_crypto_to_crypto(amount, from_curr, to_curr)
+            # Курсы обновляются в фоне - используем текущий снимок
+            await self.ensure_rates(*self.kinds_for(from_curr, to_curr))
             
-            # Конвертация фиат -> крипто
-            elif from_is_fiat and to_is_crypto:
-                return await self._convert_fiat_to_crypto(amount, from_curr, to_curr)
+            matrix = self.rate_matrix
+            rate = matrix.rate(from_curr, to_curr)
+            if rate is None:
+                return None
             
-            # Конвертация крипто -> фиат
-            elif from_is_crypto and to_is_fiat:
-                return await self._convert_crypto_to_fiat(amount, from_curr, to_curr)
+            return self._conversion_result(amount, from_curr, to_curr, rate, matrix)
                 
         except Exception as e:
             print(f"Ошибка конвертации: {e}")
             return None
 
-    async def _convert_fiat_to_fiat(self, amount: float, from_curr: str, to_curr: str) -> Dict:
-        """Конвертация фиат -> фиат"""
-        if from_curr == 'USD':
-            rate = self.fiat_cache.get(to_curr, 1)
-        elif to_curr == 'USD':
-            rate = 1 / self.fiat_cache.get(from_curr, 1)
-        else:
-            usd_from = 1 / self.fiat_cache.get(from_curr, 1)
-            usd_to = self.fiat_cache.get(to_curr, 1)
-            rate = usd_from * usd_to
-        
-        result = amount * rate
-        
-        return {
-            'amount': amount,
-            'from_currency': from_curr,
-            'to_currency': to_curr,
-            'result': round(result, 2),
-            'rate': round(rate, 6),
-            'timestamp': datetime.now().isoformat()
-        }
+    async def convert_many(self, items: Sequence[Tuple[float, str, str]]) -> List[Optional[ConversionResult]]:
+        """
+        Пакетная конвертация троек (сумма, из, в) одним векторным проходом
+        по одному снимку курсов. Для нераспознанных валют - None на своём месте.
+        """
+        resolved = [
+            (amount, self.index.resolve(from_currency), self.index.resolve(to_currency))
+            for amount, from_currency, to_currency in items
+        ]
+        codes = {code for _, from_curr, to_curr in resolved for code in (from_curr, to_curr) if code}
+        if codes:
+            await self.ensure_rates(*self.kinds_for(*codes))
+        return self._convert_resolved(resolved)
 
-    async def _convert_crypto_to_crypto(self, amount: float, from_curr: str, to_curr: str) -> Dict:
-        """Конвертация крипто -> крипто через USD"""
-        from_price_usd = self.crypto_cache.get(from_curr, {}).get('usd', 0)
-        to_price_usd = self.crypto_cache.get(to_curr, {}).get('usd', 0)
-        
-        if from_price_usd == 0 or to_price_usd == 0:
-            return None
-        
-        usd_amount = amount * from_price_usd
-        result = usd_amount / to_price_usd
-        rate = from_price_usd / to_price_usd
-        
-        return {
-            'amount': amount,
-            'from_currency': self.supported_crypto[from_curr]['symbol'],
-            'to_currency': self.supported_crypto[to_curr]['symbol'],
-            'result': round(result, 8),
-            'rate': round(rate, 8),
-            'timestamp': datetime.now().isoformat()
-        }
+    def convert_snapshot(self, items: Sequence[Tuple[float, str, str]]) -> List[Optional[ConversionResult]]:
+        """
+        То же, что convert_many, но строго по снимку в памяти, без загрузки
+        курсов (горячие пути вроде inline): для отсутствующих курсов - None
+        """
+        return self._convert_resolved([
+            (amount, self.index.resolve(from_currency), self.index.resolve(to_currency))
+            for amount, from_currency, to_currency in items
+        ])
 
-    async def _convert_fiat_to_crypto(self, amount: float, from_curr: str, to_curr: str) -> Dict:
-        """Конвертация фиат -> крипто"""
-        # Сначала конвертируем в USD
-        if from_curr != 'USD':
-            usd_rate = 1 / self.fiat_cache.get(from_curr, 1)
-            usd_amount = amount * usd_rate
-        else:
-            usd_amount = amount
-        
-        # Затем USD -> крипто
-        crypto_price_usd = self.crypto_cache.get(to_curr, {}).get('usd', 0)
-        if crypto_price_usd == 0:
-            return None
-        
-        result = usd_amount / crypto_price_usd
+    def _convert_resolved(self, resolved: Sequence[Tuple[float, Optional[str], Optional[str]]]
+                          ) -> List[Optional[ConversionResult]]:
+        """Векторная конвертация уже распознанных троек по текущему снимку"""
+        matrix = self.rate_matrix  # один снимок на весь пакет
+        from_codes = [from_curr or '' for _, from_curr, _ in resolved]
+        to_codes = [to_curr or '' for _, _, to_curr in resolved]
+        rates = matrix.convert_many(np.ones(len(resolved)), from_codes, to_codes)
         
-        return {
-            'amount': amount,
-            'from_currency': from_curr,
-            'to_currency': self.supported_crypto[to_curr]['symbol'],
-            'result': round(result, 8),
-            'rate': round(1 / crypto_price_usd, 8),
-            'timestamp': datetime.now().isoformat()
-        }
+        conversions = []
+        for (amount, from_curr, to_curr), rate in zip(resolved, rates.tolist()):
+            if from_curr is None or to_curr is None or rate != rate:
+                conversions.append(None)
+            else:
+                conversions.append(self._conversion_result(amount, from_curr, to_curr, rate, matrix))
+        return conversions
 
-    async def _convert_crypto_to_fiat(self, amount: float, from_curr: str, to_curr: str) -> Dict:
-        """Конвертация крипто -> фиат"""
-        crypto_price_usd = self.crypto_cache.get(from_curr, {}).get('usd', 0)
-        if crypto_price_usd == 0:
-            return None
-        
-        usd_amount = amount * crypto_price_usd
+    async def convert_to_all(self, amount: float, from_currency: str) -> List[ConversionResult]:
+        """Одна сумма во все поддерживаемые валюты (фиат, затем крипто)"""
+        targets = self.conversion_targets(from_currency)
+        results = await self.convert_many([(amount, from_currency, target) for target in targets])
+        return [result for result in results if result is not None]
+
+    def conversion_targets(self, from_currency: str) -> List[str]:
+        """Все валюты, в которые можно перевести исходную (для "100 usd to all")"""
+        from_curr = self.index.resolve(from_currency)
+        if from_curr is None:
+            return []
+        return [code for code in (*self.supported_fiat, *self.supported_crypto) if code != from_curr]
+
+    def _conversion_result(self, amount: float, from_curr: str, to_curr: str,
+                           rate: float, matrix: RateMatrix) -> ConversionResult:
+        """
+        Результат со временем курсов - более старым из классов обеих валют.
+        Сумма и курс считаются в фиксированной
+        точке (Money) и округляются до точности валюты из конфигурации
+        """
+        from_is_crypto = from_curr in self.supported_crypto
+        to_is_crypto = to_curr in self.supported_crypto
+        result_places = currency_places(to_curr, to_is_crypto)
         
-        # Конвертируем USD в целевую фиатную валюту
-        if to_curr != 'USD':
-            fiat_rate = self.fiat_cache.get(to_curr, 1)
-            result = usd_amount * fiat_rate
+        # Курс: в крипто и из крипто - с точностью целевой валюты, фиат -> фиат - точнее
+        if to_is_crypto or from_is_crypto:
+            rate_places = result_places
         else:
-            result = usd_amount
+            rate_places = DECIMAL_PLACES_FIAT_RATE
         
-        return {
-            'amount': amount,
-            'from_currency': self.supported_crypto[from_curr]['symbol'],
-            'to_currency': to_curr,
-            'result': round(result, 2),
-            'rate': round(crypto_price_usd, 2),
-            'timestamp': datetime.now().isoformat()
-        }
+        # Сумма - ровно как введена, округляется только результат
+        money = Money.exact(amount)
+        return ConversionResult(
+            amount,
+            self._display_code(from_curr),
+            self._display_code(to_curr),
+            money.convert(rate, result_places),
+            Money.from_float(rate, rate_places),
+            matrix.timestamp_of(from_curr, to_curr),
+            matrix.version
+        )
+
+    def _display_code(self, currency: str) -> str:
+        """Код для отображения: ISO код фиата или тикер криптовалюты"""
+        if currency in self.supported_crypto:
+            return self.supported_crypto[currency]['symbol']
+        return currency
 
     def get_currency_info(self, currency: str) -> Optional[Dict]:
         """Получение информации о валюте"""
-        normalized = self._normalize_currency_code(currency)
+        normalized = self.index.resolve(currency)
+        kind = self.index.kind(normalized) if normalized else None
         
-        if self._is_fiat(normalized):
+        if kind == 'fiat':
             info = self.supported_fiat[normalized].copy()
             info['type'] = 'fiat'
             info['code'] = normalized
             return info
-        elif self._is_crypto(normalized):
+        elif kind == 'crypto':
             info = self.supported_crypto[normalized].copy()
             info['type'] = 'crypto'
             info['id'] = normalized
@@ -291,8 +504,11 @@ class CurrencyConverter:
 
     async def get_trending_info(self) -> Dict:
         """Получение информации о трендовых валютах"""
-        await self.update_rates()
-        
+        await self.ensure_rates(CRYPTO)
+        return self.trending_snapshot()
+
+    def trending_snapshot(self) -> Dict:
+        """Трендовые валюты по текущему снимку (без обращения к сети)"""
         trending = {
             'top_gainers': [],
             'top_losers': [],
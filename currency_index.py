@@ -0,0 +1,177 @@
+from typing import Dict, Iterable, List, Optional
+
+
+def normalize_key(text: str) -> str:
+    """Ключ поиска: без регистра, лишних пробелов и 'ё'"""
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+class _TrieNode:
+    __slots__ = ('children', 'top', 'terminal')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.top: List[str] = []      # лучшие id в поддереве (по рангу)
+        self.terminal: List[str] = []  # id, для которых ключ заканчивается здесь
+
+
+class PrefixTrie:
+    """
+    Префиксное дерево ключей валют.
+    Каждый узел хранит top_size лучших id своего поддерева, поэтому поиск по
+    префиксу стоит O(длина префикса) независимо от размера каталога.
+    """
+
+    def __init__(self, top_size: int = 10):
+        self.root = _TrieNode()
+        self.top_size = top_size
+        self._rank: Dict[str, int] = {}
+
+    def insert(self, key: str, canonical_id: str, rank: int):
+        self._rank.setdefault(canonical_id, rank)
+        node = self.root
+        self._push_top(node, canonical_id)
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            self._push_top(node, canonical_id)
+        if canonical_id not in node.terminal:
+            node.terminal.append(canonical_id)
+
+    def _push_top(self, node: _TrieNode, canonical_id: str):
+        if canonical_id in node.top:
+            return
+        node.top.append(canonical_id)
+        node.top.sort(key=self._rank.__getitem__)
+        del node.top[self.top_size:]
+
+    def prefix(self, prefix: str) -> List[str]:
+        """Лучшие id с ключами, начинающимися с prefix"""
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return list(node.top)
+
+    def fuzzy(self, word: str, max_distance: int = 1) -> List[str]:
+        """
+        Id с ключами на расстоянии Левенштейна не больше max_distance.
+        Обход дерева с построчным DP и отсечением ветвей; первая буква
+        должна совпадать - это отсекает почти всё дерево.
+        """
+        found: Dict[str, int] = {}
+        first_row = list(range(len(word) + 1))
+
+        def walk(node: _TrieNode, char: str, previous_row: List[int]):
+            row = [previous_row[0] + 1]
+            for i in range(1, len(word) + 1):
+                cost = 0 if word[i - 1] == char else 1
+                row.append(min(row[i - 1] + 1, previous_row[i] + 1, previous_row[i - 1] + cost))
+
+            if row[-1] <= max_distance:
+                for canonical_id in node.terminal:
+                    found[canonical_id] = min(found.get(canonical_id, row[-1]), row[-1])
+
+            if min(row) <= max_distance:
+                for next_char, child in node.children.items():
+                    walk(child, next_char, row)
+
+        if word:
+            child = self.root.children.get(word[0])
+            if child is not None:
+                walk(child, word[0], first_row)
+
+        return sorted(found, key=lambda cid: (found[cid], self._rank[cid]))
+
+
+class CurrencyIndex:
+    """
+    Индекс разрешения валют: ISO коды, тикеры, id CoinGecko, названия
+    и псевдонимы -> канонический id (ISO код фиата или id CoinGecko).
+    """
+
+    def __init__(self, fiat: Dict[str, Dict], crypto: Dict[str, Dict],
+                 aliases: Optional[Dict[str, str]] = None):
+        self._kinds: Dict[str, str] = {}
+        self._ranks: Dict[str, int] = {}
+        self._keys: Dict[str, str] = {}
+        self.trie = PrefixTrie()
+
+        rank = 0
+        for code, info in fiat.items():
+            self._add(code, 'fiat', rank, [code, info.get('name', ''), info.get('name_en', '')])
+            rank += 1
+        for crypto_id, info in crypto.items():
+            self._add(crypto_id, 'crypto', rank, [crypto_id, info.get('symbol', ''), info.get('name', '')])
+            rank += 1
+
+        for alias, canonical_id in (aliases or {}).items():
+            if canonical_id in self._kinds:
+                self._add_key(alias, canonical_id, self._ranks[canonical_id])
+
+        # Быстрый путь для точного совпадения без нормализации ('USD', 'BTC', 'bitcoin')
+        self._exact: Dict[str, str] = {}
+        for code, info in fiat.items():
+            self._exact[code] = code
+        for crypto_id, info in crypto.items():
+            self._exact[crypto_id] = crypto_id
+            if info.get('symbol'):
+                self._exact[info['symbol']] = crypto_id
+
+    def _add(self, canonical_id: str, kind: str, rank: int, names: Iterable[str]):
+        self._kinds[canonical_id] = kind
+        self._ranks[canonical_id] = rank
+        for name in names:
+            if name:
+                self._add_key(name, canonical_id, rank)
+
+    def _add_key(self, text: str, canonical_id: str, rank: int):
+        key = normalize_key(text)
+        self._keys.setdefault(key, canonical_id)
+        self.trie.insert(key, canonical_id, rank)
+        # Отдельные слова многословных названий тоже ищутся по префиксу
+        words = key.split()
+        if len(words) > 1:
+            for word in words:
+                if len(word) >= 3:
+                    self.trie.insert(word, canonical_id, rank)
+
+    def __len__(self) -> int:
+        return len(self._kinds)
+
+    def resolve(self, text: str) -> Optional[str]:
+        """Канонический id валюты или None"""
+        canonical_id = self._exact.get(text)
+        if canonical_id is not None:
+            return canonical_id
+        return self._keys.get(normalize_key(text))
+
+    def kind(self, canonical_id: str) -> Optional[str]:
+        """'fiat', 'crypto' или None"""
+        return self._kinds.get(canonical_id)
+
+    def search(self, query: str, limit: int = 9, kind: Optional[str] = None) -> List[str]:
+        """Поиск валют: точное совпадение, затем префикс, затем нечёткий поиск"""
+        key = normalize_key(query)
+        if not key:
+            return []
+
+        results: List[str] = []
+
+        def extend(candidates: Iterable[str]):
+            for canonical_id in candidates:
+                if len(results) >= limit:
+                    return
+                if canonical_id in results:
+                    continue
+                if kind is not None and self._kinds[canonical_id] != kind:
+                    continue
+                results.append(canonical_id)
+
+        exact = self._keys.get(key)
+        if exact is not None:
+            extend([exact])
+        extend(self.trie.prefix(key))
+        if not results and len(key) >= 3:
+            extend(self.trie.fuzzy(key, max_distance=1 if len(key) < 6 else 2))
+        return results
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Dict, Optional
+
+import aiohttp
+
+from config import (
+    API_TIMEOUT_SECONDS, HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_DNS_CACHE_SECONDS, HTTP_KEEPALIVE_SECONDS
+)
+
+
+class HttpClient:
+    """
+    Асинхронный HTTP клиент поверх общей aiohttp-сессии.
+    Сессия создаётся один раз и переиспользует соединения (keep-alive, кэш DNS).
+    """
+
+    def __init__(self, timeout: float = API_TIMEOUT_SECONDS):
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Получение (или ленивое создание) общей сессии"""
+        if self._session is not None and not self._session.closed:
+            return self._session
+
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=HTTP_POOL_LIMIT,
+                    limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                    ttl_dns_cache=HTTP_DNS_CACHE_SECONDS,
+                    keepalive_timeout=HTTP_KEEPALIVE_SECONDS
+                )
+                self._session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=self.timeout,
+                    headers={'Accept': 'application/json'}
+                )
+        return self._session
+
+    async def get_json(self, url: str, params: Optional[Dict] = None):
+        """GET запрос с разбором JSON ответа"""
+        session = await self.get_session()
+        async with session.get(url, params=params) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def close(self):
+        """Закрытие сессии и всех соединений пула"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
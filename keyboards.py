@@ -1,212 +1,285 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
-from config import BUTTONS, WEB_APP_URL, CURRENCY_EMOJIS
-from typing import List, Dict
+from config import BUTTONS, WEB_APP_URL, WEBAPP_API_URL, CURRENCY_EMOJIS, KEYBOARD_CACHE_SIZE
+from callback_router import CB, cb, router
+from functools import lru_cache
+from typing import List, Dict, Tuple
+from urllib.parse import urlencode
+
+
+def webapp_url() -> str:
+    """Адрес Mini App; адрес API бота передаётся странице, если она размещена отдельно"""
+    if not WEBAPP_API_URL:
+        return WEB_APP_URL
+    separator = '&' if '?' in WEB_APP_URL else '?'
+    return f"{WEB_APP_URL}{separator}{urlencode({'api': WEBAPP_API_URL.rstrip('/')})}"
 
 class KeyboardBuilder:
+    """
+    Построитель inline клавиатур.
+    Клавиатуры неизменяемы (объекты PTB заморожены), поэтому кэшируются и
+    переиспользуются по ссылке: статические строятся один раз, клавиатуры
+    с параметрами хранятся в ограниченном LRU кэше.
+    """
+
     @staticmethod
+    def warm_up():
+        """
+        Построение статических клавиатур при старте и проверка, что
+        маршрутизатор разбирает callback_data всех кнопок (включая примеры
+        клавиатур с параметрами)
+        """
+        keyboards = [
+            KeyboardBuilder.main_menu(),
+            KeyboardBuilder.rates_menu(),
+            KeyboardBuilder.trending_menu(),
+            KeyboardBuilder.settings_menu(),
+            KeyboardBuilder.back_button()
+        ]
+        for action in ('from', 'to'):
+            keyboards.append(KeyboardBuilder.currency_type_selection(action))
+            keyboards.append(KeyboardBuilder.fiat_currencies(action))
+            keyboards.append(KeyboardBuilder.crypto_currencies(action))
+            for currency_type in ('fiat', 'crypto'):
+                keyboards.append(KeyboardBuilder.currency_selection_with_search(currency_type, action))
+            keyboards.append(KeyboardBuilder.search_results([('EUR', 'EUR')], action))
+
+        keyboards.extend([
+            KeyboardBuilder.conversion_actions('USD', 'EUR'),
+            KeyboardBuilder.amount_quick_select('USD', 'EUR'),
+            KeyboardBuilder.create_currency_info_keyboard('bitcoin', 'crypto'),
+            KeyboardBuilder.alert_menu('bitcoin', 'crypto', [(1, '')], 5.0)
+        ])
+        router.verify(
+            button.callback_data
+            for keyboard in keyboards
+            for row in keyboard.inline_keyboard
+            for button in row
+            if button.callback_data
+        )
+
+    @staticmethod
+    def cache_info() -> Dict[str, Tuple]:
+        """Статистика кэшей клавиатур"""
+        return {
+            name: getattr(KeyboardBuilder, name).cache_info()
+            for name, value in vars(KeyboardBuilder).items()
+            if isinstance(value, staticmethod) and hasattr(value.__func__, 'cache_info')
+        }
+
+    @staticmethod
+    @lru_cache(maxsize=None)
     def main_menu() -> InlineKeyboardMarkup:
         """Главное меню бота"""
         keyboard = [
-            [InlineKeyboardButton(BUTTONS['convert'], callback_data='convert')],
+            [InlineKeyboardButton(BUTTONS['convert'], callback_data=cb(CB.CONVERT))],
             [
-                InlineKeyboardButton(BUTTONS['rates'], callback_data='rates'),
-                InlineKeyboardButton(BUTTONS['trending'], callback_data='trending')
+                InlineKeyboardButton(BUTTONS['rates'], callback_data=cb(CB.RATES)),
+                InlineKeyboardButton(BUTTONS['trending'], callback_data=cb(CB.TRENDING))
             ],
-            [InlineKeyboardButton(BUTTONS['webapp'], web_app=WebAppInfo(url=WEB_APP_URL))],
+            [InlineKeyboardButton(BUTTONS['webapp'], web_app=WebAppInfo(url=webapp_url()))],
             [
-                InlineKeyboardButton(BUTTONS['about'], callback_data='about'),
-                InlineKeyboardButton(BUTTONS['settings'], callback_data='settings')
+                InlineKeyboardButton(BUTTONS['about'], callback_data=cb(CB.ABOUT)),
+                InlineKeyboardButton(BUTTONS['settings'], callback_data=cb(CB.SETTINGS))
             ]
         ]
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
-    def currency_type_selection() -> InlineKeyboardMarkup:
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+    def currency_type_selection(selected_action: str = 'from') -> InlineKeyboardMarkup:
         """Выбор типа валют (фиат/крипто)"""
         keyboard = [
             [
-                InlineKeyboardButton(BUTTONS['fiat'], callback_data='type_fiat'),
-                InlineKeyboardButton(BUTTONS['crypto'], callback_data='type_crypto')
+                InlineKeyboardButton(BUTTONS['fiat'], callback_data=cb(CB.CURRENCY_TYPE, 'fiat', selected_action)),
+                InlineKeyboardButton(BUTTONS['crypto'], callback_data=cb(CB.CURRENCY_TYPE, 'crypto', selected_action))
             ],
-            [InlineKeyboardButton(BUTTONS['back'], callback_data='back_main')]
+            [InlineKeyboardButton(BUTTONS['back'], callback_data=cb(CB.MAIN))]
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    FIAT_CURRENCIES = (
+        ('USD', '🇺🇸 Доллар США'),
+        ('EUR', '🇪🇺 Евро'),
+        ('RUB', '🇷🇺 Российский рубль'),
+        ('GBP', '🇬🇧 Британский фунт'),
+        ('JPY', '🇯🇵 Японская йена'),
+        ('CNY', '🇨🇳 Китайский юань'),
+        ('CAD', '🇨🇦 Канадский доллар'),
+        ('AUD', '🇦🇺 Австралийский доллар'),
+        ('CHF', '🇨🇭 Швейцарский франк'),
+        ('KZT', '🇰🇿 Казахстанский тенге'),
+        ('UAH', '🇺🇦 Украинская гривна'),
+        ('BYN', '🇧🇾 Белорусский рубль')
+    )
+
+    CRYPTO_CURRENCIES = (
+        ('BTC', '₿ Bitcoin'),
+        ('ETH', 'Ξ Ethereum'),
+        ('BNB', '🪙 Binance Coin'),
+        ('ADA', '🔺 Cardano'),
+        ('SOL', '◎ Solana'),
+        ('XRP', '💧 XRP'),
+        ('DOT', '● Polkadot'),
+        ('DOGE', '🐕 Dogecoin'),
+        ('MATIC', '🔷 Polygon'),
+        ('LTC', 'Ł Litecoin'),
+        ('LINK', '🔗 Chainlink'),
+        ('AVAX', '🏔️ Avalanche')
+    )
+
     @staticmethod
-    def fiat_currencies(selected_action: str = 'from') -> InlineKeyboardMarkup:
-        """Клавиатура с фиатными валютами"""
-        fiat_currencies = [
-            ('USD', '🇺🇸 Доллар США'),
-            ('EUR', '🇪🇺 Евро'),
-            ('RUB', '🇷🇺 Российский рубль'),
-            ('GBP', '🇬🇧 Британский фунт'),
-            ('JPY', '🇯🇵 Японская йена'),
-            ('CNY', '🇨🇳 Китайский юань'),
-            ('CAD', '🇨🇦 Канадский доллар'),
-            ('AUD', '🇦🇺 Австралийский доллар'),
-            ('CHF', '🇨🇭 Швейцарский франк'),
-            ('KZT', '🇰🇿 Казахстанский тенге'),
-            ('UAH', '🇺🇦 Украинская гривна'),
-            ('BYN', '🇧🇾 Белорусский рубль')
-        ]
-        
-        keyboard = []
-        row = []
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+    def _currency_rows(currency_type: str, selected_action: str) -> Tuple[Tuple[InlineKeyboardButton, ...], ...]:
+        """Ряды кнопок валют (по 3 в ряд), общие для всех клавиатур выбора"""
+        if currency_type == 'fiat':
+            currencies, default_emoji = KeyboardBuilder.FIAT_CURRENCIES, '💰'
+        else:
+            currencies, default_emoji = KeyboardBuilder.CRYPTO_CURRENCIES, '₿'
         
-        for i, (code, name) in enumerate(fiat_currencies):
-            button = InlineKeyboardButton(
-                f"{CURRENCY_EMOJIS.get(code, '💰')} {code}",
-                callback_data=f'currency_{selected_action}_{code}'
+        buttons = [
+            InlineKeyboardButton(
+                f"{CURRENCY_EMOJIS.get(code, default_emoji)} {code}",
+                callback_data=cb(CB.CURRENCY, selected_action, code)
             )
-            row.append(button)
-            
-            # Добавляем по 3 кнопки в ряд
-            if len(row) == 3 or i == len(fiat_currencies) - 1:
-                keyboard.append(row)
-                row = []
-        
-        # Кнопки навигации
-        keyboard.append([
-            InlineKeyboardButton(BUTTONS['crypto'], callback_data=f'type_crypto_{selected_action}'),
-            InlineKeyboardButton(BUTTONS['back'], callback_data='back_convert')
-        ])
-        
+            for code, name in currencies
+        ]
+        return tuple(tuple(buttons[i:i + 3]) for i in range(0, len(buttons), 3))
+
+    @staticmethod
+    def _currency_navigation(currency_type: str, selected_action: str) -> List[InlineKeyboardButton]:
+        """Кнопки переключения типа валют и возврата"""
+        other_type = 'crypto' if currency_type == 'fiat' else 'fiat'
+        return [
+            InlineKeyboardButton(BUTTONS[other_type], callback_data=cb(CB.CURRENCY_TYPE, other_type, selected_action)),
+            InlineKeyboardButton(BUTTONS['back'], callback_data=cb(CB.CONVERT))
+        ]
+
+    @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+    def fiat_currencies(selected_action: str = 'from') -> InlineKeyboardMarkup:
+        """Клавиатура с фиатными валютами"""
+        keyboard = list(KeyboardBuilder._currency_rows('fiat', selected_action))
+        keyboard.append(KeyboardBuilder._currency_navigation('fiat', selected_action))
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
     def crypto_currencies(selected_action: str = 'from') -> InlineKeyboardMarkup:
         """Клавиатура с криптовалютами"""
-        crypto_currencies = [
-            ('BTC', '₿ Bitcoin'),
-            ('ETH', 'Ξ Ethereum'),
-            ('BNB', '🪙 Binance Coin'),
-            ('ADA', '🔺 Cardano'),
-            ('SOL', '◎ Solana'),
-            ('XRP', '💧 XRP'),
-            ('DOT', '● Polkadot'),
-            ('DOGE', '🐕 Dogecoin'),
-            ('MATIC', '🔷 Polygon'),
-            ('LTC', 'Ł Litecoin'),
-            ('LINK', '🔗 Chainlink'),
-            ('AVAX', '🏔️ Avalanche')
-        ]
-        
-        keyboard = []
-        row = []
-        
-        for i, (symbol, name) in enumerate(crypto_currencies):
-            button = InlineKeyboardButton(
-                f"{CURRENCY_EMOJIS.get(symbol, '₿')} {symbol}",
-                callback_data=f'currency_{selected_action}_{symbol}'
-            )
-            row.append(button)
-            
-            # Добавляем по 3 кнопки в ряд
-            if len(row) == 3 or i == len(crypto_currencies) - 1:
-                keyboard.append(row)
-                row = []
-        
-        # Кнопки навигации
-        keyboard.append([
-            InlineKeyboardButton(BUTTONS['fiat'], callback_data=f'type_fiat_{selected_action}'),
-            InlineKeyboardButton(BUTTONS['back'], callback_data='back_convert')
-        ])
-        
+        keyboard = list(KeyboardBuilder._currency_rows('crypto', selected_action))
+        keyboard.append(KeyboardBuilder._currency_navigation('crypto', selected_action))
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
     def conversion_actions(from_currency: str, to_currency: str) -> InlineKeyboardMarkup:
         """Действия после конвертации"""
         keyboard = [
             [
                 InlineKeyboardButton("🔄 Поменять местами", 
-                                   callback_data=f'swap_{from_currency}_{to_currency}'),
+                                   callback_data=cb(CB.SWAP, from_currency, to_currency)),
                 InlineKeyboardButton("🔢 Другая сумма", 
-                                   callback_data=f'new_amount_{from_currency}_{to_currency}')
+                                   callback_data=cb(CB.NEW_AMOUNT, from_currency, to_currency))
             ],
             [
-                InlineKeyboardButton("💱 Новая конвертация", callback_data='convert'),
-                InlineKeyboardButton(BUTTONS['back'], callback_data='back_main')
+                InlineKeyboardButton("💱 Новая конвертация", callback_data=cb(CB.CONVERT)),
+                InlineKeyboardButton(BUTTONS['back'], callback_data=cb(CB.MAIN))
             ]
         ]
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def rates_menu() -> InlineKeyboardMarkup:
         """Меню курсов валют"""
         keyboard = [
             [
-                InlineKeyboardButton("💰 Фиатные валюты", callback_data='rates_fiat'),
-                InlineKeyboardButton("₿ Криптовалюты", callback_data='rates_crypto')
+                InlineKeyboardButton("💰 Фиатные валюты", callback_data=cb(CB.RATES_SCREEN, 'fiat')),
+                InlineKeyboardButton("₿ Криптовалюты", callback_data=cb(CB.RATES_SCREEN, 'crypto'))
             ],
             [
-                InlineKeyboardButton(BUTTONS['refresh'], callback_data='rates_refresh'),
-                InlineKeyboardButton(BUTTONS['trending'], callback_data='trending')
+                InlineKeyboardButton(BUTTONS['refresh'], callback_data=cb(CB.REFRESH, 'rates')),
+                InlineKeyboardButton(BUTTONS['trending'], callback_data=cb(CB.TRENDING))
             ],
-            [InlineKeyboardButton(BUTTONS['back'], callback_data='back_main')]
+            [InlineKeyboardButton(BUTTONS['back'], callback_data=cb(CB.MAIN))]
         ]
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def trending_menu() -> InlineKeyboardMarkup:
         """Меню популярных валют"""
         keyboard = [
             [
-                InlineKeyboardButton("📈 Растущие", callback_data='trending_gainers'),
-                InlineKeyboardButton("📉 Падающие", callback_data='trending_losers')
+                InlineKeyboardButton("📈 Растущие", callback_data=cb(CB.TRENDING_SCREEN, 'gainers')),
+                InlineKeyboardButton("📉 Падающие", callback_data=cb(CB.TRENDING_SCREEN, 'losers'))
             ],
             [
-                InlineKeyboardButton("🔥 Популярные", callback_data='trending_popular'),
-                InlineKeyboardButton(BUTTONS['refresh'], callback_data='trending_refresh')
+                InlineKeyboardButton("🔥 Популярные", callback_data=cb(CB.TRENDING_SCREEN, 'popular')),
+                InlineKeyboardButton(BUTTONS['refresh'], callback_data=cb(CB.REFRESH, 'trending'))
             ],
-            [InlineKeyboardButton(BUTTONS['back'], callback_data='back_main')]
+            [InlineKeyboardButton(BUTTONS['back'], callback_data=cb(CB.MAIN))]
         ]
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def settings_menu() -> InlineKeyboardMarkup:
         """Меню настроек"""
         keyboard = [
             [
-                InlineKeyboardButton("💰 Валюта по умолчанию", callback_data='settings_default_currency'),
-                InlineKeyboardButton("🔔 Уведомления", callback_data='settings_notifications')
+                InlineKeyboardButton("💰 Валюта по умолчанию", callback_data=cb(CB.SETTINGS_OPTION, 'default_currency')),
+                InlineKeyboardButton("🔔 Уведомления", callback_data=cb(CB.SETTINGS_OPTION, 'notifications'))
             ],
             [
-                InlineKeyboardButton("🌐 Язык", callback_data='settings_language'),
-                InlineKeyboardButton("🎨 Тема", callback_data='settings_theme')
+                InlineKeyboardButton("🌐 Язык", callback_data=cb(CB.SETTINGS_OPTION, 'language')),
+                InlineKeyboardButton("🎨 Тема", callback_data=cb(CB.SETTINGS_OPTION, 'theme'))
             ],
-            [InlineKeyboardButton(BUTTONS['back'], callback_data='back_main')]
+            [InlineKeyboardButton(BUTTONS['back'], callback_data=cb(CB.MAIN))]
         ]
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
-    def back_button(callback_data: str = 'back_main') -> InlineKeyboardMarkup:
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+    def back_button(callback_data: str = cb(CB.MAIN)) -> InlineKeyboardMarkup:
         """Простая кнопка назад"""
         keyboard = [[InlineKeyboardButton(BUTTONS['back'], callback_data=callback_data)]]
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
     def currency_selection_with_search(currency_type: str, selected_action: str = 'from') -> InlineKeyboardMarkup:
         """Выбор валюты с поиском"""
         keyboard = [
-            [InlineKeyboardButton("🔍 Поиск валюты", callback_data=f'search_{currency_type}_{selected_action}')]
+            [InlineKeyboardButton("🔍 Поиск валюты", callback_data=cb(CB.SEARCH, currency_type, selected_action))]
         ]
-        
-        if currency_type == 'fiat':
-            keyboard.extend(KeyboardBuilder.fiat_currencies(selected_action).inline_keyboard[:-1])
-        else:
-            keyboard.extend(KeyboardBuilder.crypto_currencies(selected_action).inline_keyboard[:-1])
+        keyboard.extend(KeyboardBuilder._currency_rows(currency_type, selected_action))
         
         # Кнопки навигации
-        other_type = 'crypto' if currency_type == 'fiat' else 'fiat'
-        keyboard.append([
-            InlineKeyboardButton(BUTTONS[other_type], callback_data=f'type_{other_type}_{selected_action}'),
-            InlineKeyboardButton(BUTTONS['back'], callback_data='back_convert')
-        ])
+        keyboard.append(KeyboardBuilder._currency_navigation(currency_type, selected_action))
+        
+        return InlineKeyboardMarkup(keyboard)
+
+    @staticmethod
+    def search_results(currencies: List[Tuple[str, str]], selected_action: str = 'from') -> InlineKeyboardMarkup:
+        """Результаты поиска валют: список (код, подпись)"""
+        keyboard = []
+        row = []
         
+        for code, label in currencies:
+            row.append(InlineKeyboardButton(label, callback_data=cb(CB.CURRENCY, selected_action, code)))
+            if len(row) == 3:
+                keyboard.append(row)
+                row = []
+        
+        if row:
+            keyboard.append(row)
+        
+        keyboard.append([InlineKeyboardButton(BUTTONS['back'], callback_data=cb(CB.CONVERT))])
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
     def amount_quick_select(from_currency: str, to_currency: str) -> InlineKeyboardMarkup:
         """Быстрый выбор суммы"""
         amounts = [1, 10, 100, 1000, 5000, 10000]
@@ -217,7 +290,7 @@ class KeyboardBuilder:
         for amount in amounts:
             button = InlineKeyboardButton(
                 f"{amount}",
-                callback_data=f'quick_amount_{amount}_{from_currency}_{to_currency}'
+                callback_data=cb(CB.QUICK_AMOUNT, amount, from_currency, to_currency)
             )
             row.append(button)
             
@@ -229,39 +302,42 @@ class KeyboardBuilder:
             keyboard.append(row)
         
         keyboard.append([
-            InlineKeyboardButton("✏️ Ввести вручную", callback_data=f'manual_amount_{from_currency}_{to_currency}'),
-            InlineKeyboardButton(BUTTONS['back'], callback_data='back_currency_selection')
+            InlineKeyboardButton("✏️ Ввести вручную", callback_data=cb(CB.MANUAL_AMOUNT, from_currency, to_currency)),
+            InlineKeyboardButton(BUTTONS['back'], callback_data=cb(CB.BACK_CURRENCY_SELECTION, from_currency))
         ])
         
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
     def create_currency_info_keyboard(currency: str, currency_type: str) -> InlineKeyboardMarkup:
         """Клавиатура для информации о валюте"""
         keyboard = [
             [
-                InlineKeyboardButton("💱 Конвертировать", callback_data=f'convert_from_{currency}'),
-                InlineKeyboardButton("📊 График", callback_data=f'chart_{currency}')
+                InlineKeyboardButton("💱 Конвертировать", callback_data=cb(CB.CONVERT_FROM, currency)),
+                InlineKeyboardButton("📊 График", callback_data=cb(CB.CHART, currency))
             ],
             [
-                InlineKeyboardButton("⭐ В избранное", callback_data=f'favorite_{currency}'),
-                InlineKeyboardButton("🔔 Уведомления", callback_data=f'alert_{currency}')
+                InlineKeyboardButton("⭐ В избранное", callback_data=cb(CB.FAVORITE, currency)),
+                InlineKeyboardButton("🔔 Уведомления", callback_data=cb(CB.ALERT, currency))
             ],
-            [InlineKeyboardButton(BUTTONS['back'], callback_data=f'rates_{currency_type}')]
+            [InlineKeyboardButton(BUTTONS['back'], callback_data=cb(CB.RATES_SCREEN, currency_type))]
         ]
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
-    def create_pagination_keyboard(current_page: int, total_pages: int, callback_prefix: str) -> List[InlineKeyboardButton]:
-        """Создание пагинации"""
-        buttons = []
-        
-        if current_page > 1:
-            buttons.append(InlineKeyboardButton("⬅️", callback_data=f'{callback_prefix}_page_{current_page - 1}'))
-        
-        buttons.append(InlineKeyboardButton(f"{current_page}/{total_pages}", callback_data='noop'))
-        
-        if current_page < total_pages:
-            buttons.append(InlineKeyboardButton("➡️", callback_data=f'{callback_prefix}_page_{current_page + 1}'))
-        
-        return buttons
+    def alert_menu(currency: str, currency_type: str, alerts: List[Tuple[int, str]], percent: float) -> InlineKeyboardMarkup:
+        """Уведомления по валюте: быстрые пороги и удаление (список (id, подпись))"""
+        keyboard = [
+            [
+                InlineKeyboardButton(f"📈 +{percent:g}%", callback_data=cb(CB.ALERT_ADD, currency, 'above', percent)),
+                InlineKeyboardButton(f"📉 −{percent:g}%", callback_data=cb(CB.ALERT_ADD, currency, 'below', percent)),
+                InlineKeyboardButton(f"⚡ ±{percent:g}% за 24 ч", callback_data=cb(CB.ALERT_ADD, currency, 'change', percent))
+            ]
+        ]
+
+        for alert_id, label in alerts:
+            keyboard.append([InlineKeyboardButton(f"🗑 {label}", callback_data=cb(CB.ALERT_DELETE, currency, alert_id))])
+
+        keyboard.append([InlineKeyboardButton(BUTTONS['back'], callback_data=cb(CB.RATES_SCREEN, currency_type))])
+        return InlineKeyboardMarkup(keyboard)
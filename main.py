@@ -1,6 +1,24 @@
+from telegram import Update
 from telegram.ext import ApplicationBuilder
-from bot_handlers import register_handlers
+from bot_handlers import (
+    register_handlers, converter, refresh_rates_job, user_store, send_scheduler, alert_engine,
+    broadcaster, daily_digest_job
+)
+from keyboards import KeyboardBuilder
+from callback_router import router
+from web_server import BotWebServer
+from rates_api import RatesApi
+from rates_stream import RatesStream
+from config import (
+    RATES_REFRESH_INTERVAL_SECONDS, BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH,
+    WEBHOOK_SECRET_TOKEN, WEBHOOK_MAX_CONNECTIONS, HTTP_SERVER_ENABLED, DIGEST_TIME_UTC,
+    WEB_APP_URL, WEBAPP_API_URL, WEBAPP_FILE, STREAM_HEARTBEAT_SECONDS, STREAM_HISTORY_VERSIONS, STREAM_CLIENT_QUEUE_SIZE
+)
 from dotenv import load_dotenv
+import asyncio
+from datetime import time, timezone
+import signal
+from urllib.parse import urlparse
 import os
 
 
@@ -11,11 +29,131 @@ API_KEY = os.getenv("TELEGRAM_API_KEY")
 if not API_KEY:
     raise ValueError("API_KEY не найден! Проверьте .env и имя переменной.")
 
+async def create_web_server(app) -> BotWebServer:
+    """HTTP сервер бота: webhook (в режиме webhook), health/readiness и API для Mini App"""
+    server = BotWebServer(
+        app,
+        webhook_path=WEBHOOK_PATH if BOT_MODE == 'webhook' else None,
+        secret_token=WEBHOOK_SECRET_TOKEN
+    )
+    server.add_readiness_check('rates', lambda: converter.cache_timestamp is not None)
+    server.add_metrics('outgoing', send_scheduler.metrics)
+    server.add_metrics('callbacks', router.stats)
+    server.add_metrics('providers', converter.provider_metrics)
+    server.add_metrics('alerts', alert_engine.metrics)
+    server.add_metrics('broadcasts', broadcaster.metrics)
+    rates_api = RatesApi(converter, WEBAPP_FILE)
+    rates_api.register(server.app)
+    
+    # Живые обновления курсов для открытых Mini App
+    stream = RatesStream(
+        rates_api.rates_payload,
+        heartbeat_seconds=STREAM_HEARTBEAT_SECONDS,
+        history_size=STREAM_HISTORY_VERSIONS,
+        client_queue_size=STREAM_CLIENT_QUEUE_SIZE
+    )
+    stream.register(server.app)
+    converter.add_refresh_listener(stream.publish)
+    if converter.cache_timestamp is not None:
+        await stream.publish()  # курсы из снимка на диске - сразу доступны клиентам
+    server.add_metrics('stream', stream.metrics)
+    return server
+
+async def on_startup(app):
+    """Загрузка снимка курсов и запуск фонового обновления до приёма обновлений"""
+    await user_store.start()
+    await alert_engine.load()
+    KeyboardBuilder.warm_up()
+
+    if await converter.load_snapshot():
+        print(f"Курсы загружены из снимка от {converter.cache_timestamp:%H:%M %d.%m.%Y}")
+
+    app.job_queue.run_repeating(
+        refresh_rates_job,
+        interval=RATES_REFRESH_INTERVAL_SECONDS,
+        first=0,
+        name='refresh_rates'
+    )
+    app.job_queue.run_daily(
+        daily_digest_job,
+        time=time.fromisoformat(DIGEST_TIME_UTC).replace(tzinfo=timezone.utc),
+        name='daily_digest'
+    )
+    await broadcaster.resume_pending()
+
+    if BOT_MODE == 'webhook' or HTTP_SERVER_ENABLED:
+        server = await create_web_server(app)
+        await server.start()
+        app.bot_data['web_server'] = server
+
+async def on_shutdown(app):
+    """Сохранение пользователей и закрытие ресурсов при остановке"""
+    server = app.bot_data.pop('web_server', None)
+    if server is not None:
+        await server.stop()
+    await broadcaster.close()
+    await alert_engine.close()
+    await send_scheduler.close()
+    await user_store.close()
+    await converter.close()
+
+async def run_webhook(app):
+    """Работа через webhook: обновления приходят во встроенный HTTP сервер"""
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL не задан для режима webhook")
+    if not WEBHOOK_SECRET_TOKEN:
+        # Без секрета любой, кто знает адрес, сможет присылать боту поддельные обновления
+        raise ValueError("WEBHOOK_SECRET_TOKEN не задан для режима webhook")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    async with app:
+        await on_startup(app)
+        await app.start()
+        await app.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES
+        )
+        print("Бот запущен (webhook)...")
+
+        try:
+            await stop_event.wait()
+        finally:
+            # Сначала дорабатываем очередь обновлений, затем останавливаем бота
+            server = app.bot_data.get('web_server')
+            if server is not None:
+                await server.stop()
+            await app.stop()
+            await on_shutdown(app)
+
+def check_webapp_url():
+    """Предупреждение, если Mini App не найдёт API курсов по относительному адресу"""
+    if not WEBAPP_API_URL and urlparse(WEB_APP_URL).path != '/webapp.html':
+        print(f"⚠️ WEB_APP_URL={WEB_APP_URL} - не страница бота (/webapp.html): "
+              "Mini App не получит /api/rates, задайте WEBAPP_API_URL")
+
 def main():
-    app = ApplicationBuilder().token(API_KEY).build()
+    app = (
+        ApplicationBuilder()
+        .token(API_KEY)
+        .concurrent_updates(True)  # Обновления разных пользователей обрабатываются параллельно
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     register_handlers(app)
-    print("Бот запущен...")
-    app.run_polling()
+    check_webapp_url()
+
+    if BOT_MODE == 'webhook':
+        asyncio.run(run_webhook(app))
+    else:
+        print("Бот запущен...")
+        app.run_polling()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,145 @@
+import math
+from typing import Optional
+
+from config import DECIMAL_PLACES_FIAT, DECIMAL_PLACES_CRYPTO, CURRENCY_DECIMAL_PLACES
+
+# Степени десяти для масштабирования
+_POW10 = tuple(10 ** n for n in range(64))
+_POW10_FLOAT = tuple(float(10 ** n) for n in range(23))  # точно представимы в float
+
+# До скольких знаков после запятой сумма распознаётся без repr
+_FAST_PLACES = 4
+# Быстрый путь через float - только пока минимальные единицы заведомо точны
+_FAST_LIMIT = 2.0 ** 50
+# Оценка сверху относительной погрешности двух-трёх операций float
+_FAST_ERROR = 1e-15
+
+
+def _pow10(n: int) -> int:
+    return _POW10[n] if n < len(_POW10) else 10 ** n
+
+
+def currency_places(code: str, crypto: bool) -> int:
+    """Число знаков после запятой для валюты: из CURRENCY_DECIMAL_PLACES или по типу"""
+    places = CURRENCY_DECIMAL_PLACES.get(code)
+    if places is None:
+        places = DECIMAL_PLACES_CRYPTO if crypto else DECIMAL_PLACES_FIAT
+    return places
+
+
+def _div_half_up(numerator: int, denominator: int) -> int:
+    """Целочисленное деление с округлением половины от нуля (denominator > 0)"""
+    if numerator >= 0:
+        return (2 * numerator + denominator) // (2 * denominator)
+    return -((2 * -numerator + denominator) // (2 * denominator))
+
+
+def _round_half_up(scaled: float) -> Optional[int]:
+    """
+    Округление приближённого значения float до целого, если погрешность
+    вычисления не может изменить результат; иначе None (нужен точный расчёт)
+    """
+    magnitude = abs(scaled)
+    if not magnitude < _FAST_LIMIT:
+        return None
+    floor = math.floor(magnitude)
+    fraction = magnitude - floor
+    if abs(fraction - 0.5) <= magnitude * _FAST_ERROR + 1e-300:
+        return None  # рядом с серединой - погрешность float могла сдвинуть округление
+    units = floor + 1 if fraction > 0.5 else floor
+    return units if scaled >= 0 else -units
+
+
+def _exact_scaled(rate: float, units: int, shift: int) -> int:
+    """units * rate * 10**shift с округлением половины от нуля - целочисленно и точно"""
+    numerator, denominator = rate.as_integer_ratio()
+    numerator *= units
+    if shift >= 0:
+        numerator *= _pow10(shift)
+    else:
+        denominator *= _pow10(-shift)
+    return _div_half_up(numerator, denominator)
+
+
+class Money:
+    """
+    Сумма с фиксированной точкой: целое число минимальных единиц (units)
+    и число знаков после запятой (places). Округление - половина от нуля,
+    по точному значению, поэтому результат не зависит от погрешностей float
+    и одинаков в боте и в API Mini App. Обычно ответ получается одним
+    умножением float с проверкой, что погрешность не влияет на округление;
+    спорные случаи (около середины) досчитываются на целых числах.
+    """
+    __slots__ = ('units', 'places')
+
+    def __init__(self, units: int, places: int):
+        self.units = units
+        self.places = places
+
+    @classmethod
+    def exact(cls, value: float) -> 'Money':
+        """Число ровно в той десятичной записи, в какой его ввёл пользователь (100.5 -> 100.5)"""
+        if isinstance(value, int):
+            return cls(value, 0)
+        # Обычные суммы (целые или с несколькими знаками) - без разбора строки
+        for places in range(_FAST_PLACES + 1):
+            scaled = value * _POW10_FLOAT[places]
+            if abs(scaled) < _FAST_LIMIT:
+                units = round(scaled)
+                if units / _POW10[places] == value:
+                    return cls(units, places)
+        # Остальное - по кратчайшей записи repr (1e-07, 0.30000000000000004)
+        mantissa, _, exponent = repr(value).partition('e')
+        whole, _, fraction = mantissa.partition('.')
+        digits = int(whole + fraction)
+        exponent = (int(exponent) if exponent else 0) - len(fraction)
+        if exponent >= 0:
+            return cls(digits * _pow10(exponent), 0)
+        return cls(digits, -exponent)
+
+    @classmethod
+    def from_float(cls, value: float, places: int) -> 'Money':
+        """Округление вычисленного значения (курса) до places знаков по его точному двоичному значению"""
+        units = _round_half_up(value * _POW10_FLOAT[places]) if places < len(_POW10_FLOAT) else None
+        if units is None:
+            units = _exact_scaled(value, 1, places)
+        return cls(units, places)
+
+    def convert(self, rate: float, places: int) -> 'Money':
+        """
+        Сумма, умноженная на курс, с округлением до places знаков.
+        Курс берётся точно (двоичная дробь float), округление - один раз в конце.
+        """
+        shift = places - self.places
+        units = None
+        if 0 <= shift < len(_POW10_FLOAT):
+            units = _round_half_up(self.units * rate * _POW10_FLOAT[shift])
+        if units is None:
+            units = _exact_scaled(rate, self.units, shift)
+        return Money(units, places)
+
+    def __float__(self) -> float:
+        # Деление целых в Python округляется корректно: ближайший float к десятичной сумме
+        return self.units / _pow10(self.places)
+
+    def __str__(self) -> str:
+        """Точная десятичная запись со всеми знаками точности"""
+        if self.places == 0:
+            return str(self.units)
+        whole, fraction = divmod(abs(self.units), _pow10(self.places))
+        sign = '-' if self.units < 0 else ''
+        return f"{sign}{whole}.{fraction:0{self.places}d}"
+
+    def __repr__(self) -> str:
+        return f"Money('{self}')"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Money):
+            return NotImplemented
+        if self.places == other.places:
+            return self.units == other.units
+        places = max(self.places, other.places)
+        return self.units * _pow10(places - self.places) == other.units * _pow10(places - other.places)
+
+    def __hash__(self) -> int:
+        return hash(float(self))
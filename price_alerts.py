@@ -0,0 +1,324 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from bisect import bisect_left, bisect_right
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram.error import Forbidden
+
+# Типы уведомлений: цена выше порога, ниже порога, изменение за 24 ч по модулю (в %)
+ABOVE, BELOW, CHANGE = 'above', 'below', 'change'
+ALERT_KINDS = (ABOVE, BELOW, CHANGE)
+
+Pair = Tuple[str, str]
+
+
+class Alert:
+    __slots__ = ('alert_id', 'user_id', 'base', 'quote', 'kind', 'threshold', 'created_at')
+
+    def __init__(self, alert_id: int, user_id: str, base: str, quote: str,
+                 kind: str, threshold: float, created_at: float):
+        self.alert_id = alert_id
+        self.user_id = user_id
+        self.base = base
+        self.quote = quote
+        self.kind = kind
+        self.threshold = threshold
+        self.created_at = created_at
+
+    @property
+    def pair(self) -> Pair:
+        return self.base, self.quote
+
+
+class ThresholdIndex:
+    """
+    Уведомления одной пары, отсортированные по порогу (параллельные массивы).
+    Сработавшие находятся бинарным поиском и срезаются одним куском: O(log n + k).
+    """
+    __slots__ = ('thresholds', 'alerts')
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.alerts: List[Alert] = []
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def add(self, alert: Alert):
+        position = bisect_right(self.thresholds, alert.threshold)
+        self.thresholds.insert(position, alert.threshold)
+        self.alerts.insert(position, alert)
+
+    def remove(self, alert: Alert) -> bool:
+        lo = bisect_left(self.thresholds, alert.threshold)
+        hi = bisect_right(self.thresholds, alert.threshold)
+        for position in range(lo, hi):
+            if self.alerts[position] is alert:
+                del self.thresholds[position]
+                del self.alerts[position]
+                return True
+        return False
+
+    def pop_up_to(self, value: float) -> List[Alert]:
+        """Извлечение уведомлений с порогом <= value"""
+        position = bisect_right(self.thresholds, value)
+        triggered = self.alerts[:position]
+        del self.thresholds[:position]
+        del self.alerts[:position]
+        return triggered
+
+    def pop_from(self, value: float) -> List[Alert]:
+        """Извлечение уведомлений с порогом >= value"""
+        position = bisect_left(self.thresholds, value)
+        triggered = self.alerts[position:]
+        del self.thresholds[position:]
+        del self.alerts[position:]
+        return triggered
+
+
+class AlertStore:
+    """Уведомления в SQLite (WAL); операции выполняются в отдельном потоке"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = asyncio.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS alerts ("
+            " alert_id INTEGER PRIMARY KEY,"
+            " user_id TEXT NOT NULL,"
+            " base TEXT NOT NULL,"
+            " quote TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " threshold REAL NOT NULL,"
+            " created_at REAL NOT NULL"
+            ")"
+        )
+        conn.commit()
+        return conn
+
+    async def _run(self, func, *args):
+        async with self._db_lock:
+            if self._conn is None:
+                self._conn = await asyncio.to_thread(self._open)
+            return await asyncio.to_thread(func, self._conn, *args)
+
+    @staticmethod
+    def _load_all(conn: sqlite3.Connection) -> List[Alert]:
+        rows = conn.execute(
+            "SELECT alert_id, user_id, base, quote, kind, threshold, created_at FROM alerts"
+        ).fetchall()
+        return [Alert(*row) for row in rows]
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, user_id: str, base: str, quote: str,
+                kind: str, threshold: float, created_at: float) -> int:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO alerts (user_id, base, quote, kind, threshold, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, base, quote, kind, threshold, created_at)
+            )
+        return cursor.lastrowid
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, alert_ids: List[int]):
+        with conn:
+            conn.executemany("DELETE FROM alerts WHERE alert_id = ?", [(alert_id,) for alert_id in alert_ids])
+
+    async def load_all(self) -> List[Alert]:
+        return await self._run(self._load_all)
+
+    async def insert(self, user_id: str, base: str, quote: str, kind: str,
+                     threshold: float, created_at: float) -> int:
+        return await self._run(self._insert, user_id, base, quote, kind, threshold, created_at)
+
+    async def delete(self, alert_ids: List[int]):
+        if alert_ids:
+            await self._run(self._delete, alert_ids)
+
+    async def close(self):
+        async with self._db_lock:
+            if self._conn is not None:
+                await asyncio.to_thread(self._conn.close)
+                self._conn = None
+
+
+class PriceAlertEngine:
+    """
+    Ценовые уведомления пользователей.
+    Пороги хранятся в отсортированных индексах по паре валют, поэтому
+    проверка после обновления курсов не перебирает всех пользователей.
+    Сработавшие уведомления одноразовые: отправляются с ограниченной
+    параллельностью и удаляются после доставки; при ошибке отправки
+    возвращаются в индекс и сработают при следующем обновлении.
+    """
+
+    def __init__(self, store: AlertStore, max_per_user: int, send_concurrency: int,
+                 deliver: Optional[Callable[[Alert, float], Awaitable]] = None):
+        self.store = store
+        self.max_per_user = max_per_user
+        self.deliver = deliver
+        self._send_slots = asyncio.Semaphore(send_concurrency)
+
+        self._indexes: Dict[str, Dict[Pair, ThresholdIndex]] = {kind: {} for kind in ALERT_KINDS}
+        self._by_user: Dict[str, Dict[int, Alert]] = {}
+        self._reserved: Dict[str, int] = {}  # добавления, ждущие записи в БД
+        self._deliveries = set()
+        self.stats = {'triggered': 0, 'delivered': 0, 'failed': 0, 'blocked': 0}
+
+    def _index(self, alert: Alert) -> ThresholdIndex:
+        indexes = self._indexes[alert.kind]
+        index = indexes.get(alert.pair)
+        if index is None:
+            index = indexes[alert.pair] = ThresholdIndex()
+        return index
+
+    def _attach(self, alert: Alert):
+        self._index(alert).add(alert)
+        self._by_user.setdefault(alert.user_id, {})[alert.alert_id] = alert
+
+    def _detach(self, alert: Alert):
+        user_alerts = self._by_user.get(alert.user_id)
+        if user_alerts is not None:
+            user_alerts.pop(alert.alert_id, None)
+            if not user_alerts:
+                del self._by_user[alert.user_id]
+
+    async def load(self):
+        """Загрузка активных уведомлений из БД в индексы"""
+        for alert in await self.store.load_all():
+            self._attach(alert)
+
+    def user_alerts(self, user_id: str, base: Optional[str] = None) -> List[Alert]:
+        """Уведомления пользователя (опционально - по одной валюте)"""
+        alerts = self._by_user.get(user_id, {}).values()
+        return sorted(
+            (alert for alert in alerts if base is None or alert.base == base),
+            key=lambda alert: alert.alert_id
+        )
+
+    async def add(self, user_id: str, base: str, quote: str, kind: str, threshold: float) -> Optional[Alert]:
+        """Новое уведомление; None, если у пользователя уже максимум"""
+        if kind not in ALERT_KINDS:
+            raise ValueError(f"Неизвестный тип уведомления: {kind}")
+        # Место занимается до записи в БД: параллельные добавления не превысят лимит
+        reserved = self._reserved.get(user_id, 0)
+        if len(self._by_user.get(user_id, ())) + reserved >= self.max_per_user:
+            return None
+        self._reserved[user_id] = reserved + 1
+
+        created_at = time.time()
+        try:
+            alert_id = await self.store.insert(user_id, base, quote, kind, threshold, created_at)
+        finally:
+            reserved = self._reserved.pop(user_id) - 1
+            if reserved:
+                self._reserved[user_id] = reserved
+        alert = Alert(alert_id, user_id, base, quote, kind, threshold, created_at)
+        self._attach(alert)
+        return alert
+
+    async def remove(self, user_id: str, alert_id: int) -> bool:
+        """Удаление уведомления пользователя"""
+        alert = self._by_user.get(user_id, {}).get(alert_id)
+        if alert is None:
+            return False
+        # Уведомление в процессе отправки уже вынуто из индекса
+        index = self._indexes[alert.kind].get(alert.pair)
+        if index is not None:
+            index.remove(alert)
+        self._detach(alert)
+        await self.store.delete([alert_id])
+        return True
+
+    async def evaluate(self, rate: Callable[[str, str], Optional[float]],
+                       change: Callable[[str, str], Optional[float]]):
+        """
+        Проверка после обновления курсов: rate(base, quote) - текущий курс,
+        change(base, quote) - изменение за 24 ч в процентах.
+        """
+        triggered: List[Tuple[Alert, float]] = []
+
+        for kind, indexes in self._indexes.items():
+            for pair, index in list(indexes.items()):
+                value = rate(*pair) if kind != CHANGE else change(*pair)
+                if value is None:
+                    continue
+                if kind == ABOVE:
+                    hits = index.pop_up_to(value)
+                elif kind == BELOW:
+                    hits = index.pop_from(value)
+                else:
+                    hits = index.pop_up_to(abs(value))
+                triggered.extend((alert, value) for alert in hits)
+                if not index:
+                    del indexes[pair]
+
+        if not triggered:
+            return
+
+        # Из БД и списка пользователя уведомления удаляются только после доставки
+        self.stats['triggered'] += len(triggered)
+
+        # Отправка в фоне, чтобы не задерживать остальных слушателей обновления
+        task = asyncio.create_task(self._deliver_all(triggered))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver_all(self, triggered: List[Tuple[Alert, float]]):
+        results = await asyncio.gather(*(self._deliver_one(alert, value) for alert, value in triggered))
+
+        done = []
+        for (alert, _), delivered in zip(triggered, results):
+            if delivered:
+                self._detach(alert)
+                done.append(alert.alert_id)
+            elif alert.alert_id in self._by_user.get(alert.user_id, {}):
+                # Не доставлено и не удалено пользователем - проверим снова при следующем обновлении
+                self._index(alert).add(alert)
+        try:
+            await self.store.delete(done)
+        except Exception as e:
+            logging.error(f"Ошибка удаления доставленных уведомлений: {e}")
+
+    async def _deliver_one(self, alert: Alert, value: float) -> bool:
+        """Отправка одного уведомления; False - не доставлено, уведомление остаётся"""
+        async with self._send_slots:
+            try:
+                if self.deliver is not None:
+                    await self.deliver(alert, value)
+                self.stats['delivered'] += 1
+            except Forbidden:
+                # Пользователь заблокировал бота - повторять бессмысленно
+                self.stats['blocked'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logging.error(f"Ошибка отправки уведомления {alert.alert_id}: {e}")
+                return False
+            return True
+
+    def metrics(self) -> Dict:
+        return {
+            'active': sum(len(alerts) for alerts in self._by_user.values()),
+            'users': len(self._by_user),
+            'pairs': sum(len(indexes) for indexes in self._indexes.values()),
+            **self.stats
+        }
+
+    async def close(self):
+        """Дожидаемся начатых отправок и закрываем БД"""
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+        await self.store.close()
@@ -0,0 +1,223 @@
+import os
+import asyncio
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+Point = Tuple[float, float]  # (epoch секунды, стоимость в USD)
+
+
+class RingBuffer:
+    """Кольцевой буфер последних точек на массивах array('d')"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._values = array('d', bytes(8 * capacity))
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, value: float):
+        """Добавление точки (самая старая вытесняется при переполнении)"""
+        end = (self._start + self._size) % self.capacity
+        self._timestamps[end] = timestamp
+        self._values[end] = value
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def _ordered(self, column: array) -> array:
+        """Колонка в хронологическом порядке"""
+        tail = self._start + self._size
+        if tail <= self.capacity:
+            return column[self._start:tail]
+        return column[self._start:] + column[:tail - self.capacity]
+
+    def first_timestamp(self) -> Optional[float]:
+        return self._timestamps[self._start] if self._size else None
+
+    def last(self) -> Optional[Point]:
+        if not self._size:
+            return None
+        i = (self._start + self._size - 1) % self.capacity
+        return self._timestamps[i], self._values[i]
+
+    def range(self, start: float, end: float) -> Tuple[array, array]:
+        """Точки в интервале [start, end]"""
+        timestamps = self._ordered(self._timestamps)
+        lo = bisect_left(timestamps, start)
+        hi = bisect_right(timestamps, end)
+        return timestamps[lo:hi], self._ordered(self._values)[lo:hi]
+
+
+class ArchiveColumn:
+    """
+    Колоночный архив одной валюты: два append-only файла float64
+    (время и значение), читаемые через memory-map.
+    Файлы дописываются по очереди, поэтому после сбоя между записями одна
+    колонка может оказаться длиннее - при открытии обе обрезаются до общей
+    длины, иначе следующие точки легли бы со сдвигом.
+    """
+
+    def __init__(self, directory: str, code: str):
+        self.ts_path = os.path.join(directory, f"{code}.ts.f64")
+        self.value_path = os.path.join(directory, f"{code}.val.f64")
+        self._ts_map: Optional[np.memmap] = None
+        self._value_map: Optional[np.memmap] = None
+        self._mapped_size = 0
+        self._align()
+
+    def _align(self):
+        """Обрезка колонок до общего числа целых точек"""
+        paths = (self.ts_path, self.value_path)
+        sizes = [os.path.getsize(path) if os.path.exists(path) else 0 for path in paths]
+        common = min(sizes) // 8 * 8
+        for path, size in zip(paths, sizes):
+            if size > common:
+                with open(path, 'r+b') as f:
+                    f.truncate(common)
+
+    def append(self, points: List[Point]):
+        """Дозапись точек в конец обеих колонок"""
+        timestamps = array('d', (ts for ts, _ in points))
+        values = array('d', (value for _, value in points))
+        try:
+            with open(self.ts_path, 'ab') as f:
+                timestamps.tofile(f)
+            with open(self.value_path, 'ab') as f:
+                values.tofile(f)
+        except OSError:
+            # Недописанная пара не должна сдвинуть колонки друг относительно друга
+            self._align()
+            raise
+
+    def _columns(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Отображения колонок в память (переоткрываются при росте файлов)"""
+        try:
+            size = min(os.path.getsize(self.ts_path), os.path.getsize(self.value_path)) // 8
+        except FileNotFoundError:
+            size = 0
+
+        if size == 0:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty
+
+        if size != self._mapped_size:
+            self._ts_map = np.memmap(self.ts_path, dtype=np.float64, mode='r', shape=(size,))
+            self._value_map = np.memmap(self.value_path, dtype=np.float64, mode='r', shape=(size,))
+            self._mapped_size = size
+        return self._ts_map, self._value_map
+
+    def value_at(self, timestamp: float) -> Optional[Point]:
+        """Последняя точка не позже timestamp (бинарный поиск)"""
+        timestamps, values = self._columns()
+        i = int(np.searchsorted(timestamps, timestamp, side='right')) - 1
+        if i < 0:
+            return None
+        return float(timestamps[i]), float(values[i])
+
+    def range(self, start: float, end: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Срез колонок в интервале [start, end] без чтения всего файла"""
+        timestamps, values = self._columns()
+        lo = int(np.searchsorted(timestamps, start, side='left'))
+        hi = int(np.searchsorted(timestamps, end, side='right'))
+        return timestamps[lo:hi], values[lo:hi]
+
+
+def downsample(timestamps, values, max_points: int) -> List[Point]:
+    """Прореживание ряда: среднее по равным по числу точек корзинам"""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if max_points <= 0 or len(timestamps) <= max_points:
+        return list(zip(timestamps.tolist(), values.tolist()))
+
+    edges = np.linspace(0, len(timestamps), max_points + 1).astype(np.intp)[:-1]
+    counts = np.diff(np.append(edges, len(timestamps)))
+    ts_means = np.add.reduceat(timestamps, edges) / counts
+    value_means = np.add.reduceat(values, edges) / counts
+    return list(zip(ts_means.tolist(), value_means.tolist()))
+
+
+class RateHistory:
+    """
+    История курсов: последние точки - в кольцевых буферах в памяти,
+    полная история - в колоночном архиве на диске.
+    Значения хранятся как стоимость единицы валюты в USD.
+    """
+
+    def __init__(self, directory: str, ring_capacity: int):
+        self.directory = directory
+        self.ring_capacity = ring_capacity
+        self._recent: Dict[str, RingBuffer] = {}
+        self._archive: Dict[str, ArchiveColumn] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _column(self, code: str) -> ArchiveColumn:
+        column = self._archive.get(code)
+        if column is None:
+            column = self._archive[code] = ArchiveColumn(self.directory, code)
+        return column
+
+    def _ring(self, code: str) -> RingBuffer:
+        ring = self._recent.get(code)
+        if ring is None:
+            ring = self._recent[code] = RingBuffer(self.ring_capacity)
+            # Прогреваем буфер последними точками из архива
+            timestamps, values = self._column(code).range(float('-inf'), float('inf'))
+            for ts, value in zip(timestamps[-self.ring_capacity:].tolist(), values[-self.ring_capacity:].tolist()):
+                ring.append(ts, value)
+        return ring
+
+    def _append(self, timestamp: float, usd_values: Dict[str, float]) -> Dict[str, List[Point]]:
+        """Запись снимка в буферы; возвращает точки для архива"""
+        pending = {}
+        for code, value in usd_values.items():
+            if value != value:  # NaN - курс неизвестен
+                continue
+            ring = self._ring(code)
+            last = ring.last()
+            if last is not None and last[0] >= timestamp:
+                continue
+            ring.append(timestamp, value)
+            pending[code] = [(timestamp, value)]
+        return pending
+
+    def _flush(self, pending: Dict[str, List[Point]]):
+        for code, points in pending.items():
+            self._column(code).append(points)
+
+    async def record(self, when: datetime, usd_values: Dict[str, float]):
+        """Запись снимка курсов (дисковая часть - в отдельном потоке)"""
+        pending = self._append(when.timestamp(), usd_values)
+        if pending:
+            await asyncio.to_thread(self._flush, pending)
+
+    def rate_at(self, code: str, when: datetime) -> Optional[float]:
+        """Стоимость валюты в USD на момент when"""
+        timestamp = when.timestamp()
+        ring = self._ring(code)
+        first = ring.first_timestamp()
+        if first is not None and timestamp >= first:
+            timestamps, values = ring.range(first, timestamp)
+            return values[-1] if values else None
+
+        point = self._column(code).value_at(timestamp)
+        return point[1] if point else None
+
+    def range(self, code: str, start: datetime, end: datetime, max_points: int = 0) -> List[Point]:
+        """Точки за период с прореживанием до max_points"""
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        ring = self._ring(code)
+        first = ring.first_timestamp()
+        if first is not None and start_ts >= first:
+            timestamps, values = ring.range(start_ts, end_ts)
+        else:
+            timestamps, values = self._column(code).range(start_ts, end_ts)
+        return downsample(timestamps, values, max_points)
@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rate_providers import FIAT, CRYPTO
+
+
+class RateMatrix:
+    """
+    Неизменяемая матрица кросс-курсов N×N для всех поддерживаемых валют.
+    matrix[i, j] - сколько единиц валюты j стоит одна единица валюты i.
+    Отсутствующие курсы хранятся как NaN.
+    Время загрузки хранится по классам активов (timestamps), kinds - класс
+    каждой валюты.
+    """
+
+    def __init__(self, codes: Sequence[str], usd_values: Sequence[float],
+                 timestamps: Optional[Dict[str, Optional[datetime]]] = None, version: int = 0,
+                 kinds: Optional[Sequence[str]] = None):
+        self.codes: Tuple[str, ...] = tuple(codes)
+        self.index: Dict[str, int] = {code: i for i, code in enumerate(self.codes)}
+        self.kinds: Tuple[str, ...] = tuple(kinds) if kinds is not None else (FIAT,) * len(self.codes)
+        self.timestamps: Dict[str, Optional[datetime]] = dict(timestamps or {})
+        self.version = version
+
+        # Стоимость одной единицы каждой валюты в USD
+        values = np.asarray(usd_values, dtype=np.float64)
+        values.setflags(write=False)
+        self.usd_values = values
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            matrix = np.outer(values, 1.0 / values)
+        matrix.setflags(write=False)
+        self.matrix = matrix
+
+    @classmethod
+    def from_caches(cls, fiat_cache: Dict, crypto_cache: Dict,
+                    fiat_codes: Iterable[str], crypto_ids: Iterable[str],
+                    timestamps: Optional[Dict[str, Optional[datetime]]] = None,
+                    version: int = 0) -> 'RateMatrix':
+        """Построение матрицы из кэшей фиат (за 1 USD) и крипто (цены в USD)"""
+        codes = []
+        usd_values = []
+        kinds = []
+
+        for code in fiat_codes:
+            per_usd = fiat_cache.get(code)
+            codes.append(code)
+            usd_values.append(1.0 / per_usd if per_usd else np.nan)
+            kinds.append(FIAT)
+
+        for crypto_id in crypto_ids:
+            price = crypto_cache.get(crypto_id, {}).get('usd')
+            codes.append(crypto_id)
+            usd_values.append(float(price) if price else np.nan)
+            kinds.append(CRYPTO)
+
+        return cls(codes, usd_values, timestamps, version, kinds)
+
+    @classmethod
+    def empty(cls, codes: Sequence[str]) -> 'RateMatrix':
+        """Пустая матрица (все курсы неизвестны)"""
+        return cls(codes, [np.nan] * len(codes))
+
+    @property
+    def updated_at(self) -> Optional[datetime]:
+        """Момент сборки снимка - время последней загрузки любого класса"""
+        loaded = [timestamp for timestamp in self.timestamps.values() if timestamp]
+        return max(loaded) if loaded else None
+
+    def timestamp_of(self, *codes: str) -> Optional[datetime]:
+        """
+        Время курсов для набора валют - более старое из классов, к которым
+        они относятся (None, если какой-то класс ещё не загружен)
+        """
+        kinds = {self.kinds[self.index[code]] for code in codes if code in self.index}
+        timestamps = [self.timestamps.get(kind) for kind in kinds]
+        if not timestamps or None in timestamps:
+            return None
+        return min(timestamps)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    def rate(self, from_code: str, to_code: str) -> Optional[float]:
+        """Курс пары: два поиска индекса и чтение ячейки"""
+        i = self.index.get(from_code)
+        j = self.index.get(to_code)
+        if i is None or j is None:
+            return None
+
+        rate = float(self.matrix[i, j])
+        if rate != rate:  # NaN - курс неизвестен
+            return None
+        return rate
+
+    def row(self, code: str) -> Optional[np.ndarray]:
+        """Курсы валюты ко всем остальным (представление строки матрицы)"""
+        i = self.index.get(code)
+        if i is None:
+            return None
+        return self.matrix[i]
+
+    def convert_many(self, amounts, from_codes: Sequence[str], to_codes: Sequence[str]) -> np.ndarray:
+        """
+        Векторная конвертация: amounts[k] из from_codes[k] в to_codes[k].
+        Для неизвестных валют или курсов результат - NaN.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        rows = np.fromiter((self.index.get(c, -1) for c in from_codes), dtype=np.intp, count=len(from_codes))
+        cols = np.fromiter((self.index.get(c, -1) for c in to_codes), dtype=np.intp, count=len(to_codes))
+
+        rates = self.matrix[rows, cols]
+        rates = np.where((rows < 0) | (cols < 0), np.nan, rates)
+        return amounts * rates
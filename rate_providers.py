@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from circuit_breaker import CircuitBreaker
+
+FIAT, CRYPTO = 'fiat', 'crypto'
+
+
+class ProviderError(Exception):
+    """Ни один источник курсов не вернул данные"""
+
+
+class RateProvider(ABC):
+    """
+    Источник курсов одного класса активов.
+    fetch возвращает данные в общем виде:
+    фиат - {код: единиц за 1 USD}, крипто - {id: {'usd': ..., 'usd_24h_change': ...}}
+    """
+    asset_class = ''
+
+    def __init__(self, name: str, base_url: str):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+
+    @abstractmethod
+    async def fetch(self, http, symbols: Sequence[str]) -> Dict:
+        """Курсы в общем виде класса активов"""
+
+
+class ExchangeRateApiProvider(RateProvider):
+    """exchangerate-api.com (v4): {"base": "USD", "rates": {...}}"""
+    asset_class = FIAT
+
+    async def fetch(self, http, symbols: Sequence[str]) -> Dict:
+        data = await http.get_json(f"{self.base_url}/latest/USD")
+        return data.get('rates', {})
+
+
+class OpenErApiProvider(RateProvider):
+    """open.er-api.com (v6): {"result": "success", "rates": {...}}"""
+    asset_class = FIAT
+
+    async def fetch(self, http, symbols: Sequence[str]) -> Dict:
+        data = await http.get_json(f"{self.base_url}/v6/latest/USD")
+        if data.get('result') != 'success':
+            raise ProviderError(f"{self.name}: {data.get('error-type', 'ошибка API')}")
+        return data.get('rates', {})
+
+
+class CoinGeckoProvider(RateProvider):
+    """CoinGecko /simple/price: цены в USD, EUR, RUB и изменение за 24 ч"""
+    asset_class = CRYPTO
+
+    async def fetch(self, http, symbols: Sequence[str]) -> Dict:
+        params = {
+            'ids': ','.join(symbols),
+            'vs_currencies': 'usd,eur,rub',
+            'include_24hr_change': 'true'
+        }
+        return await http.get_json(f"{self.base_url}/simple/price", params=params)
+
+
+class CoinCapProvider(RateProvider):
+    """
+    CoinCap /assets: только цена в USD и изменение за 24 ч.
+    Идентификаторы частично отличаются от CoinGecko.
+    """
+    asset_class = CRYPTO
+
+    IDS = {'binancecoin': 'binance-coin', 'ripple': 'xrp', 'avalanche-2': 'avalanche'}
+
+    async def fetch(self, http, symbols: Sequence[str]) -> Dict:
+        to_coincap = {symbol: self.IDS.get(symbol, symbol) for symbol in symbols}
+        from_coincap = {coincap_id: symbol for symbol, coincap_id in to_coincap.items()}
+        data = await http.get_json(f"{self.base_url}/assets", params={'ids': ','.join(to_coincap.values())})
+
+        rates = {}
+        for asset in data.get('data', []):
+            symbol = from_coincap.get(asset.get('id'))
+            if symbol is None or asset.get('priceUsd') is None:
+                continue
+            rates[symbol] = {
+                'usd': float(asset['priceUsd']),
+                'usd_24h_change': float(asset.get('changePercent24Hr') or 0)
+            }
+        return rates
+
+
+PROVIDER_TYPES = {
+    'exchangerate-api': ExchangeRateApiProvider,
+    'open-er-api': OpenErApiProvider,
+    'coingecko': CoinGeckoProvider,
+    'coincap': CoinCapProvider
+}
+
+
+def build_providers(specs: Sequence[Tuple[str, str]]) -> List[RateProvider]:
+    """Источники из конфигурации: [(тип, базовый URL), ...] в порядке предпочтения"""
+    return [PROVIDER_TYPES[kind](kind, base_url) for kind, base_url in specs]
+
+
+class ProviderStats:
+    """Наблюдаемые задержка и доля ошибок источника"""
+    __slots__ = ('latencies', 'latency_ewma', 'error_rate', 'requests', 'errors', 'wins', 'alpha')
+
+    def __init__(self, window: int, alpha: float = 0.2):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.latency_ewma: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.wins = 0
+        self.alpha = alpha
+
+    def record(self, latency: float, ok: bool):
+        self.requests += 1
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.latencies.append(latency)
+            self._update_ewma(latency)
+        else:
+            self.errors += 1
+
+    def record_lost(self, elapsed: float):
+        """Запрос отменён, потому что другой источник ответил раньше: задержка не меньше elapsed"""
+        if self.latency_ewma is None or elapsed > self.latency_ewma:
+            self._update_ewma(elapsed)
+
+    def _update_ewma(self, latency: float):
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += self.alpha * (latency - self.latency_ewma)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def score(self, failure_penalty: float) -> float:
+        """Ожидаемая цена запроса: задержка плюс штраф за вероятность ошибки"""
+        latency = self.latency_ewma if self.latency_ewma is not None else 0.0
+        return latency + self.error_rate * failure_penalty
+
+
+class RateSource:
+    """
+    Несколько источников одного класса активов с хеджированием.
+    Первым запрашивается источник с наименьшей ожидаемой ценой (задержка
+    и доля ошибок). Если он не ответил за свой перцентиль задержки,
+    параллельно запрашивается следующий; при ошибке следующий запускается
+    сразу. Берётся первый успешный ответ, остальные запросы отменяются.
+    Источники с открытым предохранителем пропускаются; если открыты все,
+    загрузка завершается ошибкой сразу, без сетевых запросов.
+    """
+
+    def __init__(self, asset_class: str, providers: Sequence[RateProvider],
+                 hedge_percentile: float, hedge_default_delay: float,
+                 hedge_min_delay: float, hedge_min_samples: int, failure_penalty: float,
+                 failure_threshold: int, backoff_base: float, backoff_max: float,
+                 explore_rate: float = 0.0, window: int = 50):
+        self.asset_class = asset_class
+        self.providers = list(providers)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.failure_penalty = failure_penalty
+        self.explore_rate = explore_rate
+        self.stats: Dict[str, ProviderStats] = {provider.name: ProviderStats(window) for provider in self.providers}
+        self.breakers: Dict[str, CircuitBreaker] = {
+            provider.name: CircuitBreaker(provider.name, failure_threshold, backoff_base, backoff_max)
+            for provider in self.providers
+        }
+        self.hedged = 0
+        self.failed = 0
+        self.short_circuited = 0
+
+    def ordered(self) -> List[RateProvider]:
+        """
+        Доступные источники по возрастанию ожидаемой цены;
+        изредка второй пробуется первым
+        """
+        ordered = sorted(
+            (provider for provider in self.providers if self.breakers[provider.name].available()),
+            key=lambda provider: self.stats[provider.name].score(self.failure_penalty)
+        )
+        if len(ordered) > 1 and random.random() < self.explore_rate:
+            ordered[0], ordered[1] = ordered[1], ordered[0]
+        return ordered
+
+    def hedge_delay(self, provider: RateProvider) -> float:
+        stats = self.stats[provider.name]
+        if len(stats.latencies) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        # Нижняя граница - чтобы быстрый источник не дублировался из-за случайных миллисекунд
+        return max(stats.percentile(self.hedge_percentile), self.hedge_min_delay)
+
+    async def _attempt(self, provider: RateProvider, http, symbols: Sequence[str]) -> Dict:
+        breaker = self.breakers[provider.name]
+        started = time.monotonic()
+        try:
+            result = await provider.fetch(http, symbols)
+            if not result:
+                raise ProviderError(f"{provider.name}: пустой ответ")
+        except asyncio.CancelledError:
+            # Проиграл гонку - это не ошибка, но источник медленнее победителя
+            self.stats[provider.name].record_lost(time.monotonic() - started)
+            breaker.release()
+            raise
+        except Exception:
+            self.stats[provider.name].record(time.monotonic() - started, ok=False)
+            breaker.record_failure()
+            raise
+        self.stats[provider.name].record(time.monotonic() - started, ok=True)
+        breaker.record_success()
+        return result
+
+    async def fetch(self, http, symbols: Sequence[str] = ()) -> Tuple[str, Dict]:
+        """Первый успешный ответ: (имя источника, данные)"""
+        queue = self.ordered()
+        pending: Dict[asyncio.Task, RateProvider] = {}
+        errors = []
+
+        def launch() -> Optional[RateProvider]:
+            while queue:
+                provider = queue.pop(0)
+                # В half_open пропускается только один пробный запрос
+                if self.breakers[provider.name].allow():
+                    pending[asyncio.create_task(self._attempt(provider, http, symbols))] = provider
+                    return provider
+            return None
+
+        last = launch()
+        if last is None:
+            self.short_circuited += 1
+            raise ProviderError(f"все источники {self.asset_class} отключены предохранителем")
+        try:
+            while pending:
+                timeout = self.hedge_delay(last) if queue else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge = launch()
+                    if hedge is not None:
+                        self.hedged += 1
+                        last = hedge
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        self.stats[provider.name].wins += 1
+                        return provider.name, task.result()
+                    errors.append(f"{provider.name}: {task.exception()}")
+                    logging.warning(f"Источник курсов {self.asset_class} {provider.name} недоступен: {task.exception()}")
+
+                if queue:
+                    last = launch() or last
+        finally:
+            for task in pending:
+                task.cancel()
+
+        self.failed += 1
+        raise ProviderError('; '.join(errors))
+
+    def metrics(self) -> Dict:
+        providers = {}
+        for provider in self.providers:
+            stats = self.stats[provider.name]
+            p50 = stats.percentile(0.5)
+            hedge_after = stats.percentile(self.hedge_percentile)
+            providers[provider.name] = {
+                'requests': stats.requests,
+                'errors': stats.errors,
+                'wins': stats.wins,
+                'error_rate': round(stats.error_rate, 3),
+                'latency_p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                'hedge_after_ms': round(hedge_after * 1000, 1) if hedge_after is not None else None,
+                'circuit': self.breakers[provider.name].metrics()
+            }
+        return {
+            'hedged': self.hedged,
+            'failed': self.failed,
+            'short_circuited': self.short_circuited,
+            'providers': providers
+        }
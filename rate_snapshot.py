@@ -0,0 +1,126 @@
+import math
+import os
+import struct
+import tempfile
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+# Формат файла (little-endian, фиксированная разметка):
+#   заголовок: magic, версия формата, резерв, время загрузки фиат и крипто (epoch,
+#              NaN - класс ещё не загружался), число записей
+#              (версия 1: одно общее время снимка - читается для совместимости)
+#   запись:    код валюты (16 байт), тип (0 - фиат, 1 - крипто), 4 значения float64
+#              фиат:   [курс за 1 USD, NaN, NaN, NaN]
+#              крипто: [usd, eur, rub, usd_24h_change]
+SNAPSHOT_MAGIC = b'VRSN'
+SNAPSHOT_FORMAT_VERSION = 2
+
+_HEADER_V1 = struct.Struct('<4sHHdI')
+_HEADER = struct.Struct('<4sHHddI')
+_RECORD = struct.Struct('<16sB4d')
+
+_KIND_FIAT = 0
+_KIND_CRYPTO = 1
+_CRYPTO_FIELDS = ('usd', 'eur', 'rub', 'usd_24h_change')
+
+Snapshot = Tuple[Dict, Dict, Dict[str, Optional[datetime]]]
+
+
+def _encode_code(code: str) -> bytes:
+    raw = code.encode('utf-8')
+    if len(raw) > 16:
+        raise ValueError(f"Слишком длинный код валюты: {code}")
+    return raw
+
+
+def _value(data: Dict, field: str) -> float:
+    value = data.get(field)
+    return float(value) if value is not None else math.nan
+
+
+def _epoch(timestamp: Optional[datetime]) -> float:
+    return timestamp.timestamp() if timestamp is not None else math.nan
+
+
+def _datetime(epoch: float) -> Optional[datetime]:
+    return None if math.isnan(epoch) else datetime.fromtimestamp(epoch)
+
+
+def save_snapshot(path: str, fiat_cache: Dict, crypto_cache: Dict,
+                  timestamps: Dict[str, Optional[datetime]]):
+    """
+    Атомарная запись снимка курсов: временный файл + fsync + rename.
+    timestamps - время загрузки по классам активов ('fiat', 'crypto')
+    """
+    records = []
+    for code, rate in fiat_cache.items():
+        records.append(_RECORD.pack(_encode_code(code), _KIND_FIAT, float(rate), math.nan, math.nan, math.nan))
+    for crypto_id, data in crypto_cache.items():
+        values = [_value(data, field) for field in _CRYPTO_FIELDS]
+        records.append(_RECORD.pack(_encode_code(crypto_id), _KIND_CRYPTO, *values))
+
+    header = _HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, 0,
+        _epoch(timestamps.get('fiat')), _epoch(timestamps.get('crypto')), len(records)
+    )
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Уникальный временный файл: параллельные сохранения не пишут в один и тот же
+    fd, tmp_path = tempfile.mkstemp(dir=directory or '.', prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(b''.join(records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_snapshot(path: str) -> Optional[Snapshot]:
+    """Чтение снимка курсов. None, если файла нет или он повреждён"""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None
+
+    if len(raw) < _HEADER_V1.size:
+        return None
+
+    magic, version = struct.unpack_from('<4sH', raw, 0)
+    if magic != SNAPSHOT_MAGIC:
+        return None
+    if version == 1:
+        header = _HEADER_V1
+        _, _, _, epoch, count = header.unpack_from(raw, 0)
+        fiat_epoch = crypto_epoch = epoch
+    elif version == SNAPSHOT_FORMAT_VERSION and len(raw) >= _HEADER.size:
+        header = _HEADER
+        _, _, _, fiat_epoch, crypto_epoch, count = header.unpack_from(raw, 0)
+    else:
+        return None
+    if len(raw) != header.size + count * _RECORD.size:
+        return None
+
+    fiat_cache = {}
+    crypto_cache = {}
+    for raw_code, kind, *values in _RECORD.iter_unpack(raw[header.size:]):
+        code = raw_code.rstrip(b'\0').decode('utf-8')
+        if kind == _KIND_FIAT:
+            fiat_cache[code] = values[0]
+        else:
+            crypto_cache[code] = {
+                field: value for field, value in zip(_CRYPTO_FIELDS, values)
+                if not math.isnan(value)
+            }
+
+    return fiat_cache, crypto_cache, {'fiat': _datetime(fiat_epoch), 'crypto': _datetime(crypto_epoch)}
@@ -0,0 +1,154 @@
+import gzip
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+
+from rates_stream import PROCESS_EPOCH
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаём gzip
+    brotli = None
+
+RATES_CACHE_CONTROL = 'public, max-age=30'
+WEBAPP_CACHE_CONTROL = 'public, max-age=300'
+
+
+class EncodedBody:
+    """Тело ответа, заранее сжатое во все поддерживаемые кодировки, и его ETag"""
+    __slots__ = ('etag', 'variants')
+
+    def __init__(self, body: bytes):
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.variants: Dict[str, bytes] = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(body)
+
+    def negotiate(self, accept_encoding: str) -> Tuple[str, bytes]:
+        """Лучшая кодировка из Accept-Encoding: br, затем gzip, иначе без сжатия"""
+        accepted = set()
+        for part in accept_encoding.split(','):
+            name, _, params = part.strip().partition(';')
+            if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+                continue
+            accepted.add(name.strip().lower())
+
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and (encoding in accepted or '*' in accepted):
+                return encoding, self.variants[encoding]
+        return 'identity', self.variants['identity']
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение, как требует RFC 9110 для GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(candidate.strip().removeprefix('W/') == etag for candidate in if_none_match.split(','))
+
+
+def encoded_response(request: web.Request, body: EncodedBody, content_type: str,
+                     cache_control: str, extra_headers: Optional[Dict[str, str]] = None) -> web.Response:
+    """Ответ с ETag/304 и сжатием по Accept-Encoding"""
+    headers = {'ETag': body.etag, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if extra_headers:
+        headers.update(extra_headers)
+
+    if etag_matches(request.headers.get('If-None-Match'), body.etag):
+        return web.Response(status=304, headers=headers)
+
+    encoding, payload = body.negotiate(request.headers.get('Accept-Encoding', ''))
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return web.Response(body=payload, content_type=content_type, charset='utf-8', headers=headers)
+
+
+class RatesApi:
+    """
+    Курсы для Mini App прямо из снимка конвертера и сама страница webapp.html.
+    JSON собирается и сжимается один раз на версию снимка, повторные открытия
+    получают 304 по ETag - без единого запроса к внешним API.
+    """
+
+    def __init__(self, converter, webapp_path: str):
+        self.converter = converter
+        self.webapp_path = webapp_path
+        self._rates: Optional[EncodedBody] = None
+        self._rates_version: Optional[int] = None
+        self._webapp: Optional[EncodedBody] = None
+        self._webapp_mtime: Optional[float] = None
+
+    def register(self, app: web.Application):
+        app.router.add_get('/api/rates', self._handle_rates)
+        app.router.add_get('/api/convert', self._handle_convert)
+        app.router.add_get('/webapp.html', self._handle_webapp)
+
+    def rates_payload(self) -> Dict:
+        """Компактный снимок: фиат - единиц за 1 USD, крипто - цена в USD и изменение за 24 ч"""
+        converter = self.converter
+        # Время снимка - более старое из классов: на экране все курсы не новее него
+        updated_at = converter.rates_timestamp()
+        return {
+            'version': converter.snapshot_version,
+            'epoch': PROCESS_EPOCH,
+            'updated_at': updated_at.isoformat(timespec='seconds') if updated_at else None,
+            'fiat': {
+                code: converter.fiat_cache[code]
+                for code in converter.supported_fiat if code in converter.fiat_cache
+            },
+            'crypto': {
+                crypto_id: {'usd': data.get('usd', 0), 'usd_24h_change': data.get('usd_24h_change', 0)}
+                for crypto_id, data in converter.crypto_cache.items() if crypto_id in converter.supported_crypto
+            }
+        }
+
+    def rates_body(self) -> EncodedBody:
+        version = self.converter.snapshot_version
+        if self._rates is None or self._rates_version != version:
+            body = json.dumps(self.rates_payload(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            self._rates = EncodedBody(body)
+            self._rates_version = version
+        return self._rates
+
+    def webapp_body(self) -> EncodedBody:
+        # Страница перечитывается только при изменении файла
+        mtime = os.path.getmtime(self.webapp_path)
+        if self._webapp is None or self._webapp_mtime != mtime:
+            with open(self.webapp_path, 'rb') as f:
+                self._webapp = EncodedBody(f.read())
+            self._webapp_mtime = mtime
+        return self._webapp
+
+    async def _handle_rates(self, request: web.Request) -> web.Response:
+        if self.converter.cache_timestamp is None:
+            return web.json_response({'error': 'rates not loaded'}, status=503, headers={'Retry-After': '5'})
+        return encoded_response(
+            request, self.rates_body(), 'application/json', RATES_CACHE_CONTROL,
+            {'Access-Control-Allow-Origin': '*'}
+        )
+
+    async def _handle_convert(self, request: web.Request) -> web.Response:
+        """Конвертация тем же кодом, что и в боте: суммы в Mini App и в чате совпадают"""
+        headers = {'Access-Control-Allow-Origin': '*', 'Cache-Control': 'no-cache'}
+        try:
+            amount = float(request.query['amount'])
+            from_currency = request.query['from']
+            to_currency = request.query['to']
+        except (KeyError, ValueError):
+            return web.json_response({'error': 'amount, from and to are required'}, status=400, headers=headers)
+        if not amount > 0 or amount == float('inf'):
+            return web.json_response({'error': 'amount must be positive'}, status=400, headers=headers)
+
+        if self.converter.cache_timestamp is None:
+            return web.json_response({'error': 'rates not loaded'}, status=503, headers={**headers, 'Retry-After': '5'})
+        result = await self.converter.convert(amount, from_currency, to_currency)
+        if result is None:
+            return web.json_response({'error': 'unsupported currency'}, status=400, headers=headers)
+        return web.json_response(result.as_dict(), headers=headers)
+
+    async def _handle_webapp(self, request: web.Request) -> web.Response:
+        return encoded_response(request, self.webapp_body(), 'text/html', WEBAPP_CACHE_CONTROL)
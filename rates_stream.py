@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set
+
+from aiohttp import web
+
+SECTIONS = ('fiat', 'crypto')
+
+# Эпоха процесса: версии снимка нумеруются заново при каждом запуске, поэтому
+# id события - '<эпоха>-<версия>', и версия чужой эпохи не совпадёт с нашей
+PROCESS_EPOCH = format(time.time_ns() // 1_000_000, 'x')
+
+
+def event_id(version: int) -> str:
+    return f"{PROCESS_EPOCH}-{version}"
+
+
+def parse_event_id(raw: Optional[str]) -> Optional[int]:
+    """Версия из id события; None - нет id, он испорчен или из другого запуска"""
+    if not raw:
+        return None
+    epoch, _, version = raw.rpartition('-')
+    if epoch != PROCESS_EPOCH:
+        return None
+    try:
+        return int(version)
+    except ValueError:
+        return None
+
+
+def sse_frame(event: str, version: int, data: Dict) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f"event: {event}\nid: {event_id(version)}\ndata: {payload}\n\n".encode('utf-8')
+
+
+def diff_snapshots(old: Dict, new: Dict) -> Dict:
+    """Только изменившиеся (и новые) значения между двумя снимками"""
+    delta = {'version': new['version'], 'base': old['version'], 'updated_at': new['updated_at']}
+    for section in SECTIONS:
+        previous = old.get(section, {})
+        delta[section] = {
+            code: value for code, value in new.get(section, {}).items()
+            if previous.get(code) != value
+        }
+    return delta
+
+
+class RatesStream:
+    """
+    Server-Sent Events с курсами для Mini App.
+    При обновлении курсов дельта (только изменившиеся валюты) кодируется
+    один раз и раздаётся всем подключённым клиентам. Клиент продолжает
+    с известной ему версии (Last-Event-ID или ?v=, оба '<эпоха>-<версия>'):
+    если версия ещё в истории - получает дельту, иначе (в том числе после
+    перезапуска сервера) полный снимок.
+    """
+
+    def __init__(self, payload: Callable[[], Dict], heartbeat_seconds: float,
+                 history_size: int, client_queue_size: int):
+        self.payload = payload
+        self.heartbeat_seconds = heartbeat_seconds
+        self.history_size = history_size
+        self.client_queue_size = client_queue_size
+
+        self._history: "OrderedDict[int, Dict]" = OrderedDict()  # версия -> снимок
+        self._frames: Dict[int, bytes] = {}                     # базовая версия -> кадр до последней
+        self._clients: Set[asyncio.Queue] = set()
+        self._closing = asyncio.Event()
+        self.stats = {'published': 0, 'frames_sent': 0, 'dropped_clients': 0}
+
+    def register(self, app: web.Application):
+        app.router.add_get('/api/rates/stream', self._handle_stream)
+        app.on_shutdown.append(self._on_shutdown)
+
+    @property
+    def latest_version(self) -> Optional[int]:
+        return next(reversed(self._history)) if self._history else None
+
+    async def publish(self, converter=None):
+        """Слушатель обновления курсов: новая версия и дельта для всех клиентов"""
+        snapshot = self.payload()
+        version = snapshot['version']
+        if version == self.latest_version:
+            return
+
+        previous = self._history[self.latest_version] if self._history else None
+        self._history[version] = snapshot
+        while len(self._history) > self.history_size:
+            self._history.popitem(last=False)
+        self._frames = {}
+        self.stats['published'] += 1
+
+        if previous is None:
+            frame = sse_frame('snapshot', version, snapshot)
+        else:
+            frame = self.frame_since(previous['version'])
+
+        for queue in list(self._clients):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Клиент не успевает читать - отключаем, он переподключится с версии
+                self._clients.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                self.stats['dropped_clients'] += 1
+
+    def frame_since(self, version: Optional[int]) -> Optional[bytes]:
+        """Кадр для клиента с версией version: None (уже актуален), дельта или снимок"""
+        latest = self.latest_version
+        if latest is None or version == latest:
+            return None
+
+        frame = self._frames.get(version)
+        if frame is None:
+            base = self._history.get(version)
+            if base is None:
+                frame = sse_frame('snapshot', latest, self._history[latest])
+            else:
+                frame = sse_frame('delta', latest, diff_snapshots(base, self._history[latest]))
+            self._frames[version] = frame
+        return frame
+
+    @staticmethod
+    def _client_version(request: web.Request) -> Optional[int]:
+        return parse_event_id(request.headers.get('Last-Event-ID') or request.query.get('v'))
+
+    async def _handle_stream(self, request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'Access-Control-Allow-Origin': '*'
+        })
+        await response.prepare(request)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.client_queue_size)
+        self._clients.add(queue)
+        try:
+            await response.write(f"retry: {int(self.heartbeat_seconds * 1000)}\n\n".encode())
+            first = self.frame_since(self._client_version(request))
+            if first is not None:
+                await response.write(first)
+
+            while not self._closing.is_set():
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    await response.write(b": ping\n\n")
+                    continue
+                if frame is None:
+                    break
+                await response.write(frame)
+                self.stats['frames_sent'] += 1
+        except ConnectionResetError:
+            pass
+        except Exception as e:
+            logging.warning(f"Поток курсов прерван: {e}")
+        finally:
+            self._clients.discard(queue)
+        return response
+
+    async def _on_shutdown(self, app: web.Application):
+        self._closing.set()
+        for queue in list(self._clients):
+            if not queue.full():
+                queue.put_nowait(None)
+
+    def metrics(self) -> Dict:
+        return {'clients': len(self._clients), 'version': self.latest_version, **self.stats}
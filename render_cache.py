@@ -0,0 +1,48 @@
+from typing import Callable, Dict, Optional
+
+
+class RenderCache:
+    """
+    Кэш отрисованных экранов, привязанный к версии снимка курсов.
+    Экран форматируется один раз на версию: заранее (warm) или при первом
+    обращении; смена версии сбрасывает все экраны разом.
+    """
+
+    def __init__(self, version_source: Callable[[], int]):
+        self.version_source = version_source
+        self._renderers: Dict[str, Callable[[], str]] = {}
+        self._screens: Dict[str, str] = {}
+        self._version: Optional[int] = None
+        self.renders = 0
+        self.hits = 0
+
+    def register(self, screen: str, renderer: Callable[[], str]):
+        """Регистрация функции отрисовки экрана"""
+        self._renderers[screen] = renderer
+
+    def __contains__(self, screen: str) -> bool:
+        return screen in self._renderers
+
+    def _sync_version(self):
+        version = self.version_source()
+        if version != self._version:
+            self._screens = {}
+            self._version = version
+
+    def get(self, screen: str) -> str:
+        """Текст экрана для текущей версии снимка"""
+        self._sync_version()
+        text = self._screens.get(screen)
+        if text is None:
+            text = self._screens[screen] = self._renderers[screen]()
+            self.renders += 1
+        else:
+            self.hits += 1
+        return text
+
+    def warm(self):
+        """Отрисовка всех экранов для новой версии снимка"""
+        self._sync_version()
+        for screen in self._renderers:
+            if screen not in self._screens:
+                self.get(screen)
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+from asyncio_throttle import Throttler
+from telegram.error import RetryAfter
+
+from config import (
+    SEND_GLOBAL_RATE_LIMIT, SEND_CHAT_RATE_LIMIT, SEND_CHAT_RATE_PERIOD,
+    SEND_MAX_RETRIES
+)
+
+# Сколько чатов держим до уборки простаивающих очередей
+IDLE_LANES_SWEEP_THRESHOLD = 1024
+
+
+class SendJob:
+    __slots__ = ('send', 'future', 'coalesce_key', 'enqueued_at', 'superseded')
+
+    def __init__(self, send: Callable[[], Awaitable], coalesce_key: Optional[Hashable]):
+        self.send = send
+        self.future = asyncio.get_running_loop().create_future()
+        self.coalesce_key = coalesce_key
+        self.enqueued_at = time.monotonic()
+        self.superseded = False
+
+
+class ChatLane:
+    """Очередь отправок одного чата: строго по порядку и со своим лимитом"""
+    __slots__ = ('jobs', 'throttler', 'task')
+
+    def __init__(self, rate_limit: int, period: float):
+        self.jobs: Deque[SendJob] = deque()
+        self.throttler = Throttler(rate_limit, period)
+        self.task: Optional[asyncio.Task] = None
+
+    def idle(self) -> bool:
+        self.throttler.flush()
+        return not self.jobs and self.task is None and not self.throttler._task_logs
+
+
+class SendScheduler:
+    """
+    Единая точка исходящих запросов к Bot API.
+    Общий лимит на бота и отдельный на каждый чат, ожидание retry_after
+    при 429 и схлопывание правок одного сообщения: если правка ещё стоит
+    в очереди, а пришла новая, отправляется только последний текст.
+    """
+
+    def __init__(self, global_rate: int = SEND_GLOBAL_RATE_LIMIT,
+                 chat_rate: int = SEND_CHAT_RATE_LIMIT,
+                 chat_period: float = SEND_CHAT_RATE_PERIOD,
+                 max_retries: int = SEND_MAX_RETRIES):
+        self.global_throttler = Throttler(global_rate, 1.0)
+        self.chat_rate = chat_rate
+        self.chat_period = chat_period
+        self.max_retries = max_retries
+
+        self._lanes: Dict[Hashable, ChatLane] = {}
+        self._pending: Dict[Hashable, SendJob] = {}
+        self._resume_at = 0.0
+        self.stats = {'sent': 0, 'failed': 0, 'coalesced': 0, 'retried': 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def submit(self, chat_id: Hashable, send: Callable[[], Awaitable],
+                     coalesce_key: Optional[Hashable] = None):
+        """
+        Постановка отправки в очередь чата. Результат - то, что вернул запрос,
+        либо None, если правку вытеснила более новая.
+        """
+        job = SendJob(send, coalesce_key)
+        if coalesce_key is not None:
+            previous = self._pending.get(coalesce_key)
+            if previous is not None:
+                previous.superseded = True
+                self.stats['coalesced'] += 1
+            self._pending[coalesce_key] = job
+
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            if len(self._lanes) >= IDLE_LANES_SWEEP_THRESHOLD:
+                self._sweep_idle_lanes()
+            lane = self._lanes[chat_id] = ChatLane(self.chat_rate, self.chat_period)
+        lane.jobs.append(job)
+        if lane.task is None:
+            lane.task = asyncio.create_task(self._drain(lane))
+
+        return await job.future
+
+    async def edit(self, query, text: str, **kwargs):
+        """Правка сообщения callback-запроса (схлопывается с более новыми правками)"""
+        if query.message is not None:
+            chat_id = query.message.chat_id
+            key = ('edit', chat_id, query.message.message_id)
+        else:
+            # Сообщение из inline-режима: чата нет, лимитируем по пользователю
+            chat_id = query.from_user.id
+            key = ('edit', query.inline_message_id)
+        return await self.submit(
+            chat_id,
+            lambda: query.edit_message_text(text=text, **kwargs),
+            coalesce_key=key
+        )
+
+    async def reply(self, message, text: str, **kwargs):
+        """Ответ новым сообщением в чат"""
+        return await self.submit(
+            message.chat_id,
+            lambda: message.reply_text(text=text, **kwargs)
+        )
+
+    async def send(self, bot, chat_id: int, text: str, **kwargs):
+        """Новое сообщение в чат без входящего обновления (уведомления, рассылки)"""
+        return await self.submit(
+            chat_id,
+            lambda: bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        )
+
+    async def _drain(self, lane: ChatLane):
+        try:
+            while lane.jobs:
+                job = lane.jobs.popleft()
+                if job.coalesce_key is not None and self._pending.get(job.coalesce_key) is job:
+                    del self._pending[job.coalesce_key]
+                if job.future.cancelled():
+                    # Ожидающий отменён (например, остановка рассылки) - не отправляем
+                    continue
+                if job.superseded:
+                    job.future.set_result(None)
+                    continue
+                await self._run(lane, job)
+        finally:
+            lane.task = None
+
+    async def _run(self, lane: ChatLane, job: SendJob):
+        attempt = 0
+        while True:
+            await lane.throttler.acquire()
+            delay = self._resume_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.global_throttler.acquire()
+
+            if attempt == 0:
+                waited = time.monotonic() - job.enqueued_at
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+            try:
+                result = await job.send()
+            except RetryAfter as e:
+                # Флуд-контроль: приостанавливаем все отправки на указанное время
+                attempt += 1
+                self.stats['retried'] += 1
+                self._resume_at = max(self._resume_at, time.monotonic() + e.retry_after)
+                logging.warning(f"429 от Bot API, пауза {e.retry_after} с (попытка {attempt})")
+                if attempt <= self.max_retries:
+                    continue
+                self.stats['failed'] += 1
+                self._resolve(job, exception=e)
+            except Exception as e:
+                self.stats['failed'] += 1
+                self._resolve(job, exception=e)
+            else:
+                self.stats['sent'] += 1
+                self._resolve(job, result=result)
+            return
+
+    @staticmethod
+    def _resolve(job: SendJob, result=None, exception: Optional[BaseException] = None):
+        if job.future.done():
+            return  # ожидающий уже отменён
+        if exception is not None:
+            job.future.set_exception(exception)
+        else:
+            job.future.set_result(result)
+
+    def _sweep_idle_lanes(self):
+        for chat_id in [chat_id for chat_id, lane in self._lanes.items() if lane.idle()]:
+            del self._lanes[chat_id]
+
+    def queue_depth(self) -> int:
+        return sum(len(lane.jobs) for lane in self._lanes.values())
+
+    def metrics(self) -> Dict:
+        """Глубина очереди, ожидание до отправки и счётчики"""
+        started = self.stats['sent'] + self.stats['failed']
+        return {
+            'queue_depth': self.queue_depth(),
+            'active_chats': sum(1 for lane in self._lanes.values() if lane.task is not None),
+            'wait_mean_ms': round(self._wait_total / started * 1000, 1) if started else 0.0,
+            'wait_max_ms': round(self._wait_max * 1000, 1),
+            'paused_seconds': round(max(0.0, self._resume_at - time.monotonic()), 1),
+            **self.stats
+        }
+
+    async def close(self):
+        """Дожидаемся уже поставленных отправок"""
+        tasks = [lane.task for lane in self._lanes.values() if lane.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
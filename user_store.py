@@ -0,0 +1,192 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+
+class UserStore:
+    """
+    Хранилище профилей пользователей в SQLite (WAL).
+    Чтение идёт через кэш в памяти, изменения пишутся пакетами раз в
+    flush_interval секунд, поэтому обработчики не ждут диск.
+    """
+
+    def __init__(self, path: str, default_factory: Callable[[], Dict],
+                 flush_interval: float = 5.0, cache_size: int = 10000):
+        self.path = path
+        self.default_factory = default_factory
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = asyncio.Lock()
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._persisted: Dict[str, str] = {}  # user_id -> JSON последней записи
+        self._touched = set()                 # профили, выданные с последнего сброса
+        self._previous = set()                # выданные до прошлого сброса (могут ещё меняться)
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _open(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " user_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL"
+            ")"
+        )
+        conn.commit()
+        return conn
+
+    async def _run(self, func, *args):
+        """Выполнение операции с БД в отдельном потоке (по одной за раз)"""
+        async with self._db_lock:
+            if self._conn is None:
+                self._conn = await asyncio.to_thread(self._open)
+            return await asyncio.to_thread(func, self._conn, *args)
+
+    async def start(self):
+        """Открытие БД и запуск периодического сброса изменений"""
+        await self._run(lambda conn: None)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Ошибка сохранения пользователей: {e}")
+
+    @staticmethod
+    def _load(conn: sqlite3.Connection, user_id: str) -> Optional[str]:
+        row = conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _save(conn: sqlite3.Connection, rows: list):
+        with conn:
+            conn.executemany(
+                "INSERT INTO users (user_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                rows
+            )
+
+    @staticmethod
+    def _recipients(conn: sqlite3.Connection, after: str, limit: int) -> List[str]:
+        rows = conn.execute(
+            "SELECT user_id FROM users"
+            " WHERE user_id > ? AND coalesce(json_extract(data, '$.settings.notifications'), 1)"
+            " ORDER BY user_id LIMIT ?",
+            (after, limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    async def recipients(self, after: str = '', limit: int = 500) -> List[str]:
+        """
+        Следующая порция пользователей с включёнными уведомлениями
+        (по возрастанию id, начиная после after) - для рассылок
+        """
+        return await self._run(self._recipients, after, limit)
+
+    async def get(self, user_id: str) -> Dict:
+        """Профиль пользователя (из кэша или БД); изменения сохраняются автоматически"""
+        profile = self._cache.get(user_id)
+        if profile is not None:
+            self._cache.move_to_end(user_id)
+            self._touched.add(user_id)
+            return profile
+
+        # Одновременные промахи по одному пользователю читают БД один раз
+        future = self._loading.get(user_id)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            raw = await self._run(self._load, user_id)
+            profile = json.loads(raw) if raw else self.default_factory()
+            if raw:
+                self._persisted[user_id] = raw
+            self._cache[user_id] = profile
+            self._touched.add(user_id)
+            self._evict()
+            future.set_result(profile)
+            return profile
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # помечаем как полученное - его пробросим ниже
+            raise
+        finally:
+            del self._loading[user_id]
+
+    def _evict(self):
+        """Вытеснение давно неиспользуемых профилей без несохранённых изменений"""
+        excess = len(self._cache) - self.cache_size
+        if excess <= 0:
+            return
+        for user_id in list(self._cache):
+            if excess <= 0:
+                break
+            if user_id in self._touched or user_id in self._previous:
+                continue
+            del self._cache[user_id]
+            self._persisted.pop(user_id, None)
+            excess -= 1
+
+    async def flush(self):
+        """Пакетная запись изменившихся профилей"""
+        touched, self._touched = self._touched, set()
+        # Обработчик мог изменить профиль уже после прошлого сброса -
+        # проверяем такие профили ещё один цикл
+        candidates = touched | self._previous
+        self._previous = touched
+        now = time.time()
+        rows = []
+        for user_id in candidates:
+            profile = self._cache.get(user_id)
+            if profile is None:
+                continue
+            raw = json.dumps(profile, ensure_ascii=False, separators=(',', ':'))
+            if self._persisted.get(user_id) != raw:
+                rows.append((user_id, raw, now))
+
+        if not rows:
+            return
+        try:
+            await self._run(self._save, rows)
+        except Exception:
+            # Не потеряли изменения - попробуем на следующем сбросе
+            self._touched |= candidates
+            raise
+        for user_id, raw, _ in rows:
+            self._persisted[user_id] = raw
+        self._evict()
+
+    async def close(self):
+        """Остановка фонового сброса, запись оставшихся изменений и закрытие БД"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+        await self.flush()
+
+        async with self._db_lock:
+            if self._conn is not None:
+                await asyncio.to_thread(self._conn.close)
+                self._conn = None
@@ -0,0 +1,144 @@
+import asyncio
+import hmac
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from aiohttp import web
+from telegram import Update
+
+from config import (
+    HTTP_HOST, HTTP_PORT, UPDATE_QUEUE_SIZE, UPDATE_WORKERS,
+    UPDATE_ENQUEUE_TIMEOUT_SECONDS
+)
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class BotWebServer:
+    """
+    Встроенный HTTP сервер бота (aiohttp).
+    Принимает webhook от Telegram в ограниченную очередь, которую разбирают
+    воркеры, и отдаёт /healthz и /readyz. Другие модули добавляют свои
+    маршруты через server.app до запуска.
+    """
+
+    def __init__(self, application, host: str = HTTP_HOST, port: int = HTTP_PORT,
+                 webhook_path: Optional[str] = None, secret_token: Optional[str] = None,
+                 queue_size: int = UPDATE_QUEUE_SIZE, workers: int = UPDATE_WORKERS,
+                 enqueue_timeout: float = UPDATE_ENQUEUE_TIMEOUT_SECONDS):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.webhook_path = webhook_path
+        self.secret_token = secret_token
+        self.enqueue_timeout = enqueue_timeout
+        self.worker_count = workers if webhook_path else 0
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = {'received': 0, 'processed': 0, 'failed': 0, 'rejected': 0, 'unauthorized': 0}
+        self._readiness_checks: Dict[str, Callable[[], bool]] = {}
+        self._metric_sources: Dict[str, Callable[[], Dict]] = {}
+        self._workers = []
+        self._runner: Optional[web.AppRunner] = None
+        self._started_at = time.monotonic()
+
+        self.app = web.Application()
+        self.app.router.add_get('/healthz', self._handle_health)
+        self.app.router.add_get('/readyz', self._handle_ready)
+        if webhook_path:
+            self.app.router.add_post(webhook_path, self._handle_webhook)
+
+    def add_readiness_check(self, name: str, check: Callable[[], bool]):
+        """Проверка готовности для /readyz"""
+        self._readiness_checks[name] = check
+
+    def add_metrics(self, name: str, source: Callable[[], Dict]):
+        """Дополнительные метрики для /healthz"""
+        self._metric_sources[name] = source
+
+    async def start(self):
+        """Запуск воркеров и HTTP сервера"""
+        for _ in range(self.worker_count):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logging.info(f"HTTP сервер запущен на {self.host}:{self.port}")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Остановка: перестаём принимать запросы, дорабатываем очередь"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+        if self._workers:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Не обработано обновлений при остановке: {self.queue.qsize()}")
+            for task in self._workers:
+                task.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+
+    async def _worker(self):
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.application.process_update(update)
+                self.stats['processed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logging.error(f"Ошибка обработки обновления: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _handle_webhook(self, request: web.Request) -> web.Response:
+        """Приём обновления от Telegram"""
+        if self.secret_token:
+            received = request.headers.get(SECRET_TOKEN_HEADER, '')
+            if not hmac.compare_digest(received, self.secret_token):
+                self.stats['unauthorized'] += 1
+                return web.Response(status=403)
+
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception:
+            return web.Response(status=400, text='invalid update')
+
+        # Обратное давление: ждём место в очереди, а если его нет слишком
+        # долго - отвечаем 503, и Telegram повторит доставку позже
+        try:
+            await asyncio.wait_for(self.queue.put(update), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.stats['rejected'] += 1
+            return web.Response(status=503, headers={'Retry-After': '1'})
+
+        self.stats['received'] += 1
+        return web.Response(status=200)
+
+    def metrics(self) -> Dict:
+        """Состояние очереди и счётчики"""
+        return {
+            'uptime_seconds': round(time.monotonic() - self._started_at, 1),
+            'queue_depth': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            **self.stats
+        }
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        extra = {name: source() for name, source in self._metric_sources.items()}
+        return web.json_response({'status': 'ok', **self.metrics(), **extra})
+
+    async def _handle_ready(self, request: web.Request) -> web.Response:
+        checks = {name: bool(check()) for name, check in self._readiness_checks.items()}
+        if self.webhook_path:
+            checks['queue'] = not self.queue.full()
+        ready = all(checks.values())
+        return web.json_response(
+            {'status': 'ready' if ready else 'not_ready', 'checks': checks},
+            status=200 if ready else 503
+        )